@@ -0,0 +1,48 @@
+import multiprocessing
+import sys
+
+from gbra.experiments.campaign import run_campaign
+from gbra.experiments.results import ResultsReader, ResultsWriter
+from gbra.experiments.scheduler import ExperimentGrid
+from gbra.recommender.recommenders import PixieRandomWalkRecommender
+from exp_final_whitebox_attacker import PIXIE_PARAMS, RECOMMENDATIONS, \
+    TARGET_ITEMS, load_network
+
+""""
+python exp_attack_campaign.py [num_workers] [results directory]
+"""
+
+num_workers = int(sys.argv[1]) if len(sys.argv) > 1 else multiprocessing.cpu_count()
+results_directory = sys.argv[2] if len(sys.argv) > 2 else "attack_campaign_results"
+
+def make_recommender(network):
+    return PixieRandomWalkRecommender(G=network, **PIXIE_PARAMS)
+
+grid = ExperimentGrid([
+    ("attacker", ["RandomAttacker", "AverageAttacker", "NeighborAttacker", "HighDegreeAttacker", "HillClimbingAttacker"]),
+    ("target_item", TARGET_ITEMS),
+    ("fake_entity_fraction", [0.01, 0.05, 0.10]),
+    ("fake_ratings", [1, 2, 3, 5, 10]),
+])
+
+# The network is loaded once and shared with every attack.  Attacks grow
+# through the fractions of fake entities in stages, except those of the
+# degree and hill climbing attackers, which run once per fraction.
+network = load_network()
+with ResultsWriter(results_directory) as writer:
+    for result in run_campaign(network, grid, make_recommender, writer,
+            num_recs=RECOMMENDATIONS, num_workers=num_workers, staged=True):
+        name = '-'.join(str(result.config[key]) for key in (
+            "attacker", "target_item", "fake_entity_fraction", "fake_ratings"))
+        if result.error:
+            print("%s failed:\n%s" % (name, result.error))
+            continue
+        print("%s: hit ratio %f -> %f (%.1fs)" % (
+            name, result.hit_ratio_before, result.hit_ratio_after, result.wall_time))
+
+by = ["attacker", "fake_entity_fraction", "fake_ratings", "phase"]
+stats = ResultsReader(results_directory).group_stats(by=by)
+for key in sorted(stats):
+    print("%s: mean %f, median %f, std dev %f" % (
+        '-'.join(map(str, key)), stats[key].mean, stats[key].quantiles[0.5],
+        stats[key].std))
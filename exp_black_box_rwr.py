@@ -27,7 +27,7 @@ bb_rwr_attacker = BlackBoxRWRAttacker(
     _target_item=target_item, _num_fake_entities=10, _num_fake_ratings=1
 )
 
-# this takes about 30 minutes to run! making 10000 recommendations takes a while
+# probes every distinct item of the depth 2 recommendation trees once, in parallel
 # bb_rwr_attacker = BlackBoxDeepRWRAttacker(
 #     _rec_tree_depth=2,
 #     _num_items_to_scout=100, _num_recs=10, _recommender=recommender,
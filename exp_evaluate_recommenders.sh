@@ -5,11 +5,15 @@
 # Bring out the experiments.
 cp recommender_experiments/exp_recommender.py .
 cp recommender_experiments/exp_recommender_master.py .
-python -u exp_recommender_master.py
+# An interrupted or failed sweep keeps its state and results here, so that
+# running this script again resumes it.
+python -u exp_recommender_master.py || exit $?
 
 # Clean up
 mkdir -p rec_eval_results
 mv *.recommender_eval rec_eval_results/
+mv recommender_eval.state rec_eval_results/
+mv recommender_eval.results rec_eval_results/
 rm exp_recommender.py
 rm exp_recommender_master.py
 
@@ -1,11 +1,32 @@
-import os
-
-num_fake_reviews = '1'
-for attacker_name in ["BlackBoxRWRAttacker"]:
-    for percent_fake_entities in [0.01, 0.05, 0.10]:
-        filename = '-'.join([attacker_name, str(percent_fake_entities)])
-        cmd = ' '.join([
-            "python", "exp_final_whitebox_attacker.py",
-            str(percent_fake_entities), num_fake_reviews, attacker_name
-        ])
-        os.system(cmd + " > " + filename + " &")
+import multiprocessing
+import sys
+
+from gbra.experiments.scheduler import ExperimentGrid, Scheduler
+from exp_final_whitebox_attacker import run_experiment, load_network
+
+# At most this many experiments run at once, each holding one copy of the
+# graph plus the copy it attacks.
+num_workers = int(sys.argv[1]) if len(sys.argv) > 1 else multiprocessing.cpu_count()
+
+num_fake_reviews = 1
+grid = ExperimentGrid([
+    ("graph", ["movielens100k"]),
+    ("attacker", ["BlackBoxRWRAttacker"]),
+    ("percent_fake_entities", [0.01, 0.05, 0.10]),
+    ("fake_reviews", [num_fake_reviews]),
+])
+
+# Rerun this script to resume an interrupted sweep.
+scheduler = Scheduler(
+    run_experiment, load_network, num_workers=num_workers,
+    state_filename="blackbox_attacker.state"
+)
+for job in scheduler.run(grid):
+    name = '-'.join([job.config["attacker"], str(job.config["percent_fake_entities"])])
+    if job.error:
+        print("%s failed:\n%s" % (name, job.error))
+        continue
+    print("%s: mean %f, median %f, std dev %f (%.1fs, peak memory %.0fMB)" % (
+        name, job.result["mean"], job.result["median"], job.result["std"],
+        job.wall_time, job.peak_memory_mb
+    ))
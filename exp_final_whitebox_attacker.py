@@ -21,10 +21,6 @@ RECOMMENDATIONS = 10
 python exp_final_whitebox_attacker.py 0.10 10 HighDegreeAttacker
 """
 
-PERCENT_FAKE_ENTITIES, NUM_FAKE_REVIEWS, ATTACKER_NAME = sys.argv[1:]
-PERCENT_FAKE_ENTITIES = float(PERCENT_FAKE_ENTITIES)
-NUM_FAKE_REVIEWS = int(NUM_FAKE_REVIEWS)
-
 attackers = {
     'HighDegreeAttacker': HighDegreeAttacker,
     'LowDegreeAttacker': LowDegreeAttacker,
@@ -38,33 +34,49 @@ attackers = {
 
 BLACK_BOX_RWR_NUM_SCOUT_ITEMS = 100
 
-def get_attacker(network, recommender, target_item):
-    attacker_klass = attackers[ATTACKER_NAME]
-    num_fake_entities = int(PERCENT_FAKE_ENTITIES * network.num_entities)
+# target_items = network.get_random_items(ITERATIONS)
+TARGET_ITEMS = [2352, 380, 1722, 2514, 2384]
+
+def load_network(name='movielens100k'):
+    """Loads the network the attacks are evaluated on."""
+    assert name == 'movielens100k', name
+    return Movielens100kLoader().load()
+
+def get_attacker(attacker_name, network, recommender, target_item,
+        percent_fake_entities, num_fake_reviews):
+    attacker_klass = attackers[attacker_name]
+    num_fake_entities = int(percent_fake_entities * network.num_entities)
 
     kwargs = dict(
         _recommender=recommender,
         _target_item=target_item,
         _num_fake_entities=num_fake_entities,
-        _num_fake_ratings=NUM_FAKE_REVIEWS
+        _num_fake_ratings=num_fake_reviews
     )
-    if ATTACKER_NAME == 'BlackBoxRWRAttacker':
+    if attacker_name == 'BlackBoxRWRAttacker':
         kwargs.update(dict(
             _num_items_to_scout=BLACK_BOX_RWR_NUM_SCOUT_ITEMS,
             _num_recs=RECOMMENDATIONS
         ))
-    elif ATTACKER_NAME == 'BlackBoxDeepRWRAttacker':
+    elif attacker_name == 'BlackBoxDeepRWRAttacker':
         kwargs.update(dict(
             _num_items_to_scout=BLACK_BOX_RWR_NUM_SCOUT_ITEMS,
         ))
 
     return attacker_klass(**kwargs)
 
-def evaluate_attacker(target_item):
-    network = Movielens100kLoader().load()
+def evaluate_attacker(network, target_item, attacker_name,
+        percent_fake_entities, num_fake_reviews):
+    """Attacks a copy of `network` and returns the (before, after) hit ratio
+    of the target item.
+    """
+    network = network.copy()
 
     recommender = PixieRandomWalkRecommender(G=network, **PIXIE_PARAMS)
-    attacker = get_attacker(network, recommender, target_item)
+    attacker = get_attacker(
+        attacker_name, network, recommender, target_item,
+        percent_fake_entities, num_fake_reviews
+    )
 
     # before = recommender.calculate_hit_ratio(target_item, RECOMMENDATIONS, verbose=False)
     before = 0  # this is basically always true
@@ -75,17 +87,35 @@ def evaluate_attacker(target_item):
     after = recommender.calculate_hit_ratio(target_item, RECOMMENDATIONS, verbose=False)
     return (before, after)
 
-results = []
-network = Movielens100kLoader().load()
-# target_items = network.get_random_items(ITERATIONS)
-# print target_items
-target_items = [2352, 380, 1722, 2514, 2384]
-
-for i in range(ITERATIONS):
-    print i
-    (before, after) = evaluate_attacker(target_items[i])
-    results.append((before, after))
-print results
-
-arr = np.array([a[1] for a in results])
-print "mean: {}, median {}, std dev {}".format(np.mean(arr), np.median(arr), np.std(arr))
+def run_experiment(network, config):
+    """Runs the attack described by `config` against every target item.
+
+    `config` holds the attacker name, the fraction of fake entities and the
+    number of fake reviews per fake entity.  Returns the (before, after) hit
+    ratios and their summary statistics.
+    """
+    results = []
+    for i in range(ITERATIONS):
+        print i
+        results.append(evaluate_attacker(
+            network, TARGET_ITEMS[i], config['attacker'],
+            config['percent_fake_entities'], config['fake_reviews']
+        ))
+    print results
+
+    arr = np.array([a[1] for a in results])
+    print "mean: {}, median {}, std dev {}".format(np.mean(arr), np.median(arr), np.std(arr))
+    return {
+        'results': results,
+        'mean': np.mean(arr),
+        'median': np.median(arr),
+        'std': np.std(arr),
+    }
+
+if __name__ == '__main__':
+    PERCENT_FAKE_ENTITIES, NUM_FAKE_REVIEWS, ATTACKER_NAME = sys.argv[1:]
+    run_experiment(load_network(), {
+        'attacker': ATTACKER_NAME,
+        'percent_fake_entities': float(PERCENT_FAKE_ENTITIES),
+        'fake_reviews': int(NUM_FAKE_REVIEWS),
+    })
@@ -1,3 +1,4 @@
+import heapq
 import random
 import numpy as np
 from scipy import stats
@@ -5,10 +6,19 @@ import snap
 from abc import abstractmethod
 from collections import Counter
 
+from gbra.attackers.profiles import AttackProfile, ProfileGenerator
+from gbra.feature_extraction.feature_store import FeatureStore
 from gbra.recommender.recommenders import PixieRandomWalkRecommender
+from gbra.util.parallel_utils import imap_shared
 
 class BaseAttacker(object):
     """Base configurations for an Attacker"""
+
+    # Whether the first n fake entities of the profile of this attack make
+    # the attack of n fake entities, so that it can grow in stages (see
+    # `attack_in_stages`).
+    supports_stages = True
+
     def __init__(self, _recommender, _target_item, _num_fake_entities, _num_fake_ratings):
         self.recommender = _recommender
         self.target_item = _target_item
@@ -19,24 +29,100 @@ class BaseAttacker(object):
         """Adds a fake entity to the graph and returns the ID"""
         return self.recommender._attacker_add_entity()
 
+    def add_fake_entities(self):
+        """Adds the `num_fake_entities` fake entities to the graph at once and
+        returns the array of their IDs"""
+        return self.recommender._attacker_add_entities(self.num_fake_entities)
+
+    def round_robin_profile(self, item_ids, rating):
+        """Returns the AttackProfile in which the fake entities take turns
+        rating the next of `item_ids` (cycling through them) until each made
+        `num_fake_ratings` ratings, and then rate the target item, all with
+        `rating`.
+
+        Every round deals items to all the fake entities, so the first of
+        them do not rate what a smaller attack would have them rate, and
+        attacks built on it do not support stages.
+        """
+        num_entities = self.num_fake_entities
+        turns = np.arange(self.num_fake_ratings * num_entities)
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        entities = np.arange(num_entities)
+        return AttackProfile(
+            num_entities,
+            np.concatenate([np.tile(entities, self.num_fake_ratings), entities]),
+            np.concatenate([
+                item_ids[turns % len(item_ids)],
+                np.repeat(self.target_item, num_entities)
+            ]),
+            np.full(len(turns) + num_entities, rating, dtype=np.float64)
+        )
+
     def get_degree_dictionary(self):
-        """Cache the dictionary of item_id -> degree as a .npy file"""
-        graph = self.recommender._G
-        name = graph.name
-        try:
-            return np.load(name + '-item-degrees.npy').item()
-        except:
-            graph = self.recommender._G
-            degrees = {}
-            for item_id in graph.get_items():
-                degrees[item_id] = len(graph.get_neighbors(item_id))
-            np.save(name + '-item-degrees.npy', degrees)
-            return degrees
+        """Returns the dictionary of item_id -> degree, from the feature store"""
+        return FeatureStore().get(self.recommender._G).item_degree_dictionary()
 
     @abstractmethod
-    def attack(self, verbose = False):
+    def build_profile(self):
+        """Returns the AttackProfile of this attack."""
         raise NotImplemented()
 
+    def attack(self, verbose = False):
+        self.build_profile().inject(self.recommender)
+
+    def get_metadata(self):
+        """Returns a dict describing this attack, see `save_profile`."""
+        return {
+            'attacker': type(self).__name__,
+            'target_item': int(self.target_item),
+            'num_fake_entities': int(self.num_fake_entities),
+            'num_fake_ratings': int(self.num_fake_ratings),
+        }
+
+    def save_profile(self, filename, **metadata):
+        """Builds the profile of this attack and saves it to `filename`,
+        along with `get_metadata()` and `metadata` (e.g. the seed), so that
+        it can be replayed without running the attack again, see
+        `ReplayAttacker`.  Returns the profile.
+        """
+        profile = self.build_profile()
+        profile.metadata.update(self.get_metadata())
+        profile.metadata.update(metadata)
+        profile.save(filename)
+        return profile
+
+    def attack_in_stages(self, stage_sizes):
+        """Grows the attack in stages, yielding the number of fake entities
+        in the graph after every stage.
+
+        The profile of the whole attack, with `num_fake_entities` fake
+        entities, is built once.  Every stage then adds the next fake
+        entities of the profile, with their ratings, up to the size of the
+        stage.  Each stage thus extends the state left by the previous one,
+        and the stages end up with the same ratings as `attack` would add.
+
+        :param stage_sizes: the increasing numbers of fake entities after
+            every stage, at most `num_fake_entities`.
+        :raises ValueError: if this attacker does not support stages, unless
+            the only stage is the whole attack.
+        """
+        stage_sizes = list(stage_sizes)
+        if not self.supports_stages and stage_sizes != [self.num_fake_entities]:
+            raise ValueError(
+                "%s attacks cannot grow in stages." % type(self).__name__
+            )
+        if stage_sizes != sorted(stage_sizes) or \
+                (stage_sizes and stage_sizes[-1] > self.num_fake_entities):
+            raise ValueError(
+                "Stage sizes %s must increase up to %d" % (stage_sizes, self.num_fake_entities)
+            )
+        profile = self.build_profile()
+        start = 0
+        for stop in stage_sizes:
+            profile.select(start, stop).inject(self.recommender)
+            start = stop
+            yield stop
+
 class RandomAttacker(BaseAttacker):
     """Implementation of RandomBot from [S. Lam, J. Riedl. Shilling Recommender Systems for Fun and Profit]
     Fits a normal distribution N to a sample of existing ratings, samples a rating R from N,
@@ -49,28 +135,21 @@ class RandomAttacker(BaseAttacker):
 
     def _fit_rating_distribution(self):
         """Returns the (mean, std) of a normal distribution fitted from num_rating_samples"""
-        graph = self.recommender._G
-        sample_weights = [
-            graph.get_random_edge()[2] for i in range(self.num_rating_samples)
-        ]
+        _, _, sample_weights = self.recommender._G.sample_edges(self.num_rating_samples)
         mu, std = stats.norm.fit(sample_weights)
         return (mu, std)
 
-    def attack(self, verbose = False):
+    def build_profile(self, generator=None):
+        """Returns the AttackProfile of this attack.
+
+        :param generator: (optional) the ProfileGenerator to draw from.
+        """
         mu, std = self._fit_rating_distribution()
-        graph = self.recommender._G
-        rating_matrix = np.random.normal(
-            mu, max(std, 0.1), (self.num_fake_entities, self.num_fake_ratings - 1)
+        generator = generator or ProfileGenerator(self.recommender._G)
+        return generator.random_profile(
+            self.target_item, self.num_fake_entities, self.num_fake_ratings - 1,
+            rating_mean=mu, rating_std=max(std, 0.1)
         )
-        fake_entities = [self.add_fake_entity() for i in range(self.num_fake_entities)]
-        for i in range(self.num_fake_entities):
-            entity_id = fake_entities[i]
-            item_ids = graph.get_random_items(self.num_fake_ratings - 1, replace = False, excluding = self.target_item)
-            for j in range(self.num_fake_ratings - 1):
-                rating = rating_matrix[i][j]
-                item_id = item_ids[j]
-                self.recommender._attacker_add_edge(entity_id, item_id, rating)
-            self.recommender._attacker_add_edge(entity_id, self.target_item, graph.rating_range[1])
 
 class AverageAttacker(BaseAttacker):
     """Implementation of AverageBot from [S. Lam, J. Riedl. Shilling Recommender Systems for Fun and Profit]
@@ -81,18 +160,12 @@ class AverageAttacker(BaseAttacker):
     def __init__(self, _recommender, _target_item, _num_fake_entities, _num_fake_ratings):
         super(AverageAttacker, self).__init__(_recommender, _target_item, _num_fake_entities, _num_fake_ratings)
 
-    def attack(self, verbose = False):
-        graph = self.recommender._G
-        fake_entities = [self.add_fake_entity() for i in range(self.num_fake_entities)]
-        average_cache = {} # caches the average rating of randomly selected items
-        for entity_id in fake_entities:
-            item_ids = graph.get_random_items(self.num_fake_ratings - 1, replace = False, excluding = self.target_item)
-            for item_id in item_ids:
-                if item_id not in average_cache:
-                    average_cache[item_id] = graph.get_average_edge_weight(item_id)
-                sample_rating = np.random.normal(average_cache[item_id], 1.1)
-                self.recommender._attacker_add_edge(entity_id, item_id, sample_rating)
-            self.recommender._attacker_add_edge(entity_id, self.target_item, graph.rating_range[1])
+    def build_profile(self, generator=None):
+        """Returns the AttackProfile of this attack."""
+        generator = generator or ProfileGenerator(self.recommender._G)
+        return generator.average_profile(
+            self.target_item, self.num_fake_entities, self.num_fake_ratings - 1
+        )
 
 class NeighborAttacker(BaseAttacker):
     """Generates fake reviews on items that are two hops away from the
@@ -100,100 +173,184 @@ class NeighborAttacker(BaseAttacker):
     def __init__(self, _recommender, _target_item, _num_fake_entities, _num_fake_ratings):
         super(NeighborAttacker, self).__init__(_recommender, _target_item, _num_fake_entities, _num_fake_ratings)
 
-    def attack(self, verbose = False):
-        graph = self.recommender._G
-        fake_entities = [self.add_fake_entity() for i in range(self.num_fake_entities)]
-        target_reviewers = graph.get_neighbors(self.target_item)
-        also_reviewed = set()
-        for reviewer in target_reviewers:
-            also_reviewed |= set(graph.get_neighbors(reviewer))
-
-        also_reviewed -= set([self.target_item])
-
-        average_cache = {}
-        for entity_id in fake_entities:
-            item_ids = np.random.choice(list(also_reviewed), min(self.num_fake_ratings - 1, len(also_reviewed)), replace = False)
-            for item_id in item_ids:
-                if item_id not in average_cache:
-                    average_cache[item_id] = graph.get_average_edge_weight(item_id)
-                sample_rating = np.random.normal(average_cache[item_id], 1.1)
-                self.recommender._attacker_add_edge(entity_id, item_id, sample_rating)
-            self.recommender._attacker_add_edge(entity_id, self.target_item, graph.rating_range[1])
+    def build_profile(self, generator=None):
+        """Returns the AttackProfile of this attack."""
+        generator = generator or ProfileGenerator(self.recommender._G)
+        return generator.neighbor_profile(
+            self.target_item, self.num_fake_entities, self.num_fake_ratings - 1
+        )
+
+class BandwagonAttacker(BaseAttacker):
+    """Implementation of the bandwagon attack from [B. Mobasher et al. Toward
+    Trustworthy Recommender Systems].  Every fake entity rates the
+    `_num_selected_items` most popular items and the target item with the
+    highest rating, and random filler items like RandomAttacker does."""
+
+    def __init__(self, _recommender, _target_item, _num_fake_entities, _num_fake_ratings,
+            _num_selected_items=10):
+        self.num_selected_items = _num_selected_items
+        super(BandwagonAttacker, self).__init__(_recommender, _target_item, _num_fake_entities, _num_fake_ratings)
+
+    def build_profile(self, generator=None):
+        """Returns the AttackProfile of this attack."""
+        generator = generator or ProfileGenerator(self.recommender._G)
+        return generator.bandwagon_profile(
+            self.target_item, self.num_fake_entities,
+            max(self.num_fake_ratings - self.num_selected_items - 1, 0),
+            self.num_selected_items
+        )
+
+class SegmentAttacker(BaseAttacker):
+    """Implementation of the segment attack from [B. Mobasher et al. Toward
+    Trustworthy Recommender Systems].  Every fake entity rates the
+    `_segment_items`, items liked by the entities the attack targets, and
+    the target item with the highest rating, and random filler items with
+    the lowest rating."""
+
+    def __init__(self, _recommender, _target_item, _num_fake_entities, _num_fake_ratings,
+            _segment_items):
+        self.segment_items = _segment_items
+        super(SegmentAttacker, self).__init__(_recommender, _target_item, _num_fake_entities, _num_fake_ratings)
+
+    def build_profile(self, generator=None):
+        """Returns the AttackProfile of this attack."""
+        generator = generator or ProfileGenerator(self.recommender._G)
+        return generator.segment_profile(
+            self.target_item, self.num_fake_entities,
+            max(self.num_fake_ratings - len(self.segment_items) - 1, 0),
+            self.segment_items
+        )
 
 
 class LowDegreeAttacker(BaseAttacker):
+    supports_stages = False  # see `round_robin_profile`
+
     # _num_fake_ratings is interpreted as per fake user
     def __init__(self, _recommender, _target_item, _num_fake_entities, _num_fake_ratings):
         super(LowDegreeAttacker, self).__init__(_recommender, _target_item, _num_fake_entities, _num_fake_ratings)
 
-    def attack(self, verbose = False):
+    def build_profile(self):
         degrees = self.get_degree_dictionary()
         del degrees[self.target_item]
 
         degrees = { item_id : (degrees[item_id] * -1) for item_id in degrees if degrees[item_id] != 0}
         sorted_ids = [a[0] for a in Counter(degrees).most_common(len(degrees))]
-        entities = [self.add_fake_entity() for i in range(self.num_fake_entities)]
-        i = 0
-        for j in range(self.num_fake_ratings):
-            for entity in entities:
-                self.recommender._attacker_add_edge(entity, sorted_ids[i % len(sorted_ids)], 5)
-                i += 1
-        for entity in entities:
-            self.recommender._attacker_add_edge(entity, self.target_item, 5)
+        return self.round_robin_profile(sorted_ids, 5)
 
 class HighDegreeAttacker(BaseAttacker):
+    supports_stages = False  # see `round_robin_profile`
+
     # _num_fake_ratings is interpreted as per fake user
     def __init__(self, _recommender, _target_item, _num_fake_entities, _num_fake_ratings):
         super(HighDegreeAttacker, self).__init__(_recommender, _target_item, _num_fake_entities, _num_fake_ratings)
 
-    def attack(self, verbose = False):
+    def build_profile(self):
         degrees = self.get_degree_dictionary()
         del degrees[self.target_item]
 
         sorted_ids = [a[0] for a in Counter(degrees).most_common(len(degrees))]
-        entities = [self.add_fake_entity() for i in range(self.num_fake_entities)]
-        i = 0
-        for j in range(self.num_fake_ratings):
-            for entity in entities:
-                self.recommender._attacker_add_edge(entity, sorted_ids[i % len(sorted_ids)], 5)
-                i += 1
-        for entity in entities:
-            self.recommender._attacker_add_edge(entity, self.target_item, 5)
+        return self.round_robin_profile(sorted_ids, 5)
 
 class HillClimbingAttacker(BaseAttacker):
-    # Standard Hill Climbing Algorithm (white box)
-    # Doesn't take into account weights, ignores _num_fake_ratings
-    def __init__(self, _recommender, _target_item, _num_fake_entities, _num_fake_ratings):
+    """Standard Hill Climbing Algorithm (white box)
+
+    Greedily picks the items that cover the most entities not covered by the
+    items picked before (an item also covers itself), and spreads the fake
+    ratings over them in that order.
+
+    Coverage is submodular, so the gain of an item only shrinks as items are
+    picked.  The greedy is thus run lazily (CELF): a heap holds an upper
+    bound on the gain of every item, and only the gain of the item on top is
+    recomputed until an up to date gain comes out on top.
+
+    Ties go to the item the original greedy picked, which took the first
+    item of largest gain in the iteration order of a Counter over the
+    remaining items.  That order depends on the dict's hash table rather
+    than on the item ids, so on ties the Counter is rebuilt the same way to
+    find it.
+
+    Doesn't take into account weights.
+    """
+    supports_stages = False  # see `round_robin_profile`
+
+    def __init__(self, _recommender, _target_item, _num_fake_entities, _num_fake_ratings,
+            _max_chosen_items=None):
+        """
+        :param _max_chosen_items: (optional) the number of items to pick
+            before stopping.  Defaults to the number of fake ratings, as more
+            items would not be rated anyway.
+        """
+        self.max_chosen_items = _max_chosen_items
         super(HillClimbingAttacker, self).__init__(_recommender, _target_item, _num_fake_entities, _num_fake_ratings)
-    def attack(self, verbose = False):
+
+    def choose_items(self):
+        """Returns the items to rate, in the order the greedy picks them."""
         network = self.recommender._G
-        seen = set()
-        chosen = []
+        max_chosen_items = self.max_chosen_items
+        if max_chosen_items is None:
+            max_chosen_items = self.num_fake_entities * self.num_fake_ratings
+
+        # Dense indices of the neighbors of every item.  The dict is filled
+        # (and the target deleted from it) as the original greedy did, so
+        # that it iterates in the same order, see `_first_in_counter_order`.
         neighbors = {}
         for item_id in network.get_items():
-            neighbors[item_id] = set(network.get_neighbors(item_id) + [item_id])
-        del neighbors[self.target_item]
-        while True: # exits when all nodes are seen
-            intersects = Counter({item_id : len(neighbors[item_id] - seen) for item_id in neighbors})
-            if len(intersects) == 0:
-                break
-            [(next_item, count)] = intersects.most_common(1)
-            if (count == 0):
+            neighbors[item_id] = (
+                np.array(network.get_neighbors(item_id), dtype=np.int64) - 1
+            ) // 2
+        neighbors.pop(self.target_item, None)
+        num_entities = 1 + max([0] + [
+            int(entities.max()) for entities in neighbors.itervalues() if len(entities)
+        ])
+        covered = np.zeros(num_entities, dtype=bool)
+
+        # (-gain, item, number of items chosen when the gain was computed)
+        heap = [(-(len(entities) + 1), item_id, 0) for item_id, entities in neighbors.iteritems()]
+        heapq.heapify(heap)
+        chosen = []
+        while heap and len(chosen) < max_chosen_items:
+            negative_gain, item_id, stamp = heapq.heappop(heap)
+            if stamp != len(chosen):
+                entities = neighbors[item_id]
+                gain = 1 + len(entities) - np.count_nonzero(covered[entities])
+                heapq.heappush(heap, (-gain, item_id, len(chosen)))
+                continue
+            if negative_gain == 0:
                 break
-            chosen.append(next_item)
-            seen |= set(neighbors[next_item])
 
-            del neighbors[next_item]
-
-        entities = [self.add_fake_entity() for i in range(self.num_fake_entities)]
-        i = 0
-        for j in range(self.num_fake_ratings):
-            for entity in entities:
-                self.recommender._attacker_add_edge(entity, chosen[i % len(chosen)], 5)
-                i += 1
+            # Gather the other items with the same, up to date gain.
+            ties = [item_id]
+            while heap and heap[0][0] == negative_gain:
+                _, other_id, stamp = heapq.heappop(heap)
+                if stamp != len(chosen):
+                    entities = neighbors[other_id]
+                    gain = 1 + len(entities) - np.count_nonzero(covered[entities])
+                    heapq.heappush(heap, (-gain, other_id, len(chosen)))
+                else:
+                    ties.append(other_id)
+            if len(ties) > 1:
+                item_id = self._first_in_counter_order(neighbors, ties)
+                for other_id in ties:
+                    if other_id != item_id:
+                        heapq.heappush(heap, (negative_gain, other_id, len(chosen)))
+
+            chosen.append(item_id)
+            covered[neighbors.pop(item_id)] = True
+        return chosen
+
+    @staticmethod
+    def _first_in_counter_order(neighbors, item_ids):
+        """Returns the first of `item_ids` in the iteration order of the
+        Counter the original greedy built over the items of `neighbors`.
+        Its values do not matter to the order, only its keys.
+        """
+        item_ids = set(item_ids)
+        for item_id in Counter({item_id: 0 for item_id in neighbors}):
+            if item_id in item_ids:
+                return item_id
 
-        for entity in entities:
-            self.recommender._attacker_add_edge(entity, self.target_item, 5)
+    def build_profile(self):
+        return self.round_robin_profile(self.choose_items(), 5)
 
 
 class BlackBoxRWRAttacker(BaseAttacker):
@@ -202,16 +359,30 @@ class BlackBoxRWRAttacker(BaseAttacker):
     top `_num_items_to_scout`, creates a fake entity that adds a high review
     to that item and to the target item.
 
+    The items are probed with hypothetical ratings of the scout (see
+    `BaseRecommender.recommend_what_if`), which leave the graph as it is.
+    Probes run in this process by default, which also works inside the
+    daemonic workers of a `Scheduler` or campaign.  With `_num_workers`, they
+    are fanned out to worker processes instead, see `imap_shared`.
+
     NOTE: doesn't use _num_fake_ratings, always only makes one rating per
     fake user.
     """
 
     def __init__(self, _num_items_to_scout, _num_recs, *args, **kwargs):
+        """
+        :param _num_workers: (optional keyword) the number of processes to
+            scout with, defaults to 1 (probing in this process).
+        """
+        self.num_workers = kwargs.pop('_num_workers', 1)
         super(BlackBoxRWRAttacker, self).__init__(*args, **kwargs)
         self.num_items_to_scout = _num_items_to_scout
         self.num_recs = _num_recs
+        self._weighted_degrees = None
 
-    def attack(self, verbose = False):
+    def build_profile(self):
+        """Returns the AttackProfile of this attack.  Scouting adds a scout
+        entity to the graph."""
         item_to_approx_rwr = self.run_scout()
 
         max_rating = self.recommender._G.max_rating
@@ -220,24 +391,64 @@ class BlackBoxRWRAttacker(BaseAttacker):
             key=lambda (iid, approx_rwr): approx_rwr, reverse=True
         )
 
-        for i in range(self.num_fake_entities):
-            fake_entity_id = self.add_fake_entity()
-            item_to_attack = sorted_items[i % len(sorted_items)][0]
-            self.recommender._attacker_add_edge(
-                fake_entity_id, item_to_attack, max_rating
-            )
-            self.recommender._attacker_add_edge(
-                fake_entity_id, self.target_item, max_rating
-            )
+        items_to_attack = [
+            sorted_items[i % len(sorted_items)][0]
+            for i in range(self.num_fake_entities)
+        ]
+        entities = np.arange(self.num_fake_entities)
+        return AttackProfile(
+            self.num_fake_entities, np.concatenate([entities, entities]),
+            np.concatenate([items_to_attack, np.repeat(self.target_item, self.num_fake_entities)]),
+            np.full(2 * self.num_fake_entities, max_rating, dtype=np.float64)
+        )
 
     def run_scout(self):
+        """Returns a map of item -> approximate RWR for the top items."""
         scout_id = self.add_fake_entity()
+        return self.score_items(
+            scout_id, [item for item, _ in self.get_top_items()]
+        )
+
+    def probe(self, scout_id, item_ids):
+        """Returns a map of item -> the recommendations `scout_id` gets when
+        it rates the item highly, for every item in `item_ids`.
+
+        Every item is probed with a freshly re-seeded random state, so the
+        result does not depend on the number of workers.
+        """
+        seed = np.random.randint(2 ** 31)
+        return dict(imap_shared(
+            _probe_task, self, [(scout_id, item) for item in item_ids],
+            num_workers=self.num_workers, seed=seed
+        ))
+
+    def recommend_with_edge(self, entity_id, item_id):
+        """Returns the recommendations for `entity_id` if it rated `item_id`
+        highly, see `BaseRecommender.recommend_what_if`.
+        """
+        max_rating = self.recommender._G.max_rating
+        return self.recommender.recommend_what_if(
+            entity_id, self.num_recs, added_edges=[(item_id, max_rating)]
+        )
 
-        item_to_approx_rwr = dict(
-            (item, self.approx_rwr(scout_id, item))
-            for item, _ in self.get_top_items()
+    def score_items(self, scout_id, item_ids):
+        """Returns a map of item -> approximate RWR for every item in
+        `item_ids`, probed by `scout_id`.
+        """
+        weighted_degrees = self.get_weighted_degrees()
+        return dict(
+            (item, sum(weighted_degrees[iid] for iid in recs))
+            for item, recs in self.probe(scout_id, item_ids).iteritems()
         )
-        return item_to_approx_rwr
+
+    def get_weighted_degrees(self):
+        """Returns a map of item -> weighted degree, computed once per
+        attacker.  The attacker's own probes never change it, as their edges
+        are only hypothetical.
+        """
+        if self._weighted_degrees is None:
+            self._weighted_degrees = self.recommender._G.get_weighted_item_to_degree()
+        return self._weighted_degrees
 
     def get_top_items(self):
         """Return the top `num_items_to_scout` according to weighted degree
@@ -253,21 +464,18 @@ class BlackBoxRWRAttacker(BaseAttacker):
         with higher RWR.
         """
         return sorted(
-            self.recommender._G.get_weighted_item_to_degree().iteritems(),
+            self.get_weighted_degrees().iteritems(),
             key=lambda (iid, weighted_deg): weighted_deg,
             reverse=True
         )[:self.num_items_to_scout]
 
     def approx_rwr(self, entity_id, item_id):
-        max_rating = self.recommender._G.max_rating
-        self.recommender._attacker_add_edge(entity_id, item_id, max_rating)
-        recs = self.recommender.recommend(entity_id, self.num_recs)
-        self.recommender._G.del_edge(entity_id, item_id)
+        return self.score_items(entity_id, [item_id])[item_id]
 
-        return sum(
-            self.recommender._G.get_weighted_degree(iid)
-            for iid in recs
-        )
+def _probe_task(attacker, task):
+    """Worker-side entry point for `BlackBoxRWRAttacker.probe`."""
+    scout_id, item_id = task
+    return item_id, attacker.recommend_with_edge(scout_id, item_id)
 
 class BlackBoxDeepRWRAttacker(BlackBoxRWRAttacker):
     """A BlackBoxRWRAttacker that goes deeper.
@@ -279,29 +487,92 @@ class BlackBoxDeepRWRAttacker(BlackBoxRWRAttacker):
     '_rec_tree_depth' levels deep when summing the weighted degree of
     neighbors.
 
-    TODO: allow a variant of this class that only counts the
-    weighted degree of the *set* of items found in the recommendation
-    tree.
+    The tree is explored breadth first: all the items of a level are probed
+    at once (see `probe`), and every distinct item is probed only once per
+    attack, however often it shows up in the tree.  The value of the subtree
+    under an item is memoized by (item, depth).
+
+    With `_distinct_items`, the weighted degree of the *set* of items found
+    in the recommendation tree is counted instead, so that items that show
+    up repeatedly count once.
     """
 
     def __init__(self, _rec_tree_depth, *args, **kwargs):
+        """
+        :param _distinct_items: (optional keyword) if True, count the set of
+            items in the tree rather than its leaves.
+        """
+        self.distinct_items = kwargs.pop('_distinct_items', False)
         super(BlackBoxDeepRWRAttacker, self).__init__(*args, **kwargs)
         self.rec_tree_depth = _rec_tree_depth
 
-    def approx_rwr(self, entity_id, item_id):
-        return self.approx_rwr_recurse(entity_id, item_id, self.rec_tree_depth)
-
-    def approx_rwr_recurse(self, entity_id, item_id, depth):
-        if depth == 0:
-            return 0
-        elif depth == 1:
-            return BlackBoxRWRAttacker.approx_rwr(self, entity_id, item_id)
-        else:
-            max_rating = self.recommender._G.max_rating
-            self.recommender._attacker_add_edge(entity_id, item_id, max_rating)
-            recs = self.recommender.recommend(entity_id, self.num_recs)
-            self.recommender._G.del_edge(entity_id, item_id)
-            return sum(
-                self.approx_rwr_recurse(entity_id, iid, depth - 1)
-                for iid in recs
+    def explore_tree(self, scout_id, item_ids):
+        """Returns a map of item -> recommendations for every item within
+        `rec_tree_depth` - 1 levels of the recommendation trees under
+        `item_ids`.
+        """
+        recs = {}
+        level = item_ids
+        for _ in range(self.rec_tree_depth):
+            to_probe = sorted(set(level) - set(recs))
+            recs.update(self.probe(scout_id, to_probe))
+            level = set(rec for item in level for rec in recs[item])
+        return recs
+
+    def score_items(self, scout_id, item_ids):
+        recs = self.explore_tree(scout_id, item_ids)
+        weighted_degrees = self.get_weighted_degrees()
+
+        if self.distinct_items:
+            reached = {}  # (item, depth) -> items in the tree under item
+            def reach(item_id, depth):
+                if depth == 0:
+                    return frozenset()
+                if (item_id, depth) not in reached:
+                    items = set(recs[item_id])
+                    for iid in recs[item_id]:
+                        items |= reach(iid, depth - 1)
+                    reached[item_id, depth] = frozenset(items)
+                return reached[item_id, depth]
+            return dict(
+                (item, sum(weighted_degrees[iid] for iid in reach(item, self.rec_tree_depth)))
+                for item in item_ids
             )
+
+        values = {}  # (item, depth) -> value of the subtree under item
+        def value(item_id, depth):
+            if depth == 0:
+                return 0
+            if (item_id, depth) not in values:
+                if depth == 1:
+                    values[item_id, depth] = sum(
+                        weighted_degrees[iid] for iid in recs[item_id]
+                    )
+                else:
+                    values[item_id, depth] = sum(
+                        value(iid, depth - 1) for iid in recs[item_id]
+                    )
+            return values[item_id, depth]
+        return dict(
+            (item, value(item, self.rec_tree_depth)) for item in item_ids
+        )
+
+class ReplayAttacker(BaseAttacker):
+    """Replays a saved attack profile (see `BaseAttacker.save_profile`) in
+    bulk, without running the attack that produced it."""
+
+    def __init__(self, _recommender, _profile):
+        """
+        :param _profile: the AttackProfile, or the name of the file it was
+            saved to.
+        """
+        if not isinstance(_profile, AttackProfile):
+            _profile = AttackProfile.load(_profile)
+        self.profile = _profile
+        super(ReplayAttacker, self).__init__(
+            _recommender, _profile.metadata.get('target_item'),
+            _profile.num_fake_entities, _profile.metadata.get('num_fake_ratings')
+        )
+
+    def build_profile(self):
+        return self.profile
@@ -0,0 +1,310 @@
+"""
+Vectorized generation of shilling attack profiles.
+
+An attack profile holds the ratings of every fake entity of an attack.  Most
+shilling attacks (see [B. Mobasher et al. Toward Trustworthy Recommender
+Systems]) build each profile from
+
+    - the target item, rated with the highest rating,
+    - optionally, a set of selected items, rated by every fake entity,
+    - filler items, drawn at random for every fake entity.
+
+`ProfileGenerator` draws all the profiles of an attack at once, as a matrix
+of fake entities x filler items, and `AttackProfile.inject` adds them to a
+recommender's graph in one go.  Strategies:
+
+    - random: filler ratings follow the normal distribution of all ratings.
+    - average: filler ratings follow a normal distribution around the
+      average rating of each filler item.
+    - neighbor: like average, but filler items are items two hops away from
+      the target item.
+    - bandwagon: the most popular items are selected and rated highest;
+      filler ratings are drawn as in the random attack.
+    - segment: the given segment items are selected and rated highest;
+      filler items are rated lowest.
+
+Profiles can be saved to and loaded from .npz files (see `AttackProfile.save`)
+holding the number of fake entities, the rating arrays in the smallest dtypes
+that hold them, and JSON metadata about the attack, e.g. the attacker, target
+item and seed.  An expensive attack can thus be computed once and replayed
+against any number of recommenders.
+"""
+
+import json
+
+import numpy as np
+
+from gbra.feature_extraction.cooccurrence import CooccurrenceEngine
+
+class AttackProfile(object):
+    """The ratings of the fake entities of an attack.
+
+    Fake entity `entities[i]` (in 0 .. num_fake_entities - 1) rates item
+    `items[i]` with `ratings[i]`.
+    """
+
+    def __init__(self, num_fake_entities, entities, items, ratings, metadata=None):
+        """
+        :param metadata: (optional) a JSON serializable dict describing the
+            attack.
+        """
+        self.num_fake_entities = num_fake_entities
+        self.entities = np.asarray(entities, dtype=np.int64)
+        self.items = np.asarray(items, dtype=np.int64)
+        self.ratings = np.asarray(ratings, dtype=np.float64)
+        self.metadata = dict(metadata or {})
+
+    def __len__(self):
+        return len(self.items)
+
+    def select(self, start, stop):
+        """Returns the AttackProfile of fake entities `start` .. `stop` - 1 of
+        this profile, renumbered from 0."""
+        keep = (self.entities >= start) & (self.entities < stop)
+        return AttackProfile(
+            stop - start, self.entities[keep] - start, self.items[keep],
+            self.ratings[keep], self.metadata
+        )
+
+    def inject(self, recommender):
+        """Adds the fake entities and their ratings to the recommender's
+        graph, and returns the array of their node IDs.
+        """
+        fake_entities = recommender._attacker_add_entities(self.num_fake_entities)
+        recommender._attacker_add_edges(
+            fake_entities[self.entities], self.items, self.ratings
+        )
+        return fake_entities
+
+    def apply(self, graph):
+        """Adds the fake entities and their ratings to `graph` directly, for
+        graphs that no recommender is attached to, and returns the array of
+        their node IDs.
+        """
+        fake_entities = graph.add_entities(self.num_fake_entities)
+        graph.add_edges(fake_entities[self.entities], self.items, self.ratings)
+        return fake_entities
+
+    def save(self, filename):
+        """Saves this profile to the .npz file `filename`."""
+        ratings = self.ratings
+        if (ratings.astype(np.float32) == ratings).all():
+            ratings = ratings.astype(np.float32)
+        with open(filename, 'wb') as fout:
+            np.savez_compressed(
+                fout, num_fake_entities=self.num_fake_entities,
+                entities=self.entities.astype(_smallest_int_dtype(self.entities)),
+                items=self.items.astype(_smallest_int_dtype(self.items)),
+                ratings=ratings,
+                metadata=json.dumps(self.metadata, sort_keys=True)
+            )
+
+    @staticmethod
+    def load(filename):
+        """Returns the profile saved to `filename` by `save`."""
+        with np.load(filename) as profile:
+            return AttackProfile(
+                int(profile['num_fake_entities']), profile['entities'],
+                profile['items'], profile['ratings'],
+                json.loads(str(profile['metadata']))
+            )
+
+def _smallest_int_dtype(values):
+    """Returns the smallest of int32 and int64 that holds `values`."""
+    if not len(values) or (values.min() >= -2 ** 31 and values.max() < 2 ** 31):
+        return np.int32
+    return np.int64
+
+def sample_rows(pool, num_rows, k, rng=np.random):
+    """Returns a (num_rows, k) array whose rows hold k distinct elements of
+    `pool` each, drawn uniformly at random.  `k` is capped at len(pool).
+    """
+    pool = np.asarray(pool)
+    k = min(k, len(pool))
+    if k == 0:
+        return np.zeros((num_rows, 0), dtype=pool.dtype)
+
+    if 2 * k > len(pool):
+        # Most of the pool is drawn: take prefixes of random permutations.
+        keys = rng.random_sample((num_rows, len(pool)))
+        return pool[np.argsort(keys, axis=1)[:, :k]]
+
+    # Draw with replacement, then redraw repeated elements until every row
+    # is distinct.  Each redraw succeeds with probability at least 1/2.
+    indices = rng.randint(len(pool), size=(num_rows, k))
+    while True:
+        indices.sort(axis=1)
+        repeated = np.zeros(indices.shape, dtype=bool)
+        repeated[:, 1:] = indices[:, 1:] == indices[:, :-1]
+        num_repeated = np.count_nonzero(repeated)
+        if not num_repeated:
+            break
+        indices[repeated] = rng.randint(len(pool), size=num_repeated)
+    return pool[indices]
+
+class ProfileGenerator(object):
+    """Generates attack profiles against a graph.
+
+    Item statistics are computed once per generator, so reuse a generator
+    to build several profiles against the same graph.
+    """
+
+    def __init__(self, graph, rng=np.random, cooccurrence=None):
+        """
+        :param graph: the EIGraph (or MmapEIGraph) under attack.
+        :param rng: the numpy random state to draw from.
+        :param cooccurrence: (optional) the CooccurrenceEngine of `graph` to
+            find items two hops away with, e.g. one shared across generators.
+        """
+        self._graph = graph
+        self._rng = rng
+        self._cooccurrence = cooccurrence or CooccurrenceEngine(graph)
+        self._item_stats = None
+        self.min_rating, self.max_rating = graph.rating_range
+
+    def _get_item_stats(self):
+        """Returns the (counts, averages) arrays of the ratings of every item,
+        indexed by item id / 2 - 1, and the (mean, std) of all the ratings.
+        """
+        if self._item_stats is None:
+            counts, averages, variances = self._graph.get_item_rating_moments()
+            num_ratings = max(counts.sum(), 1)
+            mean = np.dot(counts, averages) / num_ratings
+            # The variance within items plus the variance of their averages.
+            variance = np.dot(counts, variances + (averages - mean) ** 2) / num_ratings
+            self._item_stats = (counts, averages, mean, np.sqrt(variance))
+        return self._item_stats
+
+    def get_rating_distribution(self):
+        """Returns the (mean, std) of all the ratings of the graph."""
+        _, _, mean, std = self._get_item_stats()
+        return mean, std
+
+    def _get_candidate_items(self, target_item):
+        items = np.asarray(sorted(self._graph.get_items()), dtype=np.int64)
+        return items[items != target_item]
+
+    def get_neighbor_items(self, target_item):
+        """Returns the sorted array of the items two hops away from
+        `target_item`, i.e. rated by an entity that rated the target.
+        """
+        return self._cooccurrence.neighbor_items(target_item)
+
+    def get_popular_items(self, num_items, excluding=None):
+        """Returns the `num_items` items with the most ratings, most rated
+        first (ties go to the lowest item id).
+        """
+        counts, _, _, _ = self._get_item_stats()
+        items = 2 * (np.argsort(-counts, kind='mergesort') + 1)
+        if excluding is not None:
+            items = items[items != excluding]
+        return items[:num_items]
+
+    def _build(self, target_item, num_fake_entities, filler_items, filler_ratings,
+            selected_items=(), selected_rating=None):
+        """Returns the AttackProfile of `num_fake_entities` fake entities that
+        rate the target item and the selected items, and the (num fake
+        entities, num filler items) matrices of filler items and ratings.
+        """
+        selected_items = np.asarray(selected_items, dtype=np.int64)
+        num_selected = len(selected_items)
+        num_filler = filler_items.shape[1]
+        entities = np.repeat(
+            np.arange(num_fake_entities), num_filler + num_selected + 1
+        )
+        items = np.hstack([
+            filler_items,
+            np.tile(selected_items, (num_fake_entities, 1)),
+            np.full((num_fake_entities, 1), target_item, dtype=np.int64),
+        ])
+        ratings = np.hstack([
+            filler_ratings,
+            np.full((num_fake_entities, num_selected), selected_rating, dtype=np.float64),
+            np.full((num_fake_entities, 1), self.max_rating, dtype=np.float64),
+        ])
+        return AttackProfile(num_fake_entities, entities, items.ravel(), ratings.ravel())
+
+    def random_profile(self, target_item, num_fake_entities, num_filler_items,
+            rating_mean=None, rating_std=None):
+        """Returns the profile of a random attack.
+
+        :param rating_mean: (optional) the mean of the filler ratings,
+            defaults to the mean rating of the graph, as does `rating_std`
+            to the standard deviation.
+        """
+        mean, std = self.get_rating_distribution()
+        mean = mean if rating_mean is None else rating_mean
+        std = std if rating_std is None else rating_std
+        filler_items = sample_rows(
+            self._get_candidate_items(target_item), num_fake_entities,
+            num_filler_items, self._rng
+        )
+        filler_ratings = self._rng.normal(mean, std, filler_items.shape)
+        return self._build(target_item, num_fake_entities, filler_items, filler_ratings)
+
+    def _average_ratings(self, filler_items, rating_std):
+        _, averages, _, _ = self._get_item_stats()
+        return self._rng.normal(averages[filler_items // 2 - 1], rating_std)
+
+    def average_profile(self, target_item, num_fake_entities, num_filler_items,
+            rating_std=1.1):
+        """Returns the profile of an average attack."""
+        filler_items = sample_rows(
+            self._get_candidate_items(target_item), num_fake_entities,
+            num_filler_items, self._rng
+        )
+        return self._build(
+            target_item, num_fake_entities, filler_items,
+            self._average_ratings(filler_items, rating_std)
+        )
+
+    def neighbor_profile(self, target_item, num_fake_entities, num_filler_items,
+            rating_std=1.1):
+        """Returns the profile of a neighbor attack.  Fake entities rate
+        fewer filler items if there are fewer items two hops away.
+        """
+        filler_items = sample_rows(
+            self.get_neighbor_items(target_item), num_fake_entities,
+            num_filler_items, self._rng
+        )
+        return self._build(
+            target_item, num_fake_entities, filler_items,
+            self._average_ratings(filler_items, rating_std)
+        )
+
+    def bandwagon_profile(self, target_item, num_fake_entities, num_filler_items,
+            num_selected_items):
+        """Returns the profile of a bandwagon attack, which rates the
+        `num_selected_items` most popular items highest.
+        """
+        selected_items = self.get_popular_items(num_selected_items, excluding=target_item)
+        candidates = self._get_candidate_items(target_item)
+        candidates = candidates[~np.in1d(candidates, selected_items)]
+        filler_items = sample_rows(
+            candidates, num_fake_entities, num_filler_items, self._rng
+        )
+        mean, std = self.get_rating_distribution()
+        return self._build(
+            target_item, num_fake_entities, filler_items,
+            self._rng.normal(mean, std, filler_items.shape),
+            selected_items, self.max_rating
+        )
+
+    def segment_profile(self, target_item, num_fake_entities, num_filler_items,
+            segment_items):
+        """Returns the profile of a segment attack, which rates the
+        `segment_items` (items liked by the targeted segment of entities)
+        highest and the filler items lowest.
+        """
+        segment_items = np.asarray(segment_items, dtype=np.int64)
+        segment_items = segment_items[segment_items != target_item]
+        candidates = self._get_candidate_items(target_item)
+        candidates = candidates[~np.in1d(candidates, segment_items)]
+        filler_items = sample_rows(
+            candidates, num_fake_entities, num_filler_items, self._rng
+        )
+        return self._build(
+            target_item, num_fake_entities, filler_items,
+            np.full(filler_items.shape, self.min_rating, dtype=np.float64),
+            segment_items, self.max_rating
+        )
@@ -0,0 +1,213 @@
+"""
+External-memory import of rating files into memory-mapped graphs.
+
+`ingest_ratings` writes EIGraph files, which are loaded into memory as a
+whole, so the graphs they can hold are bounded by the memory of the machine.
+`import_edge_list` instead imports a rating file (user, item, rating[,
+timestamp], see `iter_rating_chunks`) of any size into a graph directory that
+`MmapEIGraph` maps into memory (see `gbra.util.mmap_ei_graph` for the
+layout):
+
+    1. A first pass collects the distinct users and items, and the number of
+       ratings of each.
+    2. A second pass remaps the ids densely and partitions the ratings on
+       disk into buckets of consecutive entities.
+    3. Every entity bucket is sorted and deduplicated in memory, appended to
+       the entity side arrays, and partitioned on disk into buckets of
+       consecutive items.
+    4. Every item bucket is sorted and appended to the item side arrays.
+
+Besides the per-user and per-item arrays (ids, counts and row pointers, a few
+dozen bytes per node), memory use is bounded by the chunk size of the reader
+and the bucket size.
+"""
+
+import json
+import os
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+
+from gbra.data.ingest import _assign_buckets, _count_ids, _partition, \
+    iter_rating_chunks
+from gbra.util import mmap_ei_graph
+from gbra.util.mmap_ei_graph import MmapEIGraph
+
+# A rating while it is being sorted: `order` is its position in the file.
+_RECORD_DTYPE = np.dtype([
+    ('entity', np.int64), ('item', np.int64), ('order', np.int64),
+    ('weight', np.float64), ('timestamp', np.int64)
+])
+
+class _NpyWriter(object):
+    """Writes a one-dimensional .npy file whose length is not known up front,
+    one block at a time.
+    """
+
+    # The header is padded to a fixed size, so that it can be rewritten with
+    # the final length once all the blocks are written.
+    HEADER_SIZE = 128
+
+    def __init__(self, filename, dtype):
+        self._file = open(filename, 'wb')
+        self._dtype = np.dtype(dtype)
+        self._length = 0
+        self._file.write(self._header())
+
+    def _header(self):
+        header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (
+            np.lib.format.dtype_to_descr(self._dtype), self._length
+        )
+        # magic string, version, header length, header, newline
+        header = header.ljust(self.HEADER_SIZE - 6 - 2 - 2 - 1) + '\n'
+        return np.lib.format.MAGIC_PREFIX + '\x01\x00' + \
+            struct.pack('<H', len(header)) + header
+
+    def write(self, values):
+        np.asarray(values, dtype=self._dtype).tofile(self._file)
+        self._length += len(values)
+
+    def close(self):
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.close()
+
+def _index_dtype(num_nodes):
+    return np.int32 if num_nodes < 2 ** 31 else np.int64
+
+def import_edge_list(filename, output_directory, max_bucket_edges=2 ** 23,
+        **kwargs):
+    """Imports the ratings in the rating file into a graph directory in
+    `output_directory`, and returns the `MmapEIGraph` of it.
+
+    Users and items are remapped densely in increasing order of their ids:
+    the smallest user id becomes entity 1, the next one entity 3 and so on.
+    The original ids are kept in the graph directory.  If a user rates an
+    item more than once, the last rating in the file wins.
+
+    :param max_bucket_edges: about the number of ratings sorted in memory at
+        once.  Each takes 40 bytes, and sorting takes about three times as
+        much memory as the ratings themselves.
+    :param kwargs: passed on to `iter_rating_chunks`.  Unlike there, ratings
+        are not checked against a range unless `rating_range` is given.
+    :raises ValueError: if the file is malformed.
+    """
+    kwargs.setdefault('rating_range', None)
+    if not os.path.isdir(output_directory):
+        os.makedirs(output_directory)
+    def output(name):
+        return os.path.join(output_directory, name)
+
+    # First pass: collect the distinct ids and count their ratings.
+    user_ids = item_ids = np.array([], dtype=np.int64)
+    user_counts = item_counts = np.array([], dtype=np.int64)
+    has_timestamps = True
+    for users, items, _, timestamps in iter_rating_chunks(filename, **kwargs):
+        user_ids, user_counts = _count_ids(user_ids, user_counts, users)
+        item_ids, item_counts = _count_ids(item_ids, item_counts, items)
+        has_timestamps = timestamps is not None
+    num_entities, num_items = len(user_ids), len(item_ids)
+    entity_buckets = _assign_buckets(user_counts, max_bucket_edges)
+    item_buckets = _assign_buckets(item_counts, max_bucket_edges)
+    del user_counts, item_counts
+
+    tmp_directory = tempfile.mkdtemp(prefix='.import-', dir=output_directory)
+    entity_pattern = os.path.join(tmp_directory, 'entities-%d.bin')
+    item_pattern = os.path.join(tmp_directory, 'items-%d.bin')
+    try:
+        # Second pass: remap the ids and partition the ratings by entity.
+        num_ratings = 0
+        for users, items, ratings, timestamps in iter_rating_chunks(filename, **kwargs):
+            records = np.empty(len(users), dtype=_RECORD_DTYPE)
+            records['entity'] = np.searchsorted(user_ids, users)
+            records['item'] = np.searchsorted(item_ids, items)
+            records['order'] = np.arange(num_ratings, num_ratings + len(users))
+            records['weight'] = ratings
+            records['timestamp'] = -1 if timestamps is None else timestamps
+            _partition(records, entity_buckets[records['entity']], entity_pattern)
+            num_ratings += len(users)
+
+        np.save(output(mmap_ei_graph.USER_IDS), user_ids)
+        np.save(output(mmap_ei_graph.ITEM_IDS), item_ids)
+        del user_ids, item_ids
+
+        # Sort every entity bucket by (entity, item, order) and keep the last
+        # rating of every edge.
+        entity_degrees = np.zeros(num_entities, dtype=np.int64)
+        rating_histogram = {}
+        items_out = _NpyWriter(
+            output(mmap_ei_graph.ENTITY_ITEMS), _index_dtype(num_items)
+        )
+        weights_out = _NpyWriter(output(mmap_ei_graph.ENTITY_WEIGHTS), np.float64)
+        if has_timestamps:
+            timestamps_out = _NpyWriter(
+                output(mmap_ei_graph.ENTITY_TIMESTAMPS), np.int64
+            )
+        for bucket in xrange(entity_buckets.max() + 1 if num_entities else 0):
+            records = np.fromfile(entity_pattern % bucket, dtype=_RECORD_DTYPE)
+            os.remove(entity_pattern % bucket)
+            records = records[np.lexsort(
+                (records['order'], records['item'], records['entity'])
+            )]
+            last = np.ones(len(records), dtype=bool)
+            last[:-1] = (records['entity'][1:] != records['entity'][:-1]) | \
+                (records['item'][1:] != records['item'][:-1])
+            records = records[last]
+
+            entities, degrees = np.unique(records['entity'], return_counts=True)
+            entity_degrees[entities] = degrees
+            items_out.write(records['item'])
+            weights_out.write(records['weight'])
+            if has_timestamps:
+                timestamps_out.write(records['timestamp'])
+            for rating, count in zip(*np.unique(records['weight'], return_counts=True)):
+                rating = rating.item()
+                rating_histogram[rating] = rating_histogram.get(rating, 0) + count.item()
+
+            _partition(records, item_buckets[records['item']], item_pattern)
+        items_out.close()
+        weights_out.close()
+        if has_timestamps:
+            timestamps_out.close()
+        np.save(
+            output(mmap_ei_graph.ENTITY_INDPTR),
+            np.concatenate([[0], np.cumsum(entity_degrees)])
+        )
+        del entity_degrees
+
+        # Sort every item bucket by (item, entity); edges are distinct now.
+        item_degrees = np.zeros(num_items, dtype=np.int64)
+        entities_out = _NpyWriter(
+            output(mmap_ei_graph.ITEM_ENTITIES), _index_dtype(num_entities)
+        )
+        weights_out = _NpyWriter(output(mmap_ei_graph.ITEM_WEIGHTS), np.float64)
+        for bucket in xrange(item_buckets.max() + 1 if num_items else 0):
+            records = np.fromfile(item_pattern % bucket, dtype=_RECORD_DTYPE)
+            os.remove(item_pattern % bucket)
+            records = records[np.lexsort((records['entity'], records['item']))]
+
+            items, degrees = np.unique(records['item'], return_counts=True)
+            item_degrees[items] = degrees
+            entities_out.write(records['entity'])
+            weights_out.write(records['weight'])
+        entities_out.close()
+        weights_out.close()
+        np.save(
+            output(mmap_ei_graph.ITEM_INDPTR),
+            np.concatenate([[0], np.cumsum(item_degrees)])
+        )
+
+        with open(output(mmap_ei_graph.INFO), 'w') as fout:
+            json.dump({
+                'num_entities': num_entities,
+                'num_items': num_items,
+                'num_edges': int(item_degrees.sum()),
+                'rating_histogram': sorted(rating_histogram.items()),
+                'has_timestamps': has_timestamps,
+            }, fout)
+    finally:
+        shutil.rmtree(tmp_directory)
+
+    return MmapEIGraph(output_directory)
@@ -0,0 +1,554 @@
+"""
+Streaming ingestion of large rating files into EIGraphs.
+
+Rating files such as the MovieLens releases hold one rating per line,
+
+    user, item, rating[, timestamp]
+
+separated by `::` (ml-1m, ml-10m), tabs (ml-100k) or commas after a header
+line (ml-20m, ml-25m).  `ingest_ratings` reads them in fixed-size chunks and
+parses every chunk into NumPy arrays, which are validated with vectorized
+checks.  A first pass collects the distinct users and items so that their ids
+can be remapped densely, and a second pass partitions the remapped ratings on
+disk into buckets of consecutive entities.  Every bucket is then sorted, and
+its edges are handed to SNAP and its weights appended to the files of the
+graph, without building an EIGraph.  Besides the SNAP graph, which takes a few
+bytes per edge, memory use is bounded by the chunk size, the bucket size and
+the number of distinct users and items.
+
+The timestamps of the ratings are written next to the graph, in a file that
+`load_edge_timestamps` maps into memory.
+
+BeerAdvocate reviews are multi-line records instead, see
+`parse_beeradvocate`, which parses them on several cores at once.
+"""
+
+import gzip
+import marshal
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+from itertools import izip
+
+import numpy as np
+import snap
+
+from gbra.util.ei_graph import EIGraph
+from gbra.util.parallel_utils import imap_bounded
+
+# Record of the timestamp file: one per edge, in the order they were read.
+TIMESTAMPS_DTYPE = np.dtype([
+    ('entity', np.int64), ('item', np.int64), ('timestamp', np.int64)
+])
+
+def get_timestamps_filename(filename):
+    """Returns the name of the timestamp file of the graph in `filename`."""
+    return filename + '.ei_timestamps'
+
+def load_edge_timestamps(filename):
+    """Returns a read-only, memory-mapped array of `TIMESTAMPS_DTYPE`
+    records holding the timestamp of every edge of the graph in `filename`.
+    """
+    return np.memmap(
+        get_timestamps_filename(filename), dtype=TIMESTAMPS_DTYPE, mode='r'
+    )
+
+def sniff_layout(filename):
+    """Returns the (separator, has_header) pair of the rating file."""
+    with open(filename) as fin:
+        line = fin.readline()
+    for separator in ('::', '\t', ','):
+        if separator in line:
+            break
+    else:
+        raise ValueError("Unknown layout of %s: %r" % (filename, line))
+
+    try:
+        float(line.split(separator)[0])
+        has_header = False
+    except ValueError:
+        has_header = True
+    return separator, has_header
+
+def _find_malformed_line(text, separator, num_columns):
+    """Returns the index of the first line of `text` that does not hold
+    `num_columns` numbers.
+    """
+    for i, line in enumerate(text.split('\n')):
+        try:
+            if len([float(v) for v in line.split(separator)]) != num_columns:
+                return i
+        except ValueError:
+            return i
+    return None
+
+def _parse_chunk(text, separator, first_line, num_columns=4):
+    """Parses the complete lines in `text` into a (num_lines, num_columns)
+    array.
+    """
+    text = text.strip()
+    if not text:
+        return np.zeros((0, num_columns))
+
+    num_lines = text.count('\n') + 1
+    # np.fromstring splits on any whitespace, including line breaks.
+    if separator.strip():
+        values = np.fromstring(text.replace(separator, ' '), sep=' ')
+    else:
+        values = np.fromstring(text, sep=' ')
+
+    if len(values) != num_columns * num_lines:
+        line = _find_malformed_line(text, separator, num_columns)
+        raise ValueError("Malformed rating on line %d" % (
+            first_line + (line if line is not None else 0)
+        ))
+    return values.reshape(num_lines, num_columns)
+
+def iter_rating_chunks(filename, separator=None, has_header=None,
+        chunk_bytes=2 ** 26, rating_range=(0.5, 5)):
+    """Yields the ratings in the rating file as (users, items, ratings,
+    timestamps) arrays of about `chunk_bytes` bytes of input at a time.
+
+    Files may leave out the timestamp column, in which case the timestamps
+    are None.  The number of columns is taken from the first rating.
+
+    :param separator: (optional) the field separator.  Defaults to the
+        separator found by `sniff_layout`, as does `has_header`.
+    :param rating_range: the (min, max) valid rating, or None to accept any
+        rating.
+    :raises ValueError: on malformed lines, negative or fractional ids or
+        timestamps, and ratings outside of `rating_range`.
+    """
+    if separator is None:
+        separator, sniffed_has_header = sniff_layout(filename)
+        if has_header is None:
+            has_header = sniffed_has_header
+
+    with open(filename, 'rb') as fin:
+        line_number = 1
+        if has_header:
+            fin.readline()
+            line_number += 1
+
+        remainder = fin.readline()
+        num_columns = len(remainder.split(separator))
+        if remainder and num_columns not in (3, 4):
+            raise ValueError("Expected 3 or 4 columns on line %d of %s, got %d" % (
+                line_number, filename, num_columns
+            ))
+        while True:
+            data = fin.read(chunk_bytes)
+            text = remainder + data
+            if data:
+                # Only parse complete lines; the rest goes with the next chunk.
+                end = text.rfind('\n') + 1
+                text, remainder = text[:end], text[end:]
+            elif not text:
+                break
+            else:
+                remainder = ''
+
+            values = _parse_chunk(text, separator, line_number, num_columns)
+            line_number += text.count('\n')
+            if not len(values):
+                continue
+
+            if num_columns == 4:
+                users, items, ratings, timestamps = values.T
+            else:
+                (users, items, ratings), timestamps = values.T, None
+            for name, column in (('id', users), ('id', items), ('timestamp', timestamps)):
+                if column is None:
+                    continue
+                if ((column < 0) | (column != np.floor(column))).any():
+                    raise ValueError("Invalid %s near line %d of %s" % (
+                        name, line_number, filename
+                    ))
+            if rating_range is not None and \
+                    ((ratings < rating_range[0]) | (ratings > rating_range[1])).any():
+                raise ValueError("Rating out of range %s near line %d of %s" % (
+                    rating_range, line_number, filename
+                ))
+
+            yield (
+                users.astype(np.int64), items.astype(np.int64), ratings,
+                None if timestamps is None else timestamps.astype(np.int64)
+            )
+
+def _count_ids(ids, counts, new_ids):
+    """Returns the sorted distinct ids of `ids` and `new_ids`, and the number
+    of times each occurs, where `ids` occur `counts` times.
+    """
+    new_ids, new_counts = np.unique(new_ids, return_counts=True)
+    merged_ids, inverse = np.unique(
+        np.concatenate([ids, new_ids]), return_inverse=True
+    )
+    merged_counts = np.bincount(
+        inverse, weights=np.concatenate([counts, new_counts]),
+        minlength=len(merged_ids)
+    )
+    return merged_ids, merged_counts.astype(np.int64)
+
+def _assign_buckets(counts, max_bucket_edges):
+    """Returns the bucket of every node, given the number of ratings of each.
+
+    Buckets hold runs of consecutive nodes with about `max_bucket_edges`
+    ratings in total; a node with more ratings than that gets a bucket of
+    its own.
+    """
+    if not len(counts):
+        return np.zeros(0, dtype=np.int64)
+    preceding = np.cumsum(counts) - counts
+    return np.unique(preceding // max_bucket_edges, return_inverse=True)[1]
+
+def _partition(records, buckets, filename_pattern):
+    """Appends every record to the file of its bucket."""
+    order = np.argsort(buckets, kind='mergesort')
+    records, buckets = records[order], buckets[order]
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(buckets)) + 1])
+    ends = np.concatenate([starts[1:], [len(buckets)]])
+    for start, end in zip(starts, ends):
+        with open(filename_pattern % buckets[start], 'ab') as fout:
+            records[start:end].tofile(fout)
+
+# An edge while it is being ingested, see `ingest_ratings`.
+_EDGE_DTYPE = np.dtype([
+    ('entity', np.int64), ('item', np.int64), ('weight', np.float64)
+])
+
+def _marshal_weights(entities, items, weights, integral):
+    """Returns the `marshal` encoding of the (entity, item) -> weight entries
+    of a dict, without the delimiters of the dict itself.
+
+    This lets the weights of a graph be written to its `.ei_meta` file a few
+    edges at a time, instead of marshalling a dict of all of them.  Ids and
+    integral weights are encoded as 64-bit ints, other weights as binary
+    floats.
+    """
+    entries = np.empty(len(entities), dtype=[
+        ('tuple', 'S1'), ('length', '<i4'),
+        ('entity_type', 'S1'), ('entity', '<i8'),
+        ('item_type', 'S1'), ('item', '<i8'),
+        ('weight_type', 'S1'), ('weight', '<i8' if integral else '<f8'),
+    ])
+    entries['tuple'] = '('
+    entries['length'] = 2
+    entries['entity_type'] = entries['item_type'] = 'I'
+    entries['entity'] = entities
+    entries['item'] = items
+    entries['weight_type'] = 'I' if integral else 'g'
+    entries['weight'] = weights
+    return entries.tostring()
+
+def ingest_ratings(filename, output_filename, num_users=None, num_items=None,
+        max_bucket_edges=2 ** 23, **kwargs):
+    """Writes the EIGraph of the ratings in the rating file to
+    `output_filename` (see `EIGraph.save`), along with its timestamp file.
+    Load it with `EIGraph.load`.
+
+    By default, users and items are remapped densely in increasing order of
+    their ids: the smallest user id becomes entity 1, the next one entity 3
+    and so on.  Releases whose ids already run from 1 to the number of users
+    (items) can pass `num_users` (`num_items`) to keep them instead: user u
+    becomes entity 2u - 1 and item i becomes item 2i, and users (items) that
+    have no ratings still get a node.
+
+    Ratings are stored as ints if they all are whole numbers, and as floats
+    otherwise.
+    The timestamps of files without a timestamp column are stored as -1.
+
+    :param max_bucket_edges: about the number of ratings sorted in memory at
+        once.
+    :param kwargs: passed on to `iter_rating_chunks`.
+    :raises ValueError: if the file is malformed, repeats a rating, or has ids
+        larger than `num_users` / `num_items`.
+    """
+    # First pass: validate, and count the ratings of every user.
+    user_ids = item_ids = np.array([], dtype=np.int64)
+    user_counts = np.array([], dtype=np.int64)
+    integral_ratings = True
+    for users, items, ratings, _ in iter_rating_chunks(filename, **kwargs):
+        user_ids, user_counts = _count_ids(user_ids, user_counts, users)
+        item_ids = np.union1d(item_ids, items)
+        integral_ratings &= bool((ratings == np.floor(ratings)).all())
+
+    for ids, num_ids, name in ((user_ids, num_users, 'user'), (item_ids, num_items, 'item')):
+        if num_ids is not None and len(ids) and (ids[0] < 1 or ids[-1] > num_ids):
+            raise ValueError("%s ids are not in [1, %d]" % (name, num_ids))
+
+    if num_users is None:
+        entity_counts = user_counts
+    else:
+        entity_counts = np.zeros(num_users, dtype=np.int64)
+        entity_counts[user_ids - 1] = user_counts
+    num_entities = len(entity_counts)
+    num_item_nodes = len(item_ids) if num_items is None else num_items
+    entity_buckets = _assign_buckets(entity_counts, max_bucket_edges)
+    del user_counts, entity_counts
+
+    output_directory = os.path.dirname(os.path.abspath(output_filename))
+    tmp_directory = tempfile.mkdtemp(prefix='.ingest-', dir=output_directory)
+    bucket_pattern = os.path.join(tmp_directory, 'entities-%d.bin')
+    def tmp(name):
+        return os.path.join(tmp_directory, os.path.basename(name))
+    timestamps_filename = get_timestamps_filename(output_filename)
+    meta_filename, info_filename = EIGraph.get_filenames(output_filename)[1:]
+    try:
+        # Second pass: remap the ids, write out the timestamps, and partition
+        # the edges on disk by entity.
+        with open(tmp(timestamps_filename), 'wb') as fout:
+            for users, items, ratings, timestamps in iter_rating_chunks(filename, **kwargs):
+                edges = np.empty(len(users), dtype=_EDGE_DTYPE)
+                if num_users is None:
+                    edges['entity'] = 2 * np.searchsorted(user_ids, users) + 1
+                else:
+                    edges['entity'] = 2 * users - 1
+                if num_items is None:
+                    edges['item'] = 2 * (np.searchsorted(item_ids, items) + 1)
+                else:
+                    edges['item'] = 2 * items
+                edges['weight'] = ratings
+                _partition(edges, entity_buckets[edges['entity'] // 2], bucket_pattern)
+
+                records = np.empty(len(edges), dtype=TIMESTAMPS_DTYPE)
+                records['entity'] = edges['entity']
+                records['item'] = edges['item']
+                records['timestamp'] = -1 if timestamps is None else timestamps
+                records.tofile(fout)
+        del user_ids, item_ids
+
+        # Sort every bucket by (entity, item).  Buckets hold increasing
+        # entities, so the edges reach SNAP with every adjacency list in
+        # order, and do not need to be sorted there.
+        graph = snap.TUNGraph.New(num_entities + num_item_nodes, 0)
+        for entity in xrange(1, 2 * num_entities, 2):
+            graph.AddNode(entity)
+        for item in xrange(2, 2 * num_item_nodes + 1, 2):
+            graph.AddNode(item)
+        rating_histogram = Counter()
+        with open(tmp(meta_filename), 'wb') as fout:
+            fout.write('{')
+            for bucket in xrange(entity_buckets.max() + 1 if num_entities else 0):
+                if not os.path.exists(bucket_pattern % bucket):
+                    continue
+                edges = np.fromfile(bucket_pattern % bucket, dtype=_EDGE_DTYPE)
+                os.remove(bucket_pattern % bucket)
+                edges = edges[np.lexsort((edges['item'], edges['entity']))]
+                repeated = (edges['entity'][1:] == edges['entity'][:-1]) & \
+                    (edges['item'][1:] == edges['item'][:-1])
+                if repeated.any():
+                    first = np.flatnonzero(repeated)[0]
+                    raise ValueError("Entity %d rates item %d more than once" % (
+                        edges['entity'][first], edges['item'][first]
+                    ))
+
+                add_edge = graph.AddEdgeUnchecked
+                for entity, item in izip(edges['entity'].tolist(), edges['item'].tolist()):
+                    add_edge(entity, item)
+                weights = edges['weight']
+                if integral_ratings:
+                    weights = weights.astype(np.int64)
+                fout.write(_marshal_weights(
+                    edges['entity'], edges['item'], weights, integral_ratings
+                ))
+                values, counts = np.unique(weights, return_counts=True)
+                rating_histogram.update(dict(zip(values.tolist(), counts.tolist())))
+            fout.write('0')
+
+        with open(tmp(info_filename), 'wb') as fout:
+            marshal.dump({'rating_histogram': dict(rating_histogram)}, fout)
+        FOut = snap.TFOut(tmp(output_filename))
+        graph.Save(FOut)
+        FOut.Flush()
+        del FOut, graph
+
+        for name in (output_filename, meta_filename, info_filename, timestamps_filename):
+            os.rename(tmp(name), name)
+    finally:
+        shutil.rmtree(tmp_directory)
+
+class MeanAccumulator(object):
+    """Streams in (entity, item, sum, count) accumulators of the ratings of
+    the edges of a graph, and merges those of the same edge.  Repeated
+    ratings are then reduced to their mean, without keeping every rating.
+
+    Entities and items are indices below 2 ** 32.
+    """
+
+    def __init__(self):
+        self._keys = np.array([], dtype=np.int64)
+        self._sums = np.array([], dtype=np.float64)
+        self._counts = np.array([], dtype=np.int64)
+
+    def add(self, entities, items, sums, counts):
+        keys = np.concatenate([
+            self._keys,
+            (np.asarray(entities, dtype=np.int64) << 32) | np.asarray(items, dtype=np.int64)
+        ])
+        self._keys, inverse = np.unique(keys, return_inverse=True)
+        self._sums = np.bincount(
+            inverse, weights=np.concatenate([self._sums, sums]),
+            minlength=len(self._keys)
+        )
+        self._counts = np.bincount(
+            inverse, weights=np.concatenate([self._counts, counts]),
+            minlength=len(self._keys)
+        ).astype(np.int64)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def totals(self):
+        """Returns the (entities, items, sums, counts) arrays of every edge."""
+        return self._keys >> 32, self._keys & 0xffffffff, self._sums, self._counts
+
+    def means(self):
+        """Returns the (entities, items, mean ratings) arrays of every edge."""
+        return self._keys >> 32, self._keys & 0xffffffff, self._sums / self._counts
+
+# Every BeerAdvocate review is a record of "key: value" lines, starting with
+# this key.
+BEERADVOCATE_RECORD_START = 'beer/name:'
+
+_BEERADVOCATE_FIELDS = re.compile(
+    r'^(beer/beerId|review/profileName|review/overall): ([^\r\n]*)', re.M
+)
+
+def _find_record_start(fin, offset, window=2 ** 20):
+    """Returns the offset of the first record starting at or after `offset`
+    in the file `fin`, or the size of the file if there is none.
+    """
+    if offset == 0:
+        return 0
+
+    marker = '\n' + BEERADVOCATE_RECORD_START
+    fin.seek(offset - 1)
+    position, text = offset - 1, ''
+    while True:
+        data = fin.read(window)
+        text += data
+        found = text.find(marker)
+        if found >= 0:
+            return position + found + 1
+        if not data:
+            return position + len(text)
+        # Keep enough of the text to find a marker split across reads.
+        keep = min(len(text), len(marker) - 1)
+        position += len(text) - keep
+        text = text[len(text) - keep:]
+
+def _iter_beeradvocate_ranges(filename, chunk_bytes):
+    """Yields (filename, start, end) byte ranges of whole records."""
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as fin:
+        start = 0
+        while start < size:
+            end = _find_record_start(fin, min(start + chunk_bytes, size))
+            yield (filename, start, end)
+            start = end
+
+def _iter_beeradvocate_gzip_chunks(filename, chunk_bytes):
+    """Yields the decompressed text of a gzipped file in chunks of whole
+    records.  Compressed files cannot be split, so they are decompressed
+    here and the chunks shipped to the workers.
+    """
+    marker = '\n' + BEERADVOCATE_RECORD_START
+    with gzip.open(filename, 'rb') as fin:
+        remainder = ''
+        while True:
+            data = fin.read(chunk_bytes)
+            text = remainder + data
+            if not data:
+                if text:
+                    yield text
+                return
+            end = text.rfind(marker) + 1
+            text, remainder = text[:end], text[end:]
+            if text:
+                yield text
+
+def _parse_beeradvocate_task(task):
+    """Parses a chunk of BeerAdvocate records, given as its text or as a
+    (filename, start, end) byte range.
+
+    Returns the user names and beer ids of the chunk in order of appearance,
+    and the (user index, beer index, sum, count) arrays of the ratings of
+    every (user, beer) pair in the chunk.
+    """
+    if isinstance(task, tuple):
+        filename, start, end = task
+        with open(filename, 'rb') as fin:
+            fin.seek(start)
+            text = fin.read(end - start)
+    else:
+        text = task
+
+    users, beers = {}, {}  # name -> index, in order of appearance
+    user_indices, beer_indices, ratings = [], [], []
+    beer_id, user_name, rating = None, None, None
+    for key, value in _BEERADVOCATE_FIELDS.findall(text):
+        value = value.strip().split(': ')[0]
+        if not value:
+            continue
+
+        if key == 'beer/beerId':
+            beer_id = value
+        elif key == 'review/profileName':
+            user_name = value
+        else:
+            rating = float(value)
+            if not 0 <= rating <= 5:
+                raise ValueError("Rating out of range: %s" % value)
+
+        if beer_id and user_name and rating:
+            user_indices.append(users.setdefault(user_name, len(users)))
+            beer_indices.append(beers.setdefault(beer_id, len(beers)))
+            ratings.append(rating)
+            beer_id, user_name, rating = None, None, None
+
+    accumulator = MeanAccumulator()
+    accumulator.add(user_indices, beer_indices, ratings, np.ones(len(ratings)))
+    return (sorted(users, key=users.get), sorted(beers, key=beers.get)) + \
+        accumulator.totals()
+
+def parse_beeradvocate(filename, num_workers=None, chunk_bytes=2 ** 26):
+    """Returns the EIGraph of the BeerAdvocate reviews in `filename`, which
+    may be gzipped.
+
+    The file is split into chunks of whole records, which are parsed in
+    parallel.  Users rating a beer more than once are given their mean
+    rating.  Users and beers are numbered in order of their first review.
+
+    :param num_workers: the number of worker processes.  Defaults to the
+        number of CPUs.
+    :param chunk_bytes: the approximate size of the chunks, which bounds
+        the memory used by every worker.
+    """
+    if filename.endswith('.gz'):
+        tasks = _iter_beeradvocate_gzip_chunks(filename, chunk_bytes)
+    else:
+        tasks = _iter_beeradvocate_ranges(filename, chunk_bytes)
+
+    user_indices, beer_indices = {}, {}
+    accumulator = MeanAccumulator()
+    results = imap_bounded(_parse_beeradvocate_task, tasks, num_workers)
+    for users, beers, chunk_users, chunk_beers, sums, counts in results:
+        # Chunks come back in order, so numbering new users and beers as they
+        # come numbers them in order of their first review.
+        user_map = np.array(
+            [user_indices.setdefault(u, len(user_indices)) for u in users],
+            dtype=np.int64
+        )
+        beer_map = np.array(
+            [beer_indices.setdefault(b, len(beer_indices)) for b in beers],
+            dtype=np.int64
+        )
+        if len(sums):
+            accumulator.add(user_map[chunk_users], beer_map[chunk_beers], sums, counts)
+
+    entities, items, ratings = accumulator.means()
+    graph = EIGraph(num_entities=len(user_indices), num_items=len(beer_indices))
+    graph.add_edges(2 * entities + 1, 2 * (items + 1), ratings)
+    return graph
@@ -3,13 +3,19 @@ Classes and routines for loading SNAP networks
 """
 
 import abc
+import fcntl
+import hashlib
 import os
 import snap
-import random
+import tempfile
 import numpy as np
 
+from gbra.data.ingest import load_edge_timestamps
 from gbra.util.ei_graph import EIGraph
 
+# Default directory for caching generated graphs, see `CachedLoader`.
+GENERATED_GRAPHS_DIR = os.path.join(os.path.dirname(__file__), 'generated')
+
 class NetworkLoader(object):
     """Override this base class. Implement `load()` to return an EIGraph."""
 
@@ -21,6 +27,75 @@ class NetworkLoader(object):
         """
         raise Exception('Override me')
 
+    def cache_key(self):
+        """Returns a string that identifies the graph `load()` returns, or None
+        if this loader's graphs should not be cached.  See `CachedLoader`.
+        """
+        return None
+
+class CachedLoader(NetworkLoader):
+    """Caches the graphs generated by another loader on disk.
+
+    Graphs are stored under `cache_dir`, keyed by the wrapped loader's
+    `cache_key()`.  The first process to ask for a graph builds and saves it
+    while holding a lock; concurrent processes wait for it and then load the
+    saved graph.  Graphs are written to temporary files and renamed into
+    place, so a cached graph is never seen half-written.
+    """
+
+    def __init__(self, loader, cache_dir):
+        """
+        :param loader: the NetworkLoader to cache the graphs of.
+        :param cache_dir: the directory to keep cached graphs in.
+        """
+        self.loader = loader
+        self.cache_dir = cache_dir
+
+    def cache_key(self):
+        return self.loader.cache_key()
+
+    def get_filename(self):
+        """Returns the name of the file the graph is cached in."""
+        key = self.loader.cache_key()
+        if key is None:
+            raise ValueError("%s graphs cannot be cached." % type(self.loader).__name__)
+        return os.path.join(
+            self.cache_dir, hashlib.sha1(key).hexdigest() + DataFileLoader.EXTENSION
+        )
+
+    def load(self):
+        filename = self.get_filename()
+        if not os.path.exists(filename):
+            if not os.path.isdir(self.cache_dir):
+                try:
+                    os.makedirs(self.cache_dir)
+                except OSError:
+                    if not os.path.isdir(self.cache_dir):
+                        raise
+            with open(filename + '.lock', 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    # Another process may have built it while we waited.
+                    if not os.path.exists(filename):
+                        self._build(filename)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+        return EIGraph.load(filename)
+
+    def _build(self, filename):
+        graph = self.loader.load()
+        tmp_filename = tempfile.mktemp(
+            dir=self.cache_dir, prefix='.' + os.path.basename(filename)
+        )
+        graph.save(tmp_filename)
+
+        # The graph file itself goes last: its existence marks the cache entry
+        # as complete.
+        for tmp_fn, fn in reversed(zip(
+                EIGraph.get_filenames(tmp_filename), EIGraph.get_filenames(filename))):
+            os.rename(tmp_fn, fn)
+
 class TinyTestLoader(NetworkLoader):
     """Returns a very simple undirected network with unweighted edges:
 
@@ -56,16 +131,22 @@ class ErdosRenyiLoader(NetworkLoader):
 
     Parameterized by NUM_ENTITIES, NUM_ITEMS, and NUM_EDGES chosen uniformly
     at random between entities and items. Can optionally give another existing
-    Graph from which to sample edge weights.
+    Graph (or its rating histogram) from which to sample edge weights.
     """
 
-    def __init__(self, num_entities, num_items, num_edges, graph_to_emulate=None, verbose=False):
+    def __init__(self, num_entities, num_items, num_edges, graph_to_emulate=None,
+            verbose=False, ratings_histogram=None, seed=None):
         """
         :param - num_entities: number of entities to include
         :param - num_items: number of items to include
         :param - num_edges: the number of edges desired.
         :param - graph_to_emulate: will sample the weight of each edge from
           the distribution of edge weights in this graph.
+        :param - ratings_histogram: alternatively to graph_to_emulate, a map of
+          rating -> count to sample the weight of each edge from.  See
+          `EIGraph.load_rating_histogram` to get it without loading a graph.
+        :param - seed: (optional) seed for generating the graph.  If None, the
+          global random state is used.
         """
         if num_edges > num_entities * num_items:
             raise ValueError("More edges requested than possible.")
@@ -74,58 +155,479 @@ class ErdosRenyiLoader(NetworkLoader):
         self.num_items = num_items
         self.num_edges = num_edges
         self.verbose = verbose
+        self.seed = seed
         self.ratings_dist = None
         self.possible_ratings = None
 
+        if graph_to_emulate:
+            ratings_histogram = graph_to_emulate.get_rating_histogram()
+
         # If emulating a graph, create a self.possible_ratings array
         # and a self.ratings_dist array in order to sample possible
         # ratings for this ER graph according the ratings counts in the
         # graph to emulate.
-        if graph_to_emulate:
-            ratings_to_index = {}
-            self.possible_ratings = graph_to_emulate.possible_ratings
-            for idx, possible_rating in enumerate(self.possible_ratings):
-                ratings_to_index[possible_rating] = idx
-            ratings_counts = [0] * len(self.possible_ratings)
-
-            for edge in graph_to_emulate.base().Edges():
-                srcId, dstId = edge.GetSrcNId(), edge.GetDstNId()
-                edge_weight = graph_to_emulate.get_edge_weight(
-                    srcId, dstId
+        if ratings_histogram:
+            self.possible_ratings, self.ratings_dist = \
+                get_ratings_distribution(ratings_histogram)
+
+    def cache_key(self):
+        if self.seed is None:
+            # Every load is a fresh random draw.
+            return None
+        return repr((
+            'erdos-renyi', self.num_entities, self.num_items, self.num_edges,
+            self.seed, self.possible_ratings, self.ratings_dist
+        ))
+
+    def load(self):
+        np_rng = np.random if self.seed is None else np.random.RandomState(self.seed)
+
+        # Draw the edges as distinct indices into the num_entities x num_items
+        # grid of possible edges.
+        edges = sample_without_replacement(
+            self.num_entities * self.num_items, self.num_edges, np_rng
+        )
+        entities = 2 * (edges // self.num_items) + 1
+        items = 2 * (edges % self.num_items + 1)
+        if self.verbose:
+            for entity_node_id, item_node_id in zip(entities, items):
+                print entity_node_id, item_node_id
+
+        # If we have a ratings distribution, add edges to this ER graph
+        # according to that distribution.
+        weights = 1
+        if self.ratings_dist:
+            weights = draw_ratings(
+                self.possible_ratings, self.ratings_dist, self.num_edges, np_rng
+            )
+
+        graph = EIGraph(num_entities=self.num_entities, num_items=self.num_items)
+        graph.name = "erdos-renyi"
+        graph.add_edges(entities, items, weights)
+        return graph
+
+class ChungLuLoader(NetworkLoader):
+    """Bipartite graph with a given expected degree sequence on each side.
+
+    Every edge joins an entity and an item drawn independently with
+    probability proportional to their target degrees (the Chung-Lu model),
+    and repeated edges are redrawn until there are `num_edges` distinct
+    edges.  The target degrees are either given, copied from a graph to
+    emulate, or follow a power law; e.g. for MovieLens-like heavy-tailed
+    items,
+
+        ChungLuLoader(6040, 3952, 1000209, item_exponent=2.0,
+                      ratings_histogram=histogram)
+
+    With `exact_degrees`, the graph is instead drawn from the configuration
+    model: the given degree sequences are matched exactly, except for
+    repeated edges, which get dropped.
+
+    Unlike the other loaders, `generate_edges()` returns the edges as arrays
+    without building an EIGraph, for benchmarks at sizes where an EIGraph
+    does not fit in memory.
+    """
+
+    def __init__(self, num_entities=None, num_items=None, num_edges=None,
+            entity_degrees=None, item_degrees=None, entity_exponent=None,
+            item_exponent=None, graph_to_emulate=None, ratings_histogram=None,
+            exact_degrees=False, seed=None, block_size=2 ** 26):
+        """
+        :param - num_entities: number of entities.  Defaults to the length of
+          `entity_degrees`.
+        :param - num_items: number of items.  Defaults to the length of
+          `item_degrees`.
+        :param - num_edges: the number of edges desired.  Defaults to the sum
+          of the given degrees.
+        :param - entity_degrees: (optional) array of the target degree of
+          every entity.  Only relative sizes matter, unless `exact_degrees`.
+        :param - item_degrees: (optional) same for items.
+        :param - entity_exponent: if `entity_degrees` is not given, entity
+          degrees follow a power law with this exponent (e.g. 2.5), i.e. the
+          i-th largest degree is proportional to i ** (-1 / (exponent - 1)).
+          If neither is given, all entities have the same expected degree.
+        :param - item_exponent: same for items.
+        :param - graph_to_emulate: copies the degree sequences, the number of
+          edges and the rating histogram of this graph, unless given.
+        :param - ratings_histogram: a map of rating -> count to sample the
+          weight of each edge from.  If None, all edges have weight 1.
+        :param - exact_degrees: match the degree sequences exactly with the
+          configuration model (both degree sequences are required, and must
+          have the same sum).  Repeated edges are dropped, so the graph has
+          fewer edges the closer the largest degrees get to the size of the
+          other side.
+        :param - seed: (optional) seed for generating the graph.  If None, the
+          global random state is used.
+        :param - block_size: the number of edges drawn at a time, which
+          bounds the size of temporary arrays.
+        """
+        if graph_to_emulate is not None:
+            if entity_degrees is None and entity_exponent is None:
+                entity_degrees = [
+                    graph_to_emulate.get_degree(e) for e in graph_to_emulate.entities
+                ]
+            if item_degrees is None and item_exponent is None:
+                item_degrees = [
+                    graph_to_emulate.get_degree(i) for i in graph_to_emulate.items
+                ]
+            if num_edges is None:
+                num_edges = graph_to_emulate.num_edges()
+            if ratings_histogram is None:
+                ratings_histogram = graph_to_emulate.get_rating_histogram()
+
+        if entity_degrees is not None:
+            entity_degrees = np.asarray(entity_degrees, dtype=np.int64)
+            num_entities = len(entity_degrees)
+        if item_degrees is not None:
+            item_degrees = np.asarray(item_degrees, dtype=np.int64)
+            num_items = len(item_degrees)
+        if num_entities is None or num_items is None:
+            raise ValueError("The number of entities and items is required.")
+
+        if exact_degrees:
+            if entity_degrees is None or item_degrees is None:
+                raise ValueError("exact_degrees requires both degree sequences.")
+            if entity_degrees.sum() != item_degrees.sum():
+                raise ValueError("Entity and item degrees have different sums.")
+        if num_edges is None:
+            degrees = entity_degrees if entity_degrees is not None else item_degrees
+            if degrees is None:
+                raise ValueError("The number of edges is required.")
+            num_edges = int(degrees.sum())
+        if num_edges > num_entities * num_items:
+            raise ValueError("More edges requested than possible.")
+
+        self.num_entities = num_entities
+        self.num_items = num_items
+        self.num_edges = num_edges
+        self.entity_degrees = entity_degrees
+        self.item_degrees = item_degrees
+        self.entity_exponent = entity_exponent
+        self.item_exponent = item_exponent
+        self.exact_degrees = exact_degrees
+        self.seed = seed
+        self.block_size = block_size
+        self.possible_ratings = None
+        self.ratings_dist = None
+        if ratings_histogram:
+            self.possible_ratings, self.ratings_dist = \
+                get_ratings_distribution(ratings_histogram)
+
+    def cache_key(self):
+        if self.seed is None:
+            # Every load is a fresh random draw.
+            return None
+
+        def digest(degrees):
+            if degrees is None:
+                return None
+            return hashlib.sha1(degrees.tostring()).hexdigest()
+
+        return repr((
+            'chung-lu', self.num_entities, self.num_items, self.num_edges,
+            digest(self.entity_degrees), digest(self.item_degrees),
+            self.entity_exponent, self.item_exponent, self.exact_degrees,
+            self.seed, self.possible_ratings, self.ratings_dist
+        ))
+
+    @staticmethod
+    def _get_node_weights(n, degrees, exponent):
+        """Returns the (unnormalized) target degree of each of `n` nodes."""
+        if degrees is not None:
+            return degrees.astype(np.float64)
+        if exponent is None:
+            return np.ones(n)
+        if exponent <= 1:
+            raise ValueError("Power law exponents must be larger than 1.")
+        return np.arange(1, n + 1, dtype=np.float64) ** (-1.0 / (exponent - 1))
+
+    def _draw_edges(self, rng):
+        """Returns a sorted array of `num_edges` distinct edges, each encoded
+        as entity index * num_items + item index.
+        """
+        entity_cdf = np.cumsum(self._get_node_weights(
+            self.num_entities, self.entity_degrees, self.entity_exponent
+        ))
+        item_cdf = np.cumsum(self._get_node_weights(
+            self.num_items, self.item_degrees, self.item_exponent
+        ))
+
+        edges = np.array([], dtype=np.int64)
+        acceptance = 1.0
+        stalled_rounds = 0
+        while len(edges) < self.num_edges:
+            # Draw enough candidates to fill the missing edges at the rate new
+            # edges were found so far.  High-degree pairs get drawn over and
+            # over, so the rate drops as the graph fills up.
+            missing = self.num_edges - len(edges)
+            num_candidates = min(self.block_size, int(missing / acceptance * 1.05) + 16)
+            entities = np.searchsorted(
+                entity_cdf, rng.random_sample(num_candidates) * entity_cdf[-1],
+                side='right'
+            )
+            items = np.searchsorted(
+                item_cdf, rng.random_sample(num_candidates) * item_cdf[-1],
+                side='right'
+            )
+            num_before = len(edges)
+            edges = np.unique(np.concatenate([
+                edges, entities.astype(np.int64) * self.num_items + items
+            ]))
+
+            num_new = len(edges) - num_before
+            acceptance = max(float(num_new) / num_candidates, 1e-3)
+            stalled_rounds = 0 if num_new else stalled_rounds + 1
+            if stalled_rounds == 10:
+                raise ValueError(
+                    "Could only place %d distinct edges with these degrees." % len(edges)
                 )
-                ratings_counts[ratings_to_index[edge_weight]] += 1
 
-            self.ratings_dist = [
-                float(c) / sum(ratings_counts) for c in ratings_counts
-            ]
+        if len(edges) > self.num_edges:
+            # The edges drawn last are as likely to be in excess as any other.
+            edges = np.delete(
+                edges, rng.permutation(len(edges))[:len(edges) - self.num_edges]
+            )
+        return edges
+
+    def _match_stubs(self, rng):
+        """Returns a sorted array of distinct edges, encoded as in
+        `_draw_edges`, matching every entity to `entity_degrees` items and
+        vice versa at random.
+        """
+        entities = np.repeat(
+            np.arange(self.num_entities, dtype=np.int64), self.entity_degrees
+        )
+        items = np.repeat(np.arange(self.num_items, dtype=np.int64), self.item_degrees)
+        rng.shuffle(items)
+        return np.unique(entities * self.num_items + items)
+
+    def generate_edges(self):
+        """Returns the (entities, items, weights) arrays of the edges of the
+        graph, as EIGraph node IDs.  See `EIGraph.add_edges`.
+        """
+        rng = np.random if self.seed is None else np.random.RandomState(self.seed)
+
+        edges = self._match_stubs(rng) if self.exact_degrees else self._draw_edges(rng)
+        entities = 2 * (edges // self.num_items) + 1
+        items = 2 * (edges % self.num_items + 1)
 
+        weights = np.ones(len(edges), dtype=np.int64)
+        if self.ratings_dist:
+            weights = draw_ratings(self.possible_ratings, self.ratings_dist, len(edges), rng)
+        return entities, items, weights
 
     def load(self):
-        # TODO: this will take a long time if num_edges is close
-        # to num_items/num_entities. If we need to make graphs like this in
-        # the future, please update my logic :)
+        entities, items, weights = self.generate_edges()
         graph = EIGraph(num_entities=self.num_entities, num_items=self.num_items)
-        graph.name = "erdos-renyi"
-        edges_left = self.num_edges
-        while edges_left > 0:
-            entity_node_id = 2 * random.randint(0, self.num_entities - 1) + 1
-            item_node_id = 2 * random.randint(1, self.num_items)
-            if not graph.is_edge(entity_node_id, item_node_id):
-                edges_left -= 1
-                if self.verbose:
-                    print entity_node_id, item_node_id
-
-                edge_weight = 1
-
-                # If we have a ratings distribution, add edges to this ER
-                # graph according to that distribution.
-                if self.ratings_dist:
-                    edge_weight = np.random.choice(
-                        self.possible_ratings, p=self.ratings_dist
-                    )
-                graph.add_edge(entity_node_id, item_node_id, weight=edge_weight)
+        graph.name = "chung-lu"
+        graph.add_edges(entities, items, weights)
         return graph
 
+class EmulatingChungLuLoader(NetworkLoader):
+    """Chung-Lu graph emulating the graph of another loader: same degree
+    sequences, number of edges and rating histogram.  See the
+    `graph_to_emulate` of `ChungLuLoader`.
+
+    The graph to emulate is only loaded by `load()`, and the cache key is
+    derived from its loader's, so a `CachedLoader` hit never loads it.
+    """
+
+    def __init__(self, loader, exact_degrees=False, seed=None, block_size=2 ** 26):
+        """
+        :param - loader: the NetworkLoader of the graph to emulate.
+        :param - exact_degrees, seed, block_size: see `ChungLuLoader`.
+        """
+        self.loader = loader
+        self.exact_degrees = exact_degrees
+        self.seed = seed
+        self.block_size = block_size
+
+    def cache_key(self):
+        key = self.loader.cache_key()
+        if key is None or self.seed is None:
+            return None
+        return repr((
+            'chung-lu-emulating', key, self.exact_degrees, self.seed,
+            self.block_size
+        ))
+
+    def load(self):
+        return ChungLuLoader(
+            graph_to_emulate=self.loader.load(), exact_degrees=self.exact_degrees,
+            seed=self.seed, block_size=self.block_size
+        ).load()
+
+class EdgeSwapLoader(NetworkLoader):
+    """Degree-preserving randomization of the graph of another loader.
+
+    The graph is rewired by repeatedly swapping the items of two edges, i.e.
+    replacing edges (e1, i1) and (e2, i2) with (e1, i2) and (e2, i1), so
+    every entity and every item keeps its degree but who is connected to
+    whom is shuffled.  These null-model graphs tell apart the effects that
+    come from the degree distribution from those that come from the
+    structure of the real graph.  See `randomize_edges`.
+    """
+
+    def __init__(self, loader, swaps_per_edge=10, keep_item_ratings=True, seed=None):
+        """
+        :param - loader: the NetworkLoader of the graph to randomize.
+        :param - swaps_per_edge: the number of successful swaps to make, as a
+          multiple of the number of edges.
+        :param - keep_item_ratings: if True, ratings travel with the items of
+          the swapped edges, so every item keeps its ratings.  Otherwise they
+          stay with the entities.
+        :param - seed: (optional) seed for the swaps.  If None, the global
+          random state is used.
+        """
+        self.loader = loader
+        self.swaps_per_edge = swaps_per_edge
+        self.keep_item_ratings = keep_item_ratings
+        self.seed = seed
+
+    def cache_key(self):
+        key = self.loader.cache_key()
+        if key is None or self.seed is None:
+            return None
+        return repr((
+            'edge-swap', key, self.swaps_per_edge, self.keep_item_ratings, self.seed
+        ))
+
+    def load(self):
+        return randomize_graph(
+            self.loader.load(), self.swaps_per_edge, self.keep_item_ratings,
+            self.seed
+        )
+
+def randomize_graph(graph, swaps_per_edge=10, keep_item_ratings=True, seed=None):
+    """Returns a copy of `graph` rewired with `randomize_edges`."""
+    rng = np.random if seed is None else np.random.RandomState(seed)
+    entities, items, weights = graph.to_edge_arrays()
+    entities, items, weights = randomize_edges(
+        entities, items, weights, swaps_per_edge, keep_item_ratings, rng
+    )
+
+    randomized = EIGraph(
+        num_entities=graph.num_entities, num_items=graph.num_items,
+        rating_range=graph.rating_range, possible_ratings=graph.possible_ratings
+    )
+    randomized.name = graph.name
+    randomized.add_edges(entities, items, weights)
+    return randomized
+
+def randomize_edges(entities, items, weights, swaps_per_edge=10,
+        keep_item_ratings=True, rng=np.random, max_stalled_rounds=10):
+    """Rewires a bipartite edge list with degree-preserving edge swaps, and
+    returns the new (entities, items, weights) arrays.
+
+    Swaps are proposed in rounds: the edges are paired up at random, and
+    every pair (e1, i1), (e2, i2) proposes to become (e1, i2), (e2, i1).
+    A proposal is rejected if it would create an edge that exists already,
+    or one that another proposal of the same round creates as well, so the
+    graph stays simple.  Every edge takes part in at most one proposal per
+    round, so the accepted ones can be applied all at once.
+
+    :param swaps_per_edge: the number of successful swaps to make, as a
+        multiple of the number of edges.  About 10 is commonly used to
+        forget the original structure.
+    :param keep_item_ratings: if True, a swapped edge takes the weight of the
+        edge its item came from; otherwise it keeps the weight of the edge of
+        its entity.
+    :param max_stalled_rounds: give up after this many rounds in a row
+        without a single accepted swap, e.g. for complete graphs.
+    """
+    entities = np.array(entities, dtype=np.int64)
+    items = np.array(items, dtype=np.int64)
+    weights = np.array(weights)
+    num_edges = len(entities)
+    if num_edges < 2:
+        return entities, items, weights
+
+    radix = items.max() + 1
+    swaps_left = int(swaps_per_edge * num_edges)
+    stalled_rounds = 0
+    while swaps_left > 0 and stalled_rounds < max_stalled_rounds:
+        existing = np.sort(entities * radix + items)
+
+        pairs = rng.permutation(num_edges)[:2 * min(num_edges // 2, swaps_left)]
+        a, b = pairs[0::2], pairs[1::2]
+        new_a = entities[a] * radix + items[b]
+        new_b = entities[b] * radix + items[a]
+
+        # Swapping between edges of the same entity or item is a no-op.
+        accept = (entities[a] != entities[b]) & (items[a] != items[b])
+        for new in (new_a, new_b):
+            position = np.minimum(np.searchsorted(existing, new), num_edges - 1)
+            accept &= existing[position] != new
+
+        # Reject proposals creating the same edge as another proposal.
+        new_edges, counts = np.unique(
+            np.concatenate([new_a[accept], new_b[accept]]), return_counts=True
+        )
+        repeated = new_edges[counts > 1]
+        if len(repeated):
+            accept &= ~(np.in1d(new_a, repeated) | np.in1d(new_b, repeated))
+
+        a, b = a[accept], b[accept]
+        items[a], items[b] = items[b], items[a]
+        if keep_item_ratings:
+            weights[a], weights[b] = weights[b], weights[a]
+
+        swaps_left -= len(a)
+        stalled_rounds = 0 if len(a) else stalled_rounds + 1
+
+    return entities, items, weights
+
+def get_ratings_distribution(ratings_histogram):
+    """Returns the sorted list of ratings in `ratings_histogram` (a map of
+    rating -> count) and the list of their probabilities.
+    """
+    possible_ratings = sorted(ratings_histogram)
+    ratings_counts = [ratings_histogram[r] for r in possible_ratings]
+    ratings_dist = [float(c) / sum(ratings_counts) for c in ratings_counts]
+    return possible_ratings, ratings_dist
+
+def draw_ratings(possible_ratings, ratings_dist, size, rng=np.random):
+    """Returns an array of `size` ratings drawn from `possible_ratings` with
+    probabilities `ratings_dist`.
+    """
+    return np.asarray(possible_ratings)[
+        rng.choice(len(possible_ratings), size=size, p=ratings_dist)
+    ]
+
+def sample_without_replacement(n, k, rng=np.random, block_size=2 ** 26):
+    """Returns a sorted array of `k` distinct integers drawn uniformly from
+    range(n).
+
+    Unlike `rng.choice(n, k, replace=False)`, this takes O(k) memory rather
+    than O(n), so it works for huge ranges.  Candidates are drawn in blocks
+    of at most `block_size` and deduplicated by sorting.  When more than
+    half of the range is wanted, the complement is drawn instead, so the
+    number of draws stays close to `k` however dense the sample is.
+
+    :param rng: (optional) the np.random.RandomState to draw from.
+    """
+    if not 0 <= k <= n:
+        raise ValueError("Cannot draw %d distinct values from %d." % (k, n))
+    if k > n // 2:
+        excluded = sample_without_replacement(n, n - k, rng, block_size)
+        keep = np.ones(n, dtype=bool)
+        keep[excluded] = False
+        return np.flatnonzero(keep)
+
+    sample = np.array([], dtype=np.int64)
+    while len(sample) < k:
+        # Draw about as many candidates as it takes in expectation to see
+        # the missing number of new distinct values, plus some slack.
+        expected = n * (np.log(n - len(sample)) - np.log(n - k))
+        num_candidates = min(block_size, int(expected * 1.02) + 16)
+        candidates = rng.randint(0, n, size=num_candidates).astype(np.int64)
+        sample = np.unique(np.concatenate([sample, candidates]))
+
+    if len(sample) > k:
+        # A uniform subset of a uniform sample is a uniform sample.
+        sample = np.delete(sample, rng.permutation(len(sample))[:len(sample) - k])
+    return sample
+
 class DataFileLoader(NetworkLoader):
 
     EXTENSION = '.dat'
@@ -142,6 +644,20 @@ class DataFileLoader(NetworkLoader):
     def load(self):
         return EIGraph.load(self.filename)
 
+    def cache_key(self):
+        # Graphs derived from a data file are rebuilt when the file changes.
+        return repr(('file', self.filename, os.path.getmtime(self.filename)))
+
+    def load_rating_histogram(self):
+        """Returns the rating histogram of the graph without loading it."""
+        return EIGraph.load_rating_histogram(self.filename)
+
+    def load_timestamps(self):
+        """Returns the memory-mapped timestamps of the edges of the graph,
+        for graphs built by `gbra.data.ingest`.
+        """
+        return load_edge_timestamps(self.filename)
+
 class MovielensLoader(DataFileLoader):
     """Loads the small Movielens dataset (1M ratings).
 
@@ -162,6 +678,35 @@ class Movielens100kLoader(DataFileLoader):
     def __init__(self):
         super(Movielens100kLoader, self).__init__('movielens_100k')
 
+class Movielens10mLoader(DataFileLoader):
+    """Loads the Movielens 10M dataset (10M ratings, half-star ratings).
+
+    For more info, see:
+    http://files.grouplens.org/datasets/movielens/ml-10m-README.html
+    """
+
+    def __init__(self):
+        super(Movielens10mLoader, self).__init__('movielens_10m')
+
+class Movielens20mLoader(DataFileLoader):
+    """Loads the Movielens 20M dataset (20M ratings, half-star ratings).
+
+    For more info, see:
+    http://files.grouplens.org/datasets/movielens/ml-20m-README.html
+    """
+
+    def __init__(self):
+        super(Movielens20mLoader, self).__init__('movielens_20m')
+
+class Movielens25mLoader(DataFileLoader):
+    """Loads the Movielens 25M dataset (25M ratings, half-star ratings).
+
+    For more info, see:
+    http://files.grouplens.org/datasets/movielens/ml-25m-README.html
+    """
+
+    def __init__(self):
+        super(Movielens25mLoader, self).__init__('movielens_25m')
 
 class BeeradvocateLoader(DataFileLoader):
     """Loads the SNAP BeerAdvocate dataset.
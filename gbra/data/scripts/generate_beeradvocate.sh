@@ -1,12 +1,11 @@
 #! /bin/bash
 pushd "$(dirname "$0")"
 wget https://snap.stanford.edu/data/Beeradvocate.txt.gz
-gunzip Beeradvocate.txt.gz
 
 echo 'parsing data'
-python parse_beeradvocate.py
+python parse_beeradvocate.py Beeradvocate.txt.gz
 mv beeradvocate.dat* ../
-rm Beeradvocate.txt
+rm Beeradvocate.txt.gz
 
 echo 'Finished loading beeradvocate!'
-popd
\ No newline at end of file
+popd
@@ -0,0 +1,13 @@
+#! /bin/bash
+pushd "$(dirname "$0")"
+wget http://files.grouplens.org/datasets/movielens/ml-10m.zip
+unzip ml-10m.zip
+rm ml-10m.zip
+
+echo 'parsing movielens data'
+python parse_movielens.py 10m
+mv movielens_10m.dat* ../
+rm -r ml-10M100K
+
+echo 'Finished loading movielens 10m!'
+popd
@@ -0,0 +1,13 @@
+#! /bin/bash
+pushd "$(dirname "$0")"
+wget http://files.grouplens.org/datasets/movielens/ml-20m.zip
+unzip ml-20m.zip
+rm ml-20m.zip
+
+echo 'parsing movielens data'
+python parse_movielens.py 20m
+mv movielens_20m.dat* ../
+rm -r ml-20m
+
+echo 'Finished loading movielens 20m!'
+popd
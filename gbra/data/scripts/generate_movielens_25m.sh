@@ -0,0 +1,13 @@
+#! /bin/bash
+pushd "$(dirname "$0")"
+wget http://files.grouplens.org/datasets/movielens/ml-25m.zip
+unzip ml-25m.zip
+rm ml-25m.zip
+
+echo 'parsing movielens data'
+python parse_movielens.py 25m
+mv movielens_25m.dat* ../
+rm -r ml-25m
+
+echo 'Finished loading movielens 25m!'
+popd
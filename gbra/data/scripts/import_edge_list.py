@@ -0,0 +1,22 @@
+"""Imports a rating file of any size as a memory-mapped graph.
+
+Usage: python import_edge_list.py ratings.csv output_directory
+
+The file holds one `user, item, rating[, timestamp]` rating per line; see
+`gbra.data.edge_list_import` for the details.  Load the result with
+`gbra.util.mmap_ei_graph.MmapEIGraph(output_directory)`.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+from gbra.data.edge_list_import import import_edge_list
+
+def main(fn, output_directory):
+    graph = import_edge_list(fn, output_directory)
+    print "%d entities, %d items, %d edges" % (
+        graph.num_entities, graph.num_items, graph.num_edges()
+    )
+
+if __name__ == '__main__':
+    main(*sys.argv[1:3])
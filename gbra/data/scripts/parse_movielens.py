@@ -1,123 +1,52 @@
 """Parses movielens data and saves it as an EIGraph.
 
-See the 1M dataset section on https://grouplens.org/datasets/movielens/
+See https://grouplens.org/datasets/movielens/ for the releases.  The ratings
+are streamed in chunks (see `gbra.data.ingest`), so the larger releases can be
+parsed without holding the whole ratings file in memory.
 """
 
-import nose.tools as nt
-from unittest import TestCase
-import snap
-
 import os
 import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+from gbra.data.ingest import ingest_ratings
 from gbra.util.ei_graph import EIGraph
 
-T = TestCase('__init__')
-
-def loadMovieLens1m():
-    fn = "ml-1m/ratings.dat"
-    edges = []
-    num_entities = 6040
-    num_items = 3952
-    num_edges = 1000209
-
-    with open(fn) as fin:
-        for line in fin:
-            sline = line.strip().split('::')
-            user_id = int(sline[0])
-            movie_id = int(sline[1])
-            rating = int(sline[2])
-            T.assertTrue(user_id >= 1 and user_id <= num_entities, user_id)
-            T.assertTrue(movie_id >= 1 and movie_id <= num_items, movie_id)
-            T.assertTrue(rating >= 1 and rating <= 5)
-            edges.append((user_id, movie_id, rating))
-
-    T.assertEqual(len(edges), num_edges)
-
-    graph = EIGraph()
-    user_to_entity = {}
-    movie_to_item = {}
-
-    for e in xrange(1, num_entities+1):
-        eid = graph.add_entity()
-        user_to_entity[e] = eid
-
-    for i in xrange(1, num_items+1):
-        iid = graph.add_item()
-        movie_to_item[i] = iid
-
-    for user_id, movie_id, rating in edges:
-        entity_id = user_to_entity[user_id]
-        item_id = movie_to_item[movie_id]
-        graph.add_edge(entity_id, item_id, weight=rating)
-
-    # sanity check some stats
-    T.assertEqual(graph.num_entities, num_entities)
-    T.assertEqual(graph.num_items, num_items)
-    T.assertEqual(graph.base().GetNodes(), num_entities+num_items)
-    T.assertEqual(graph.base().GetEdges(), num_edges)
-
-    T.assertEqual(graph.get_edge_weight(1, 1193*2), 5)
-    T.assertEqual(graph.get_edge_weight(1, 661*2), 3)
-    T.assertEqual(graph.get_edge_weight(3, 1213*2), 2)
-
-    graph.save('movielens_1m.dat')
-
-def loadMovieLens100k():
-    fn = "ml-100k/u.data"
-    edges = []
-    num_entities = 943
-    num_items = 1682
-    num_edges = 100000
-
-    with open(fn) as fin:
-        for line in fin:
-            sline = line.strip().split('\t')
-            user_id = int(sline[0])
-            movie_id = int(sline[1])
-            rating = int(sline[2])
-            T.assertTrue(user_id >= 1 and user_id <= num_entities, user_id)
-            T.assertTrue(movie_id >= 1 and movie_id <= num_items, movie_id)
-            T.assertTrue(rating >= 1 and rating <= 5)
-            edges.append((user_id, movie_id, rating))
-
-    T.assertEqual(len(edges), num_edges)
-
-    graph = EIGraph()
-    user_to_entity = {}
-    movie_to_item = {}
-
-    for e in xrange(1, num_entities+1):
-        eid = graph.add_entity()
-        user_to_entity[e] = eid
-
-    for i in xrange(1, num_items+1):
-        iid = graph.add_item()
-        movie_to_item[i] = iid
-
-    for user_id, movie_id, rating in edges:
-        entity_id = user_to_entity[user_id]
-        item_id = movie_to_item[movie_id]
-        graph.add_edge(entity_id, item_id, weight=rating)
-
-    # sanity check some stats
-    T.assertEqual(graph.num_entities, num_entities)
-    T.assertEqual(graph.num_items, num_items)
-    T.assertEqual(graph.base().GetNodes(), num_entities+num_items)
-    T.assertEqual(graph.base().GetEdges(), num_edges)
-
-    graph.save('movielens_100k.dat')
+# release -> (ratings file, number of users, number of items, number of ratings)
+#
+# The users and items of the 100k and 1m releases keep their ids, which our
+# experiments refer to.  The ids of the larger releases have gaps, so they are
+# remapped densely (the number of users and items is then not fixed).
+RELEASES = {
+    '100k': ('ml-100k/u.data', 943, 1682, 100000),
+    '1m': ('ml-1m/ratings.dat', 6040, 3952, 1000209),
+    '10m': ('ml-10M100K/ratings.dat', None, None, 10000054),
+    '20m': ('ml-20m/ratings.csv', None, None, 20000263),
+    '25m': ('ml-25m/ratings.csv', None, None, 25000095),
+}
 
 def main(dataset):
-    if not dataset or not (dataset == "1m" or dataset == "100k"):
+    if dataset not in RELEASES:
         raise ValueError(
-            "Invalid dataset name given: %s" % str(dataset) if dataset else "None"
+            "Invalid dataset name given: %s, expected one of %s" % (
+                dataset, ", ".join(sorted(RELEASES))
+            )
         )
 
-    if dataset == "1m":
-        loadMovieLens1m()
-    elif dataset == "100k":
-        loadMovieLens100k()
+    fn, num_entities, num_items, num_edges = RELEASES[dataset]
+    output_filename = 'movielens_%s.dat' % dataset
+    ingest_ratings(fn, output_filename, num_users=num_entities, num_items=num_items)
+    graph = EIGraph.load(output_filename)
+
+    # sanity check some stats
+    assert graph.num_edges() == num_edges, graph.num_edges()
+    if num_entities is not None:
+        assert graph.num_entities == num_entities
+        assert graph.num_items == num_items
+        assert graph.base().GetNodes() == num_entities + num_items
+    if dataset == '1m':
+        assert graph.get_edge_weight(1, 1193*2) == 5
+        assert graph.get_edge_weight(1, 661*2) == 3
+        assert graph.get_edge_weight(3, 1213*2) == 2
 
 if __name__ == '__main__':
-    main(sys.argv[1])
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
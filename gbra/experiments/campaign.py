@@ -0,0 +1,276 @@
+"""
+Attack campaigns: many attacks against one loaded graph.
+
+A campaign runs every cell of an `ExperimentGrid` over the axes
+
+    - attacker: the name of an attacker class, see `ATTACKERS`
+    - target_item: the item to push
+    - fake_entity_fraction: the number of fake entities, as a fraction of
+      the number of entities of the graph
+    - fake_ratings: the number of ratings of every fake entity
+
+and measures the hit ratio of the target item before and after each attack:
+
+    grid = ExperimentGrid([
+        ('attacker', ['RandomAttacker', 'NeighborAttacker']),
+        ('target_item', [2352, 380]),
+        ('fake_entity_fraction', [0.01, 0.05]),
+        ('fake_ratings', [1, 5]),
+    ])
+    with ResultsWriter('campaign-results') as writer:
+        for result in run_campaign(graph, grid, make_recommender, writer):
+            print(result)
+
+The graph is loaded once, by the caller.  Every cell runs in a freshly forked
+worker (see `gbra.util.parallel_utils`), which attacks its copy-on-write view
+of the graph and exits, so the attack is discarded with the process instead
+of every cell copying or reloading the graph.  With a single worker, cells
+run in this process against a `graph.copy()`.
+
+Attacks never change the hit ratio before the attack, so it is measured once
+per target item rather than once per cell.
+
+With `staged`, the cells that differ only in their fraction of fake entities
+run as one attack, grown stage by stage from the smallest budget to the
+largest (see `BaseAttacker.attack_in_stages`), and the hit ratio is measured
+after every stage.  The attack is built once, and every stage reuses the
+graph and recommender state of the previous one.  The cells of attackers
+whose smaller attacks are not the first stages of their larger ones (see
+`BaseAttacker.supports_stages`) still run one by one.
+
+`evaluate_profile` instead replays one saved attack profile (see
+`BaseAttacker.save_profile`) against several recommenders, each in its own
+fork, without running the attack again.
+
+Results go to a `ResultsWriter` store, as two records per cell with the
+cell's config and a `phase` of 'before' or 'after', holding the hit ratio as
+their score.  `ResultsReader(directory).group_stats(by=[..., 'phase'])`
+then summarizes the campaign.
+"""
+
+from collections import namedtuple
+import os
+import time
+import traceback
+
+import numpy as np
+
+from gbra.attackers import attacker
+from gbra.util.parallel_utils import imap_shared
+
+# Attacker classes by name, for the `attacker` axis.
+ATTACKERS = dict((klass.__name__, klass) for klass in [
+    attacker.RandomAttacker, attacker.AverageAttacker,
+    attacker.NeighborAttacker, attacker.BandwagonAttacker,
+    attacker.SegmentAttacker, attacker.LowDegreeAttacker,
+    attacker.HighDegreeAttacker, attacker.HillClimbingAttacker,
+    attacker.BlackBoxRWRAttacker, attacker.BlackBoxDeepRWRAttacker,
+])
+
+class CampaignResult(namedtuple('CampaignResult', [
+        'config', 'hit_ratio_before', 'hit_ratio_after', 'wall_time', 'seed',
+        'error'])):
+    """The outcome of a single attack of a campaign.
+
+    `wall_time` covers the attack (or its stage) and the hit ratio after it,
+    and `error` is the formatted traceback if the attack raised (and None
+    otherwise).
+    """
+    __slots__ = ()
+
+class _Campaign(object):
+    """What the workers of a campaign share."""
+
+    def __init__(self, graph, make_recommender, num_recs, attacker_kwargs):
+        self.graph = graph
+        self.make_recommender = make_recommender
+        self.num_recs = num_recs
+        self.attacker_kwargs = attacker_kwargs
+        # Cells run in this process attack a copy of the graph.
+        self.pid = os.getpid()
+
+def _hit_ratio_task(campaign, target_item):
+    recommender = campaign.make_recommender(campaign.graph)
+    return target_item, recommender.calculate_hit_ratio(target_item, campaign.num_recs)
+
+def _attack_task(campaign, task):
+    """Runs the attacks of a group of cells, which differ only in their
+    fraction of fake entities, as stages of one attack (see
+    `BaseAttacker.attack_in_stages`).  Returns an (index, hit ratio, wall
+    time, error) tuple per cell.
+    """
+    indices, configs = task
+    graph = campaign.graph
+    if os.getpid() == campaign.pid:
+        graph = graph.copy()
+    stage_sizes = [
+        int(config['fake_entity_fraction'] * graph.num_entities) for config in configs
+    ]
+
+    results = []
+    start = time.time()
+    try:
+        config = configs[-1]
+        recommender = campaign.make_recommender(graph)
+        kwargs = dict(campaign.attacker_kwargs.get(config['attacker'], {}))
+        kwargs.update(
+            _recommender=recommender, _target_item=config['target_item'],
+            _num_fake_entities=stage_sizes[-1],
+            _num_fake_ratings=config['fake_ratings']
+        )
+        attacker = ATTACKERS[config['attacker']](**kwargs)
+        for index, _ in zip(indices, attacker.attack_in_stages(stage_sizes)):
+            hit_ratio = recommender.calculate_hit_ratio(
+                config['target_item'], campaign.num_recs
+            )
+            results.append((index, hit_ratio, time.time() - start, None))
+            start = time.time()
+    except Exception:
+        error = traceback.format_exc()
+        results.extend(
+            (index, None, time.time() - start, error)
+            for index in indices[len(results):]
+        )
+    return results
+
+def _group_stages(configs):
+    """Returns the (indices, configs) of every group of `configs` that
+    differ only in their fraction of fake entities, by increasing fraction.
+    The configs of attackers that do not support stages each get a group of
+    their own.
+    """
+    groups = {}
+    for index, config in enumerate(configs):
+        attacker_class = ATTACKERS.get(config['attacker'])
+        if attacker_class is not None and attacker_class.supports_stages:
+            ignored = 'fake_entity_fraction'
+        else:
+            ignored = None
+        key = tuple(sorted(
+            (name, value) for name, value in config.items() if name != ignored
+        ))
+        groups.setdefault(key, []).append(index)
+    tasks = []
+    for key in sorted(groups):
+        indices = sorted(
+            groups[key], key=lambda index: configs[index]['fake_entity_fraction']
+        )
+        tasks.append((indices, [configs[index] for index in indices]))
+    return tasks
+
+def run_campaign(graph, grid, make_recommender, writer=None, num_recs=10,
+        num_workers=None, seed=None, attacker_kwargs=None, staged=False):
+    """Runs the attack of every cell of `grid` against `graph`.  Yields a
+    `CampaignResult` per cell, in the order in which they finish.
+
+    :param graph: the graph to attack.  It is never changed.
+    :param grid: an `ExperimentGrid` with the axes described above.
+    :param make_recommender: a function taking a graph and returning the
+        recommender to attack.  It is called in the workers, so it need not
+        be picklable.
+    :param writer: (optional) the `ResultsWriter` to record results to.
+        Failed attacks are not recorded.
+    :param num_recs: the number of recommendations the hit ratio is
+        measured at.
+    :param num_workers: the number of worker processes, defaults to the
+        number of CPUs.
+    :param seed: (optional) every cell runs with its own seed derived from
+        it, so results do not depend on the number of workers.  If None, it
+        is drawn from NumPy's global random state.
+    :param attacker_kwargs: (optional) a dict of attacker name -> extra
+        keyword arguments of its constructor.
+    :param staged: if True, the cells that differ only in their fraction of
+        fake entities run as the stages of a single attack, grown from the
+        smallest fraction to the largest, with the hit ratio measured after
+        every stage.  One attack then yields the whole budget curve.  Cells
+        of attackers that do not support stages run one by one.
+    """
+    if seed is None:
+        seed = np.random.randint(2 ** 31)
+    configs = list(grid)
+    campaign = _Campaign(graph, make_recommender, num_recs, attacker_kwargs or {})
+
+    target_items = sorted(set(config['target_item'] for config in configs))
+    hit_ratios = dict(imap_shared(
+        _hit_ratio_task, campaign, target_items, num_workers=num_workers,
+        seed=seed
+    ))
+
+    if staged:
+        tasks = _group_stages(configs)
+    else:
+        tasks = [([index], [config]) for index, config in enumerate(configs)]
+    # The i-th attack runs with the seed following on from the ones of the
+    # hit ratios before the attacks, see `imap_shared`.
+    attack_seed = seed + len(target_items)
+    seeds = {}
+    for i, (indices, _) in enumerate(tasks):
+        seeds.update((index, attack_seed + i) for index in indices)
+
+    for task_results in imap_shared(_attack_task, campaign, tasks,
+            num_workers=num_workers, seed=attack_seed, maxtasksperchild=1):
+        for index, hit_ratio, wall_time, error in task_results:
+            config = configs[index]
+            result = CampaignResult(
+                config=config, hit_ratio_before=hit_ratios[config['target_item']],
+                hit_ratio_after=hit_ratio, wall_time=wall_time,
+                seed=seeds[index], error=error
+            )
+            if writer is not None and error is None:
+                for phase, score, latency in (
+                        ('before', result.hit_ratio_before, 0.0),
+                        ('after', result.hit_ratio_after, wall_time)):
+                    writer.write(
+                        dict(config, phase=phase), score=score, latency=latency,
+                        seed=result.seed
+                    )
+            yield result
+
+class _Replay(object):
+    """What the workers of `evaluate_profile` share."""
+
+    def __init__(self, graph, profile, make_recommenders, num_recs):
+        self.graph = graph
+        self.profile = profile
+        self.make_recommenders = make_recommenders
+        self.num_recs = num_recs
+        # Replays run in this process attack a copy of the graph.
+        self.pid = os.getpid()
+
+def _replay_task(replay, name):
+    graph = replay.graph
+    if os.getpid() == replay.pid:
+        graph = graph.copy()
+    make_recommender = replay.make_recommenders[name]
+    target_item = replay.profile.metadata['target_item']
+    before = make_recommender(graph).calculate_hit_ratio(target_item, replay.num_recs)
+    recommender = make_recommender(graph)
+    replay.profile.inject(recommender)
+    return name, before, recommender.calculate_hit_ratio(target_item, replay.num_recs)
+
+def evaluate_profile(graph, profile, make_recommenders, num_recs=10,
+        num_workers=None, seed=None):
+    """Replays the attack `profile` against every recommender of
+    `make_recommenders`, and yields a (recommender name, hit ratio before,
+    hit ratio after) tuple per recommender, in the order in which they
+    finish.
+
+    :param graph: the graph to attack.  It is never changed.
+    :param profile: the AttackProfile to replay, whose metadata names the
+        target item (see `BaseAttacker.save_profile`).
+    :param make_recommenders: a dict of recommender name -> function taking a
+        graph and returning the recommender.
+    :param num_recs: the number of recommendations the hit ratio is measured
+        at, or a list of such cutoffs, in which case hit ratios are dicts
+        mapping each cutoff to its hit ratio.
+    :param num_workers: the number of worker processes, defaults to the
+        number of CPUs.
+    :param seed: (optional) see `run_campaign`.
+    """
+    if seed is None:
+        seed = np.random.randint(2 ** 31)
+    replay = _Replay(graph, profile, make_recommenders, num_recs)
+    return imap_shared(
+        _replay_task, replay, sorted(make_recommenders),
+        num_workers=num_workers, seed=seed, maxtasksperchild=1
+    )
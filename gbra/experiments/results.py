@@ -0,0 +1,261 @@
+"""
+An append-only, columnar store for experiment results.
+
+A store is a directory of chunk files.  Each chunk is a NumPy `.npz` archive
+holding one typed column per field of the records written to it:
+
+    - config.<name>: one column per configuration key (graph, k, ...)
+    - entity:  int64, the entity the record is about (-1 if none)
+    - score:   float64, NaN if the run produced no score
+    - latency: float64, in seconds
+    - seed:    int64, the seed of the run (-1 if unknown)
+
+`ResultsWriter` buffers records and writes them out in chunks.  Chunks are
+written to a temporary file and renamed into place, and every chunk gets a
+unique name, so any number of processes can append to the same store and
+readers never see a partial chunk.
+
+`ResultsReader` streams over the chunks one at a time and aggregates them
+into grouped means, confidence intervals and quantiles, without ever holding
+the whole store in memory.
+"""
+
+from collections import namedtuple
+import glob
+import os
+import socket
+import time
+
+import numpy as np
+from scipy import stats
+
+CONFIG_PREFIX = 'config.'
+CHUNK_EXTENSION = '.npz'
+
+class ResultsWriter(object):
+    """Appends result records to the store in `directory`."""
+
+    def __init__(self, directory, chunk_size=10000):
+        """
+        :param directory: the store's directory, created if needed.
+        :param chunk_size: the number of records buffered before a chunk is
+            written out.
+        """
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Another writer created it in the meantime.
+                if not os.path.isdir(directory):
+                    raise
+        self._directory = directory
+        self._chunk_size = chunk_size
+        self._num_chunks = 0
+        self._config_keys = None
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        self._configs = []
+        self._columns = {'entity': [], 'score': [], 'latency': [], 'seed': []}
+
+    def write(self, config, entity=-1, score=None, latency=0.0, seed=-1):
+        """Buffers a single record.
+
+        :param config: a dict of configuration key -> value.  Every record
+            written by this writer must have the same keys.
+        :param score: the score, or None if there is none.
+        """
+        config_keys = sorted(config)
+        if self._config_keys is None:
+            self._config_keys = config_keys
+        elif config_keys != self._config_keys:
+            raise ValueError(
+                "Config keys %s differ from %s" % (config_keys, self._config_keys)
+            )
+
+        self._configs.append(config)
+        self._columns['entity'].append(entity)
+        self._columns['score'].append(np.nan if score is None else score)
+        self._columns['latency'].append(latency)
+        self._columns['seed'].append(seed)
+        if len(self._configs) >= self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered records out as a new chunk."""
+        if not self._configs:
+            return
+
+        columns = {
+            'entity': np.array(self._columns['entity'], dtype=np.int64),
+            'score': np.array(self._columns['score'], dtype=np.float64),
+            'latency': np.array(self._columns['latency'], dtype=np.float64),
+            'seed': np.array(self._columns['seed'], dtype=np.int64),
+        }
+        for key in self._config_keys:
+            columns[CONFIG_PREFIX + key] = np.array(
+                [config[key] for config in self._configs]
+            )
+
+        name = 'chunk-%s-%d-%d-%d' % (
+            socket.gethostname(), os.getpid(), int(time.time() * 1e6),
+            self._num_chunks
+        )
+        path = os.path.join(self._directory, name + CHUNK_EXTENSION)
+        tmp_path = os.path.join(self._directory, '.' + name + '.tmp')
+        with open(tmp_path, 'wb') as fout:
+            np.savez(fout, **columns)
+            fout.flush()
+            os.fsync(fout.fileno())
+        os.rename(tmp_path, path)
+
+        self._num_chunks += 1
+        self._reset_buffer()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Drop the buffered records of a failed run rather than storing a
+        # partial run that would be counted twice once the run is retried.
+        if exc_type is None:
+            self.close()
+
+class GroupStats(namedtuple('GroupStats', [
+        'count', 'mean', 'std', 'ci_low', 'ci_high', 'quantiles'])):
+    """Summary statistics of a column over one group of records.
+
+    `ci_low` and `ci_high` bound the confidence interval of the mean, and
+    `quantiles` maps each requested quantile to its value.
+    """
+    __slots__ = ()
+
+class _GroupAccumulator(object):
+    """Mergeable count/mean/variance and a bounded uniform sample of the
+    values of one group, used to estimate quantiles.
+    """
+
+    def __init__(self, max_samples):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.samples = np.array([], dtype=np.float64)
+        self._max_samples = max_samples
+
+    def add(self, count, mean, m2, values):
+        # Chan et al.'s parallel variance update.
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / float(total)
+        self.m2 += m2 + delta ** 2 * self.count * count / float(total)
+
+        if len(self.samples) + len(values) <= self._max_samples:
+            self.samples = np.concatenate([self.samples, values])
+        else:
+            # Keep a uniform sample of the union: the number of values to keep
+            # from the old sample follows a hypergeometric distribution.
+            num_old = np.random.hypergeometric(
+                self.count, count, self._max_samples
+            )
+            self.samples = np.concatenate([
+                np.random.permutation(self.samples)[:num_old],
+                np.random.permutation(values)[:self._max_samples - num_old],
+            ])
+        self.count = total
+
+    def stats(self, confidence, quantiles):
+        std = (self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else 0.0
+        if self.count > 1:
+            half_width = stats.t.ppf((1 + confidence) / 2.0, self.count - 1) * \
+                std / self.count ** 0.5
+        else:
+            half_width = float('nan')
+        return GroupStats(
+            count=self.count, mean=self.mean, std=std,
+            ci_low=self.mean - half_width, ci_high=self.mean + half_width,
+            quantiles=dict(zip(
+                quantiles, np.percentile(self.samples, [100 * q for q in quantiles])
+            ))
+        )
+
+class ResultsReader(object):
+    """Reads the store in `directory`."""
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    def chunk_filenames(self):
+        return sorted(glob.glob(
+            os.path.join(self._directory, 'chunk-*' + CHUNK_EXTENSION)
+        ))
+
+    def chunks(self):
+        """Yields every chunk as a dict of column name -> array.  Config
+        columns are named after their configuration key.
+        """
+        for filename in self.chunk_filenames():
+            with np.load(filename) as chunk:
+                yield dict(
+                    (name[len(CONFIG_PREFIX):] if name.startswith(CONFIG_PREFIX)
+                        else name, chunk[name])
+                    for name in chunk.files
+                )
+
+    def group_stats(self, by, column='score', confidence=0.95,
+            quantiles=(0.25, 0.5, 0.75), max_quantile_samples=100000):
+        """Returns a dict mapping every group of records to the `GroupStats`
+        of `column` over it.
+
+        Records whose value is NaN (e.g. runs without a score) are ignored.
+
+        :param by: the list of config keys to group records by.  Groups are
+            keyed by tuples of their values.
+        :param confidence: the confidence level of the intervals of the mean,
+            which are based on Student's t distribution.
+        :param quantiles: the quantiles to report, in [0, 1].
+        :param max_quantile_samples: quantiles are exact for groups with at
+            most this many records, and estimated from a uniform sample of
+            this size for larger groups.
+        """
+        accumulators = {}
+        for chunk in self.chunks():
+            values = chunk[column].astype(np.float64)
+            valid = ~np.isnan(values)
+            values = values[valid]
+            if len(values) == 0:
+                continue
+
+            # Give every distinct combination of the group-by columns in this
+            # chunk a dense id.
+            uniques, codes = zip(*[
+                np.unique(chunk[key][valid], return_inverse=True) for key in by
+            ]) if by else ((), ())
+            combined = np.zeros(len(values), dtype=np.int64)
+            for unique, code in zip(uniques, codes):
+                combined = combined * len(unique) + code
+            group_codes, group_ids = np.unique(combined, return_inverse=True)
+
+            counts = np.bincount(group_ids)
+            means = np.bincount(group_ids, weights=values) / counts
+            m2s = np.bincount(group_ids, weights=(values - means[group_ids]) ** 2)
+            order = np.argsort(group_ids, kind='mergesort')
+            boundaries = np.cumsum(counts)[:-1]
+            group_values = np.split(values[order], boundaries)
+
+            for i, group_code in enumerate(group_codes):
+                key = []
+                for unique in reversed(uniques):
+                    group_code, code = divmod(group_code, len(unique))
+                    key.append(unique[code].item())
+                key = tuple(reversed(key))
+                if key not in accumulators:
+                    accumulators[key] = _GroupAccumulator(max_quantile_samples)
+                accumulators[key].add(counts[i], means[i], m2s[i], group_values[i])
+
+        return dict(
+            (key, accumulator.stats(confidence, list(quantiles)))
+            for key, accumulator in accumulators.items()
+        )
@@ -0,0 +1,242 @@
+"""
+A bounded-concurrency scheduler for grids of experiments.
+
+An experiment grid is declared as a set of axes, e.g.
+
+    grid = ExperimentGrid([
+        ('graph', ['movielens', 'beeradvocate']),
+        ('recommender', ['pixie', 'random', 'popular']),
+    ])
+
+and every cell of the grid (a dict mapping each axis to one of its values) is
+run as one job:
+
+    scheduler = Scheduler(run_cell, load_graph, num_workers=4,
+                          state_filename='sweep.state')
+    for job in scheduler.run(grid):
+        print(job)
+
+Jobs run on a pool of `num_workers` processes.  Each worker keeps the graph
+it last loaded, and jobs are handed out grouped by graph, so every worker
+loads each graph at most once instead of every job loading its own copy.
+
+Every finished job is appended to the state file.  Running the same grid
+again skips the cells found there, so an interrupted sweep resumes where it
+stopped.
+"""
+
+from collections import namedtuple
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import threading
+import time
+import traceback
+
+def cell_key(config):
+    """Returns the string identifying the grid cell with the given config."""
+    return json.dumps(config, sort_keys=True)
+
+class ExperimentGrid(object):
+    """The cartesian product of a list of (axis name, values) pairs."""
+
+    def __init__(self, axes, exclude=None):
+        """
+        :param axes: a list of (axis name, list of values) pairs.
+        :param exclude: (optional) a function taking a cell's config and
+            returning True if the cell should not be run.
+        """
+        self.axes = list(axes)
+        self.exclude = exclude
+
+    def __iter__(self):
+        names = [name for name, _ in self.axes]
+        for values in itertools.product(*[values for _, values in self.axes]):
+            config = dict(zip(names, values))
+            if self.exclude is None or not self.exclude(config):
+                yield config
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+class JobResult(namedtuple(
+        'JobResult', ['config', 'result', 'wall_time', 'peak_memory_mb', 'error'])):
+    """The outcome of running a single grid cell.
+
+    `result` is whatever the job function returned, `error` is the formatted
+    traceback if the job raised (and None otherwise), and `peak_memory_mb` is
+    the peak resident memory of the worker process while it ran the job
+    (including the graph it holds), in MB.
+    """
+    __slots__ = ()
+
+# Per-worker cache holding the name of the last graph loaded and the graph.
+_graph_cache = {}
+
+def _get_graph(graph_loader, graph_name):
+    if _graph_cache.get('name') != graph_name:
+        # Drop the previous graph before loading the next one, so that a
+        # worker never holds two graphs at once.
+        _graph_cache.clear()
+        _graph_cache['graph'] = graph_loader(graph_name)
+        _graph_cache['name'] = graph_name
+    return _graph_cache['graph']
+
+def _max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def _rss_mb():
+    """Returns the current resident memory of this process in MB, or None
+    where /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm') as fin:
+            pages = int(fin.read().split()[1])
+    except (IOError, IndexError, ValueError):
+        return None
+    return pages * resource.getpagesize() / (1024.0 * 1024.0)
+
+class _PeakMemory(object):
+    """Measures the peak resident memory of this process while a job runs.
+
+    Workers are reused, so ru_maxrss alone would report the peak of the
+    biggest job the worker ever ran.  It is exact when the job sets a new
+    high-water mark, and the resident memory sampled every `interval`
+    seconds stands in for it otherwise.  Without /proc, the worker's
+    high-water mark is all there is to report.
+    """
+
+    def __init__(self, interval=0.01):
+        self._interval = interval
+
+    def __enter__(self):
+        self._max_rss_before = _max_rss_mb()
+        self.peak_mb = _rss_mb()
+        if self.peak_mb is not None:
+            self._stop = threading.Event()
+            self._sampler = threading.Thread(target=self._sample)
+            self._sampler.daemon = True
+            self._sampler.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self._interval):
+            self.peak_mb = max(self.peak_mb, _rss_mb())
+
+    def __exit__(self, *exc_info):
+        max_rss = _max_rss_mb()
+        if self.peak_mb is None:
+            self.peak_mb = max_rss
+            return
+        self._stop.set()
+        self._sampler.join()
+        self.peak_mb = max(self.peak_mb, _rss_mb())
+        if max_rss > self._max_rss_before:
+            self.peak_mb = max_rss
+
+def _run_job(args):
+    job_func, graph_loader, graph_axis, config = args
+    start = time.time()
+    result, error = None, None
+    with _PeakMemory() as peak_memory:
+        try:
+            graph = _get_graph(graph_loader, config[graph_axis])
+            result = job_func(graph, config)
+        except Exception:
+            error = traceback.format_exc()
+    return JobResult(
+        config=config, result=result, wall_time=time.time() - start,
+        peak_memory_mb=peak_memory.peak_mb, error=error
+    )
+
+class Scheduler(object):
+    """Runs the cells of an `ExperimentGrid` on a bounded pool of workers."""
+
+    def __init__(self, job_func, graph_loader, num_workers=None,
+            state_filename=None, graph_axis='graph'):
+        """
+        :param job_func: a module-level function (it must be picklable)
+            taking a graph and a cell's config and returning the result of the
+            experiment.  The graph is shared with other jobs run by the same
+            worker, so jobs that mutate it must work on `graph.copy()`.
+            Results are stored in the state file, so they must be JSON
+            serializable.
+        :param graph_loader: a module-level function taking a graph name and
+            returning the corresponding EIGraph.
+        :param num_workers: the maximum number of jobs to run at once.
+            Defaults to the number of CPUs.
+        :param state_filename: (optional) file recording finished cells.
+            Cells found in it are skipped.
+        :param graph_axis: the axis of the grid holding the graph name.
+        """
+        self._job_func = job_func
+        self._graph_loader = graph_loader
+        self._num_workers = num_workers or multiprocessing.cpu_count()
+        self._state_filename = state_filename
+        self._graph_axis = graph_axis
+
+    def completed(self):
+        """Returns a dict of cell key -> JobResult for the finished cells
+        recorded in the state file.
+        """
+        completed = {}
+        if not self._state_filename or not os.path.exists(self._state_filename):
+            return completed
+        with open(self._state_filename) as fin:
+            for line in fin:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut short by an interruption.
+                    continue
+                completed[record['key']] = JobResult(
+                    config=record['config'], result=record['result'],
+                    wall_time=record['wall_time'],
+                    peak_memory_mb=record['peak_memory_mb'], error=None
+                )
+        return completed
+
+    def _record(self, job):
+        if not self._state_filename:
+            return
+        record = dict(job._asdict())
+        del record['error']
+        record['key'] = cell_key(job.config)
+        with open(self._state_filename, 'a') as fout:
+            fout.write(json.dumps(record, sort_keys=True) + '\n')
+            fout.flush()
+            os.fsync(fout.fileno())
+
+    def run(self, grid):
+        """Runs every cell of `grid` that is not recorded as finished in the
+        state file.  Yields a `JobResult` per cell as it finishes.
+
+        Failed jobs are yielded with their traceback in `error` and are not
+        recorded, so they are retried on the next run.
+        """
+        completed = self.completed()
+        configs = [
+            config for config in grid if cell_key(config) not in completed
+        ]
+        # Group the jobs by graph, so that workers reuse the graph they hold.
+        configs.sort(key=lambda config: str(config[self._graph_axis]))
+        tasks = [
+            (self._job_func, self._graph_loader, self._graph_axis, config)
+            for config in configs
+        ]
+        if not tasks:
+            return
+
+        pool = multiprocessing.Pool(min(self._num_workers, len(tasks)))
+        try:
+            for job in pool.imap_unordered(_run_job, tasks):
+                if job.error is None:
+                    self._record(job)
+                yield job
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
@@ -0,0 +1,98 @@
+"""
+Co-rating queries on an Entity-Item graph, as sparse matrix products.
+
+Let R be the entities x items matrix of ratings, and B the same with every
+rating replaced by 1.  For a batch of query items Q, the rows of
+
+    B[:, Q]^T B    count, for every item, the entities that rated it and the
+                   query item (the co-rating counts), and
+    B[:, Q]^T R    sum their ratings of it (the co-rating weight sums).
+
+The items with a nonzero co-rating count are the items two hops away from
+the query item.  One product answers a whole batch of queries, without
+building a Python set per reviewer of every query item.
+
+With `cache_item_matrix`, the full item x item products are computed on the
+first query and rows are sliced out of them afterwards, which pays off for
+many queries against the same graph, at the cost of memory quadratic in the
+number of co-rated items.
+"""
+
+import numpy as np
+from scipy import sparse
+
+class CooccurrenceEngine(object):
+    """Answers co-rating queries on an EIGraph (or MmapEIGraph).
+
+    Items are indexed by item id / 2 - 1 in the matrices returned.  The
+    matrices are rebuilt whenever the graph has changed since the last query
+    (see `EIGraph.version`).
+    """
+
+    def __init__(self, graph, cache_item_matrix=False):
+        """
+        :param graph: the graph to query.
+        :param cache_item_matrix: whether to compute and keep the item x item
+            co-rating matrices, rather than one product per query.
+        """
+        self._graph = graph
+        self._cache_item_matrix = cache_item_matrix
+        self._version = None
+
+    def _refresh(self):
+        """Builds the rating matrices, unless they are current."""
+        graph = self._graph
+        if self._version == graph.version:
+            return
+        entities, items, weights = graph.to_edge_arrays(sort=False)
+        shape = (graph.num_entities, graph.num_items)
+        indices = ((entities - 1) // 2, items // 2 - 1)
+        self._ratings = sparse.csr_matrix(
+            (np.asarray(weights, dtype=np.float64), indices), shape=shape
+        )
+        self._binary = sparse.csr_matrix(
+            (np.ones(len(entities)), indices), shape=shape
+        )
+        # Items x entities: the raters of every item, one row per item.
+        self._raters = self._binary.T.tocsr()
+        self._item_counts = self._item_weight_sums = None
+        self._version = graph.version
+
+    def _get_item_matrices(self):
+        if self._item_counts is None:
+            self._item_counts = self._raters.dot(self._binary).tocsr()
+            self._item_weight_sums = self._raters.dot(self._ratings).tocsr()
+        return self._item_counts, self._item_weight_sums
+
+    def co_ratings(self, items):
+        """Returns the (counts, weight sums) CSR matrices of the co-ratings of
+        `items`, with a row per item of `items` and a column per item of the
+        graph.
+
+        counts[r, j] is the number of entities that rated both items[r] and
+        item j, and weight_sums[r, j] the sum of their ratings of item j.
+        The column of items[r] itself holds its degree and weighted degree.
+        """
+        self._refresh()
+        rows = np.asarray(items, dtype=np.int64) // 2 - 1
+        if self._cache_item_matrix:
+            counts, weight_sums = self._get_item_matrices()
+            return counts[rows], weight_sums[rows]
+        raters = self._raters[rows]
+        return raters.dot(self._binary).tocsr(), raters.dot(self._ratings).tocsr()
+
+    def two_hop_items(self, items):
+        """Returns, for every item of `items`, the sorted array of the items
+        two hops away from it, i.e. rated by an entity that rated it.
+        """
+        counts, _ = self.co_ratings(items)
+        two_hop_items = []
+        for row, item in enumerate(items):
+            columns = counts.indices[counts.indptr[row]:counts.indptr[row + 1]]
+            neighbors = 2 * (np.sort(columns).astype(np.int64) + 1)
+            two_hop_items.append(neighbors[neighbors != item])
+        return two_hop_items
+
+    def neighbor_items(self, item):
+        """Returns the sorted array of the items two hops away from `item`."""
+        return self.two_hop_items([item])[0]
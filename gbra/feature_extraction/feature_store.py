@@ -0,0 +1,307 @@
+"""
+A persistent store of per-node graph features, keyed by graph content.
+
+Features are kept in NumPy arrays indexed by the dense index of a node
+(entity e at (e - 1) / 2, item i at i / 2 - 1), separately for entities and
+items:
+
+    - degree: the number of ratings of the node.
+    - rating_sum, rating_sumsq: the sum and the sum of squares of its
+      ratings, from which its weighted degree and rating mean and standard
+      deviation follow.
+    - two_hop: the number of paths of length two from the node, i.e. the
+      sum of the degrees of its neighbors minus its own degree.
+
+Graphs are identified by a content hash: the sum, modulo 2 ** 64, of the
+splitmix64 hash of every (entity, item, weight) edge, mixed with the number
+of entities and items.  The hash does not depend on the order of the edges,
+so it is computed in one vectorized pass, and it is updated edge by edge as
+the graph changes.  Mutating a graph thus changes its key, and features are
+never stale.
+
+`FeatureStore` keeps the features of every graph it has seen in a directory
+of .npy files, one subdirectory per content hash, which are memory mapped on
+load.  `GraphFeatures.add_edges` and `del_edges` update features in place
+under small mutations of the graph, at the cost of the degrees of the nodes
+involved rather than a full pass.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# Default directory for storing features, see `FeatureStore`.
+FEATURES_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'features')
+
+FEATURE_NAMES = ('degree', 'rating_sum', 'rating_sumsq', 'two_hop')
+INFO = 'info.json'
+
+_MASK = 2 ** 64 - 1
+
+def splitmix64(x):
+    """Returns the splitmix64 mix of every element of the uint64 array `x`."""
+    # Arithmetic wraps around modulo 2 ** 64 by design.
+    with np.errstate(over='ignore'):
+        x = np.asarray(x, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+def edge_hash_sum(entities, items, weights):
+    """Returns the sum, modulo 2 ** 64, of the hashes of the edges."""
+    weight_bits = np.asarray(weights, dtype=np.float64).view(np.uint64)
+    hashes = splitmix64(splitmix64(
+        splitmix64(np.asarray(entities, dtype=np.int64).view(np.uint64)) +
+        np.asarray(items, dtype=np.int64).view(np.uint64)
+    ) + weight_bits)
+    return int(hashes.sum(dtype=np.uint64))
+
+def content_hash(edge_sum, num_entities, num_items):
+    """Returns the content hash, as a hex string, of a graph with the given
+    edge hash sum (see `edge_hash_sum`) and number of entities and items.
+    """
+    nodes = splitmix64([num_entities, num_items])
+    mixed = splitmix64((edge_sum + int(nodes[0]) * 3 + int(nodes[1])) & _MASK)
+    return '%016x' % int(mixed)
+
+def _dense_index(nids):
+    """Returns the dense index of every entity (or every item) in `nids`."""
+    return (np.asarray(nids, dtype=np.int64) - 1) // 2
+
+class GraphFeatures(object):
+    """The per-node features of a graph.
+
+    `entity[name]` and `item[name]` hold the feature `name` (see
+    `FEATURE_NAMES`) of every entity and item.
+    """
+
+    def __init__(self, entity, item, edge_sum):
+        self.entity = entity
+        self.item = item
+        self.edge_sum = edge_sum
+
+    @property
+    def num_entities(self):
+        return len(self.entity['degree'])
+
+    @property
+    def num_items(self):
+        return len(self.item['degree'])
+
+    @property
+    def content_hash(self):
+        return content_hash(self.edge_sum, self.num_entities, self.num_items)
+
+    @staticmethod
+    def compute(graph):
+        """Returns the features of the EIGraph (or MmapEIGraph) `graph`."""
+        entities, items, weights = graph.to_edge_arrays(sort=False)
+        entity_index, item_index = _dense_index(entities), _dense_index(items)
+        weights = np.asarray(weights, dtype=np.float64)
+
+        features = []
+        for index, num_nodes in ((entity_index, graph.num_entities),
+                                 (item_index, graph.num_items)):
+            features.append({
+                'degree': np.bincount(index, minlength=num_nodes),
+                'rating_sum': np.bincount(index, weights=weights, minlength=num_nodes),
+                'rating_sumsq': np.bincount(index, weights=weights ** 2, minlength=num_nodes),
+            })
+        entity, item = features
+        entity['two_hop'] = np.bincount(
+            entity_index, weights=item['degree'][item_index] - 1,
+            minlength=graph.num_entities
+        ).astype(np.int64)
+        item['two_hop'] = np.bincount(
+            item_index, weights=entity['degree'][entity_index] - 1,
+            minlength=graph.num_items
+        ).astype(np.int64)
+        return GraphFeatures(entity, item, edge_hash_sum(entities, items, weights))
+
+    def _get(self, node):
+        """Returns the features of `node` and its dense index."""
+        if node % 2 == 1:
+            return self.entity, (node - 1) // 2
+        return self.item, node // 2 - 1
+
+    def degree(self, node):
+        features, index = self._get(node)
+        return int(features['degree'][index])
+
+    def weighted_degree(self, node):
+        features, index = self._get(node)
+        return float(features['rating_sum'][index])
+
+    def rating_mean(self, node):
+        """Returns the mean rating of `node`, or NaN if it has none."""
+        features, index = self._get(node)
+        count = features['degree'][index]
+        return features['rating_sum'][index] / count if count else float('nan')
+
+    def rating_std(self, node):
+        """Returns the standard deviation of the ratings of `node`, or NaN if
+        it has none.
+        """
+        features, index = self._get(node)
+        count = features['degree'][index]
+        if not count:
+            return float('nan')
+        mean = features['rating_sum'][index] / count
+        return np.sqrt(max(features['rating_sumsq'][index] / count - mean ** 2, 0))
+
+    def two_hop_count(self, node):
+        features, index = self._get(node)
+        return int(features['two_hop'][index])
+
+    def item_degree_dictionary(self):
+        """Returns a dict of item_id -> degree."""
+        degrees = self.item['degree']
+        return dict(zip(
+            (2 * np.arange(1, len(degrees) + 1)).tolist(), degrees.tolist()
+        ))
+
+    def _make_writable(self, num_entities, num_items):
+        """Copies memory-mapped features into memory, and grows them to
+        the given number of nodes.
+        """
+        for features, num_nodes in ((self.entity, num_entities), (self.item, num_items)):
+            for name in FEATURE_NAMES:
+                values = features[name]
+                grown = np.zeros(max(num_nodes, len(values)), dtype=values.dtype)
+                grown[:len(values)] = values
+                features[name] = grown
+
+    def _update(self, graph, entities, items, weights, sign):
+        entities = np.asarray(entities, dtype=np.int64)
+        items = np.asarray(items, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(weights) == 1:
+            weights = np.repeat(weights, len(entities))
+        self._make_writable(graph.num_entities, graph.num_items)
+
+        # Path counts, given the degrees before the update: the changed
+        # edges gain (or lose) the paths through the other end's other
+        # edges, and every remaining neighbor of a changed node gains (or
+        # loses) one path per changed edge.
+        changed = {}
+        for entity, item in zip(entities.tolist(), items.tolist()):
+            changed.setdefault(entity, set()).add(item)
+            changed.setdefault(item, set()).add(entity)
+        for node, others in changed.iteritems():
+            this, index = self._get(node)
+            other = self.item if this is self.entity else self.entity
+            degree_before = this['degree'][index]
+            degree_after = degree_before + sign * len(others)
+            for other_node in others:
+                _, other_index = self._get(other_node)
+                other['two_hop'][other_index] += sign * (
+                    (degree_after if sign > 0 else degree_before) - 1
+                )
+            remaining = [n for n in graph.get_neighbors(node) if n not in others]
+            if remaining:
+                other['two_hop'][_dense_index(remaining)] += sign * len(others)
+
+        for features, index in ((self.entity, _dense_index(entities)),
+                                (self.item, _dense_index(items))):
+            np.add.at(features['degree'], index, sign)
+            np.add.at(features['rating_sum'], index, sign * weights)
+            np.add.at(features['rating_sumsq'], index, sign * weights ** 2)
+
+        hash_sum = edge_hash_sum(entities, items, weights)
+        self.edge_sum = (self.edge_sum + sign * hash_sum) & _MASK
+
+    def add_edges(self, graph, entities, items, weights):
+        """Updates the features after the edges were added to `graph`, which
+        must already hold them (and any nodes they name).
+        """
+        self._update(graph, entities, items, weights, 1)
+
+    def del_edges(self, graph, entities, items, weights):
+        """Updates the features after the edges, with the given weights,
+        were removed from `graph`.
+        """
+        self._update(graph, entities, items, weights, -1)
+
+class FeatureStore(object):
+    """Stores the features of graphs in `directory`, keyed by content hash."""
+
+    def __init__(self, directory=FEATURES_DIR):
+        self._directory = directory
+
+    def _path(self, key):
+        return os.path.join(self._directory, key)
+
+    def get(self, graph):
+        """Returns the features of `graph`, memory mapped from the store if
+        they were stored before, and computed and stored otherwise.
+        """
+        entities, items, weights = graph.to_edge_arrays(sort=False)
+        key = content_hash(
+            edge_hash_sum(entities, items, weights),
+            graph.num_entities, graph.num_items
+        )
+        del entities, items, weights
+        features = self.load(key)
+        if features is None:
+            features = GraphFeatures.compute(graph)
+            self.put(features)
+        return features
+
+    def load(self, key):
+        """Returns the stored features of the graph with content hash `key`,
+        or None if there are none.
+        """
+        path = self._path(key)
+        if not os.path.exists(os.path.join(path, INFO)):
+            return None
+        with open(os.path.join(path, INFO)) as fin:
+            info = json.load(fin)
+        entity, item = [
+            dict(
+                (name, np.load(os.path.join(path, '%s_%s.npy' % (kind, name)), mmap_mode='r'))
+                for name in FEATURE_NAMES
+            )
+            for kind in ('entity', 'item')
+        ]
+        return GraphFeatures(entity, item, int(info['edge_sum'], 16))
+
+    def put(self, features):
+        """Stores `features` under their content hash."""
+        if not os.path.isdir(self._directory):
+            try:
+                os.makedirs(self._directory)
+            except OSError:
+                # Another process created it in the meantime.
+                if not os.path.isdir(self._directory):
+                    raise
+        path = self._path(features.content_hash)
+        if os.path.exists(path):
+            return
+
+        # Write to a temporary directory and rename it into place, so that
+        # readers never see partial features.
+        tmp_path = tempfile.mkdtemp(prefix='.tmp-', dir=self._directory)
+        try:
+            for kind, kind_features in (('entity', features.entity), ('item', features.item)):
+                for name in FEATURE_NAMES:
+                    np.save(
+                        os.path.join(tmp_path, '%s_%s.npy' % (kind, name)),
+                        kind_features[name]
+                    )
+            with open(os.path.join(tmp_path, INFO), 'w') as fout:
+                json.dump({
+                    'edge_sum': '%016x' % features.edge_sum,
+                    'num_entities': features.num_entities,
+                    'num_items': features.num_items,
+                }, fout)
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another process stored the same features first.
+            if not os.path.exists(path):
+                raise
+        finally:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path)
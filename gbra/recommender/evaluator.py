@@ -7,23 +7,44 @@ The basic evaluator evaluates a recommender at an entity as follows:
 
     number of hits = 0
     For each edge coming out of the current entity:
-        Remove edge from the graph
-        Run the recommender on the current entity
-        If the removed edge was in the recommendations:
+        Run the recommender on the current entity, masking out that edge
+        If the masked edge was in the recommendations:
             number of hits += 1
-        Reinsert edge into the graph
     yield (number of hits) / degree of current entity
 
+The held-out edges are never removed from the graph: they are passed to the
+recommender as an `excluded_edges` mask, and all the held-out edges of an
+entity are sent to the recommender as a single batch of queries.  Evaluation
+therefore never mutates the graph it is evaluating.
+
 Evaluating over the entire graph means adding the evaluations for all
 entities and normalizing by the number of entities in the graph and weighing
 each score by the degree of an entity.
+
+The score of an entity is its mean hit@num_recs over its held out edges.
+`evaluate_metrics_at_entity` also reports the other ranking metrics in
+`gbra.recommender.metrics`.
+
+`num_recs` can also be a list of cutoffs.  The recommender is then asked for
+a single ranked list of max(num_recs) items per query, and every score is
+reported as a dict mapping each cutoff to the score at that cutoff.
+
+Entities can also be evaluated in parallel with `evaluate_parallel`, which
+streams back an `EntityEvaluation` (score, degree and latency) per entity as
+worker processes finish them.
 """
 
+import time
+from collections import namedtuple
+
 import numpy as np
 import snap
 
 from gbra.util.ei_graph import EIGraph
 from gbra.util.asserts import *
+from gbra.recommender.metrics import ranking_metrics, pad_item_lists, \
+    DegreeStratifiedSampler, RECS_PAD, HELD_OUT_PAD
+from gbra.util.parallel_utils import imap_shared
 from gbra.util.print_utils import *
 from gbra import Rnd
 
@@ -34,7 +55,8 @@ class RecEvaluator(object):
 
         :param recommender: A recommender object.
         :param num_recs: The number of recommendations to give for each
-            evaluation step.
+            evaluation step.  Can also be a list of cutoffs, in which case
+            scores are dicts mapping each cutoff to its score.
         :param min_score_threshold: The minimum rating to consider in
             evaluation logic.  i.e. if min_score_threshold is 4, the evaluator
             will only evaluate whether the recommender can re-generate edges
@@ -42,22 +64,19 @@ class RecEvaluator(object):
         """
         self._recommender = recommender
         self._num_recs = num_recs
+        if isinstance(num_recs, (list, tuple)):
+            self._ks = sorted(set(num_recs))
+        else:
+            self._ks = [num_recs]
         self._verbose = verbose
         self._min_score_threshold = min_score_threshold
 
-        # Entities with degree 30 or less.
-        self._quick_entities = []
-
         # All entities
         self._entities = recommender._G.get_entities()
 
-        # Set up the entities to work with if we require "quick" evaluation
-        # in our samples.
-        for entity in self._entities:
-            neighbors = self._recommender._G.get_neighbors(entity)
-            if len(neighbors) > 30:
-                continue
-            self._quick_entities.append(entity)
+        # Degree-stratified sampling indexes, keyed by whether they only hold
+        # "quick" entities.  Built on first use, see `sample_entities`.
+        self._samplers = {}
 
     def evaluate_at_entity(self, entity_id, neighbors_to_eval=None):
         """Returns how well the recommender does at predicting items for
@@ -66,37 +85,64 @@ class RecEvaluator(object):
         :param entity_id: the id of the entity to evaluate at
         :param neighbors_to_eval: for performance, can pass in the neighbor items
             of this entity.
-        :returns: a number between 0 and 1 indicating performance, or None
+        :returns: a number between 0 and 1 indicating performance (a dict of
+            cutoff -> such number if evaluating several cutoffs), or None
             if the recommender could not be evaluated at the given entity.
         """
+        metrics = self.evaluate_metrics_at_entity(entity_id, neighbors_to_eval)
+        if metrics is None:
+            return None
+        return _collapse(dict(zip(self._ks, metrics['hit'].tolist())))
+
+    def evaluate_metrics_at_entity(self, entity_id, neighbors_to_eval=None,
+            ks=None):
+        """Returns the ranking metrics of the recommender at a single entity,
+        averaged over its held out edges.
+
+        :param entity_id: the id of the entity to evaluate at
+        :param neighbors_to_eval: for performance, can pass in the neighbor items
+            of this entity.
+        :param ks: (optional) the cutoffs to compute metrics at, defaults to
+            the cutoffs of this evaluator.
+        :returns: a dict mapping each name in `metrics.METRICS` to an array
+            with the metric at every cutoff, or None if the recommender could
+            not be evaluated at the given entity.
+        """
         G = self._recommender._G
         if neighbors_to_eval is None:
             neighbors_to_eval = G.get_neighbors(entity_id)
+        if ks is None:
+            ks = self._ks
 
         if len(neighbors_to_eval) < 1:
             # If this neighbor only has a single edge to another item,
             # (or none), we cannot evaluate it using this scheme
             return None
-        hits = 0.0
-        for neighbor in neighbors_to_eval:
-            G.del_edge(entity_id, neighbor)
-            recommendations = self._recommender.recommend(
-                entity_id, self._num_recs
-            )
-            output = "At entity %d, target was %d, and recommendations were %s" % \
-                (entity_id, neighbor, str(recommendations))
 
-            if neighbor in recommendations:
-                hits += 1
-                if self._verbose:
+        queries = [
+            (entity_id, [(entity_id, neighbor)]) for neighbor in neighbors_to_eval
+        ]
+        all_recommendations = self._recommender.recommend_batch(
+            queries, max(ks)
+        )
+
+        if self._verbose:
+            for neighbor, recommendations in zip(neighbors_to_eval, all_recommendations):
+                output = "At entity %d, target was %d, and recommendations were %s" % \
+                    (entity_id, neighbor, str(recommendations))
+                if neighbor in recommendations:
                     print_green(output)
-            else:
-                if self._verbose:
+                else:
                     print(output)
 
-            G.add_edge(entity_id, neighbor)
-
-        return hits / len(neighbors_to_eval)
+        per_query = ranking_metrics(
+            pad_item_lists(all_recommendations, RECS_PAD, width=max(ks)),
+            pad_item_lists([[n] for n in neighbors_to_eval], HELD_OUT_PAD),
+            ks
+        )
+        return dict(
+            (name, values.mean(axis=0)) for name, values in per_query.items()
+        )
 
     def evaluate_all(self):
         """Returns the sum of evaluation scores for every single entity
@@ -110,63 +156,186 @@ class RecEvaluator(object):
         entities. If quick=True, only looks at entities with 30 or less
         items.
         """
-        entities_to_work_with = self._entities if not quick else self._quick_entities
-        entities_to_work_with = list(entities_to_work_with)
-        if len(entities_to_work_with) < entity_sample_size:
-            print(len(entities_to_work_with), entity_sample_size)
-            raise ValueError(
-                "Not enough entities in graph satisfying quickness property."
+        return self._evaluate(self.sample_entities(entity_sample_size, quick))
+
+    def sample_entities(self, entity_sample_size=10, quick=False, excluding=()):
+        """Returns a set of `entity_sample_size` randomly sampled entities to
+        evaluate at, stratified by degree.  If quick=True, only samples entities
+        with 30 or less items.
+
+        :param excluding: (optional) entities that may not be sampled, e.g.
+            because they were already evaluated.
+        """
+        if quick not in self._samplers:
+            self._samplers[quick] = DegreeStratifiedSampler(
+                self._recommender._G, self._entities,
+                # Let's not look at very high degree or very low degree nodes in any case.
+                min_degree=5, max_degree=30 if quick else 200
             )
+        return set(
+            self._samplers[quick].sample(entity_sample_size, excluding).tolist()
+        )
+
+    def evaluate_parallel(self, entity_set, num_workers=None, seed=None):
+        """Evaluates the recommender at every entity in `entity_set` using
+        `num_workers` worker processes, which share the graph.
+
+        Yields one `EntityEvaluation` per entity, in the order in which they
+        finish.  Entities that cannot be evaluated are yielded with a score of
+        None.  Feed the results to an `EvaluationSummary` for running
+        aggregates.
 
-        entity_sample = set()
-        while entity_sample_size > 0:
-            entity = np.random.choice(entities_to_work_with)
-            assert(entity % 2 == 1)
+        :param num_workers: the number of worker processes, defaults to the
+            number of CPUs.
+        :param seed: (optional) seed for the per-entity random state.  If None,
+            it is drawn from NumPy's global random state.
+        """
+        if seed is None:
+            seed = np.random.randint(2 ** 31)
+        return imap_shared(
+            _evaluate_entity_task, self, sorted(entity_set),
+            num_workers=num_workers, seed=seed
+        )
 
-            neighbors = self._recommender._G.get_neighbors(entity)
+    def _evaluate_entity(self, entity_id):
+        """Returns an `EntityEvaluation` for the given entity, with a score
+        of None if the entity could not be evaluated.
+        """
+        assert(entity_id % 2 == 1)
+        start = time.time()
+        neighbors = self._recommender._G.get_neighbors(entity_id)
+        degree = len(neighbors)
 
-            # Let's not look at very high degree or very low degree nodes in any case.
-            if len(neighbors) > 200 or len(neighbors) < 5:
-                continue
+        # Only keep this neighbors to which you have an edge with weight
+        # greater than the min score threshold.  This is so that we don't
+        # measure hit ratio for edges that should not be recommended in
+        # the first place.
+        neighbors = [
+            n for n in neighbors \
+                if self._recommender._G.get_edge_weight(
+                    n, entity_id
+                ) >= self._min_score_threshold
+        ]
 
-            if entity not in entity_sample:
-                entity_sample_size -= 1
-                entity_sample.add(entity)
+        scores = None
+        if len(neighbors) > 1:
+            # We can't evaluate an entity with one or no valid edges.
+            metrics = self.evaluate_metrics_at_entity(entity_id, neighbors)
+            scores = dict(zip(self._ks, metrics['hit'].tolist()))
 
-        return self._evaluate(entity_sample)
+        return EntityEvaluation(
+            entity_id=entity_id, scores=scores, degree=degree,
+            latency=time.time() - start
+        )
 
     def _evaluate(self, entity_set):
         """Returns sum of recommender evaluation scores for the given set
         of entities, normalized by the number of entities.
         """
-        cumulative_eval_score = 0.0
-        graph_entities = self._recommender._G.get_entities()
-        total_evaled = 0
+        summary = EvaluationSummary()
         for entity_id in entity_set:
-            assert(entity_id % 2 == 1)
-            neighbors = self._recommender._G.get_neighbors(entity_id)
-
-            # Only keep this neighbors to which you have an edge with weight
-            # greater than the min score threshold.  This is so that we don't
-            # measure hit ratio for edges that should not be recommended in
-            # the first place.
-            neighbors = [
-                n for n in neighbors \
-                    if self._recommender._G.get_edge_weight(
-                        n, entity_id
-                    ) >= self._min_score_threshold
-            ]
-
-            if len(neighbors) <= 1:
-                # We can't evaluate an entity with one or no valid edges.
-                continue
-            curr_cumulative_eval_score = self.evaluate_at_entity(
-                entity_id, neighbors
-            )
+            summary.add(self._evaluate_entity(entity_id))
+        return summary.mean_score
+
+def _evaluate_entity_task(evaluator, entity_id):
+    """Worker-side entry point for `RecEvaluator.evaluate_parallel`."""
+    return evaluator._evaluate_entity(entity_id)
+
+def _collapse(scores):
+    """Returns the only score in `scores`, a dict of cutoff -> score, if
+    there is a single cutoff.  Otherwise returns `scores` as is.
+    """
+    if scores is not None and len(scores) == 1:
+        return scores.values()[0]
+    return scores
+
+class EntityEvaluation(namedtuple(
+        'EntityEvaluation', ['entity_id', 'scores', 'degree', 'latency'])):
+    """The result of evaluating the recommender at a single entity.
+
+    `scores` maps every cutoff to the entity's score at that cutoff, or is
+    None if the entity could not be evaluated.
+    """
+    __slots__ = ()
+
+    @property
+    def score(self):
+        """The score of the entity, as a dict of cutoff -> score if it was
+        evaluated at several cutoffs.
+        """
+        return _collapse(self.scores)
+
+class EvaluationSummary(object):
+    """Running aggregates over a stream of `EntityEvaluation`s."""
+
+    def __init__(self):
+        self.num_evaluated = 0
+        self.num_skipped = 0
+        self._score_sums = {}
+        self._score_sq_sums = {}
+        self._latency_sum = 0.0
+        self._start_time = time.time()
 
-            cumulative_eval_score += curr_cumulative_eval_score
-            total_evaled += 1
+    def add(self, evaluation):
+        """Adds an `EntityEvaluation` to the aggregates."""
+        self._latency_sum += evaluation.latency
+        if evaluation.scores is None:
+            self.num_skipped += 1
+            return
+        self.num_evaluated += 1
+        for k, score in evaluation.scores.items():
+            self._score_sums[k] = self._score_sums.get(k, 0.0) + score
+            self._score_sq_sums[k] = self._score_sq_sums.get(k, 0.0) + score ** 2
 
-        if total_evaled == 0:
+    @property
+    def mean_scores(self):
+        """Map of cutoff -> average score over evaluated entities, or None if
+        no entity was evaluated."""
+        if self.num_evaluated == 0:
             return None
-        return cumulative_eval_score / float(total_evaled)
+        return dict(
+            (k, score_sum / self.num_evaluated)
+            for k, score_sum in self._score_sums.items()
+        )
+
+    @property
+    def mean_score(self):
+        """The average score over evaluated entities, or None if none were.
+        A dict of cutoff -> average score if evaluating several cutoffs.
+        """
+        return _collapse(self.mean_scores)
+
+    @property
+    def std_score(self):
+        """The standard deviation of the scores of evaluated entities.
+        A dict of cutoff -> standard deviation if evaluating several cutoffs.
+        """
+        mean_scores = self.mean_scores
+        if mean_scores is None:
+            return None
+        return _collapse(dict(
+            (k, max(sq_sum / self.num_evaluated - mean_scores[k] ** 2, 0.0) ** 0.5)
+            for k, sq_sum in self._score_sq_sums.items()
+        ))
+
+    @property
+    def mean_latency(self):
+        """The average time, in seconds, spent evaluating an entity."""
+        num_entities = self.num_evaluated + self.num_skipped
+        if num_entities == 0:
+            return None
+        return self._latency_sum / num_entities
+
+    @property
+    def elapsed(self):
+        """Wall time, in seconds, since the summary was created."""
+        return time.time() - self._start_time
+
+    def __str__(self):
+        return (
+            "evaluated:%d,skipped:%d,mean_score:%s,std_score:%s,"
+            "mean_latency:%s,elapsed:%f" % (
+                self.num_evaluated, self.num_skipped, str(self.mean_score),
+                str(self.std_score), str(self.mean_latency), self.elapsed
+            )
+        )
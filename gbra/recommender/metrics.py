@@ -0,0 +1,200 @@
+"""
+Vectorized ranking metrics for evaluating recommenders.
+
+All metrics work on batches of queries at once.  A batch is described by two
+padded 2D arrays:
+
+    - recommendations: one row per query, holding the ranked item ids that
+      were recommended for it (padded with RECS_PAD).
+    - held_out: one row per query, holding the item ids that the recommender
+      should have found (padded with HELD_OUT_PAD).
+
+`ranking_metrics` then computes hit@k, precision@k, recall@k, MRR@k and
+NDCG@k for every query and every requested cutoff k in one pass.
+
+This module also contains `DegreeStratifiedSampler`, an index for sampling
+entities to evaluate at, stratified by degree.
+"""
+
+import numpy as np
+
+# Node ids are positive, so neither of these can be a real item.  They differ
+# so that padding in a recommendation row never matches padding in a held out
+# row.
+RECS_PAD = 0
+HELD_OUT_PAD = -1
+
+METRICS = ('hit', 'precision', 'recall', 'mrr', 'ndcg')
+
+def pad_item_lists(item_lists, pad_value, width=None):
+    """Returns a 2D int64 array with one row per list in `item_lists`,
+    right-padded with `pad_value`.
+
+    :param width: (optional) the number of columns.  Lists longer than it are
+        truncated.  Defaults to the length of the longest list.
+    """
+    item_lists = [list(items) for items in item_lists]
+    if width is None:
+        width = max([len(items) for items in item_lists] + [1])
+
+    padded = np.full((len(item_lists), width), pad_value, dtype=np.int64)
+    lengths = np.array(
+        [min(len(items), width) for items in item_lists], dtype=np.int64
+    )
+    mask = np.arange(width) < lengths[:, None]
+    padded[mask] = [
+        item for items in item_lists for item in items[:width]
+    ]
+    return padded
+
+def hit_matrix(recommendations, held_out):
+    """Returns a boolean array shaped like `recommendations` that is True
+    wherever the recommended item is one of the held out items of its query.
+    """
+    recommendations = np.asarray(recommendations, dtype=np.int64)
+    held_out = np.asarray(held_out, dtype=np.int64)
+    assert recommendations.shape[0] == held_out.shape[0]
+
+    # Offset every row by a different multiple of a number larger than any
+    # id, so that a single membership test checks each row independently.
+    stride = max(
+        recommendations.max() if recommendations.size else 0,
+        held_out.max() if held_out.size else 0
+    ) + 2
+    rows = np.arange(recommendations.shape[0], dtype=np.int64)[:, None] * stride
+    hits = np.in1d(
+        (recommendations + rows).ravel(),
+        (held_out + rows)[held_out != HELD_OUT_PAD]
+    ).reshape(recommendations.shape)
+    return hits & (recommendations != RECS_PAD)
+
+def ranking_metrics(recommendations, held_out, ks):
+    """Computes ranking metrics for a batch of queries.
+
+    :param recommendations: (num queries x max k) array of ranked item ids,
+        padded with RECS_PAD.
+    :param held_out: (num queries x num held out) array of item ids, padded
+        with HELD_OUT_PAD.
+    :param ks: the list of cutoffs to compute metrics at.
+    :returns: a dict mapping each name in METRICS to a
+        (num queries x len(ks)) float array.  Recall and NDCG are 0 for
+        queries without held out items.
+    """
+    recommendations = np.asarray(recommendations, dtype=np.int64)
+    held_out = np.asarray(held_out, dtype=np.int64)
+    ks = np.asarray(ks, dtype=np.int64)
+    if np.any(ks < 1):
+        raise ValueError("Cutoffs must be positive integers.")
+
+    num_queries, width = recommendations.shape
+    if width == 0 or num_queries == 0:
+        zeros = np.zeros((num_queries, len(ks)))
+        return dict((name, zeros.copy()) for name in METRICS)
+
+    hits = hit_matrix(recommendations, held_out)
+    num_relevant = (held_out != HELD_OUT_PAD).sum(axis=1)
+
+    # Column index for the last rank inside each cutoff.
+    last = np.minimum(ks, width) - 1
+    hits_at_k = np.cumsum(hits, axis=1)[:, last].astype(np.float64)
+
+    # Rank (1-based) of the first hit in each query, or 0 if there is none.
+    any_hit = hits.any(axis=1)
+    first_rank = np.where(any_hit, hits.argmax(axis=1) + 1, 0)
+    in_cutoff = (first_rank[:, None] >= 1) & (first_rank[:, None] <= ks[None, :])
+    reciprocal_rank = np.where(
+        in_cutoff, 1.0 / np.maximum(first_rank, 1)[:, None], 0.0
+    )
+
+    discounts = 1.0 / np.log2(np.arange(2, width + 2))
+    dcg = np.cumsum(hits * discounts, axis=1)[:, last]
+    ideal_discounts = np.concatenate([[0.0], np.cumsum(
+        1.0 / np.log2(np.arange(2, max(width, num_relevant.max()) + 2))
+    )])
+    idcg = ideal_discounts[np.minimum(num_relevant[:, None], ks[None, :])]
+
+    safe_relevant = np.maximum(num_relevant, 1)[:, None]
+    has_relevant = (num_relevant > 0)[:, None]
+    return {
+        'hit': (hits_at_k > 0).astype(np.float64),
+        'precision': hits_at_k / ks[None, :],
+        'recall': np.where(has_relevant, hits_at_k / safe_relevant, 0.0),
+        'mrr': reciprocal_rank,
+        'ndcg': np.where(idcg > 0, dcg / np.where(idcg > 0, idcg, 1.0), 0.0),
+    }
+
+class DegreeStratifiedSampler(object):
+    """An index for sampling entities stratified by their degree.
+
+    Entities are split into `num_strata` strata holding (roughly) the same
+    number of entities, ordered by degree.  A sample of size n draws from
+    every stratum in proportion to its size, which keeps the degree mix of
+    every sample close to the population's.
+
+    Building the index costs one degree lookup per entity; sampling from it
+    is vectorized, so build it once and reuse it.
+    """
+
+    def __init__(self, graph, entities=None, min_degree=5, max_degree=200,
+            num_strata=10):
+        """
+        :param graph: the EIGraph to sample entities from.
+        :param entities: (optional) the candidate entities, defaults to every
+            entity in the graph.
+        :param min_degree: entities with a smaller degree are never sampled.
+        :param max_degree: entities with a larger degree are never sampled.
+        :param num_strata: the number of degree strata.
+        """
+        if entities is None:
+            entities = graph.get_entities()
+        entities = np.array(sorted(entities), dtype=np.int64)
+        degrees = np.array(
+            [graph.get_degree(entity) for entity in entities], dtype=np.int64
+        )
+
+        eligible = (degrees >= min_degree) & (degrees <= max_degree)
+        order = np.argsort(degrees[eligible], kind='mergesort')
+        self.entities = entities[eligible][order]
+        self.degrees = degrees[eligible][order]
+
+        # Stratum boundaries, as indices into the degree-sorted entities.
+        num_strata = max(1, min(num_strata, len(self.entities)))
+        self._boundaries = np.linspace(
+            0, len(self.entities), num_strata + 1
+        ).astype(np.int64)
+
+    def __len__(self):
+        return len(self.entities)
+
+    def sample(self, sample_size, excluding=()):
+        """Returns an array of `sample_size` distinct entities.
+
+        :param excluding: (optional) entities that may not be sampled.
+        """
+        if sample_size == 0:
+            return np.array([], dtype=np.int64)
+
+        available = ~np.in1d(
+            self.entities, np.fromiter(excluding, dtype=np.int64)
+        )
+        if available.sum() < sample_size:
+            raise ValueError(
+                "Not enough entities to sample %d from." % sample_size
+            )
+
+        starts, ends = self._boundaries[:-1], self._boundaries[1:]
+        stratum_sizes = np.array([
+            available[start:end].sum() for start, end in zip(starts, ends)
+        ])
+
+        # Proportional allocation, rounded with the largest remainder method.
+        quotas = sample_size * stratum_sizes / float(stratum_sizes.sum())
+        allocation = np.floor(quotas).astype(np.int64)
+        remainder = sample_size - allocation.sum()
+        allocation[np.argsort(allocation - quotas, kind='mergesort')[:remainder]] += 1
+
+        sample = []
+        for start, end, size in zip(starts, ends, allocation):
+            candidates = self.entities[start:end][available[start:end]]
+            sample.append(np.random.choice(candidates, size, replace=False))
+        return np.concatenate(sample)
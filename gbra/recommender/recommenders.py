@@ -9,8 +9,22 @@ Each recommender object has the interface you'd expect it to have:
 Each recommender system object also exposes an interface to the attacker.
 All methods starting with "_attacker_" are meant to be called by the
 attacker entity.
+
+Every `recommend` call accepts an optional `excluded_edges` mask: a collection
+of (entity, item) pairs that the recommender must treat as if they were not in
+the graph for that query only.  This lets callers (e.g. the evaluator) hold
+out edges without mutating the shared graph.
+
+`recommend_what_if` and `recommend_hypotheses` answer "what would this entity
+be recommended if it also rated these items (and had not rated those)",
+e.g. for black-box attackers probing the recommender.  The hypothetical
+edges are virtual: the random, popular item and random walk recommenders
+answer without mutating the graph, so any number of threads can query at
+once, and the random walk recommenders share the cumulative weight tables of
+the graph across all the hypotheses (see `_WeightTables`).
 """
 
+from bisect import bisect_left
 import random
 import numpy as np
 
@@ -19,6 +33,103 @@ from gbra.util.ei_graph import EIGraph
 from gbra.util.asserts import *
 from gbra import Rnd
 
+def _cumulative(weights):
+    """Returns the running sums of `weights`, added up in order."""
+    cumulative = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+def _what_if_neighbors(neighbors, added_edges, removed_items):
+    """Returns the set of `neighbors` without `removed_items` and with the
+    items of `added_edges`.
+    """
+    neighbors = set(neighbors)
+    neighbors.difference_update(removed_items)
+    neighbors.update(item for item, _ in added_edges)
+    return neighbors
+
+class _WeightTables(object):
+    """The sorted neighbors and cumulative edge weights of the nodes of a
+    graph, built on first use, for drawing weighted random neighbors.
+
+    Draws consume the same random numbers as
+    `EIGraph.get_random_neighbor_id(node, use_weights=True)` and pick the same
+    neighbors.  A hypothesis (see `BaseRecommender.recommend_hypotheses`)
+    overlays tables for the few nodes whose edges it changes, and shares the
+    tables of every other node with the other hypotheses.
+    """
+
+    def __init__(self, graph):
+        self._graph = graph
+        self._tables = {}  # node -> (neighbors, weights, cumulative weights)
+
+    def get(self, node):
+        table = self._tables.get(node)
+        if table is None:
+            graph = self._graph
+            neighbors = graph.get_neighbors(node)
+            weights = [graph.get_edge_weight(node, neighbor) for neighbor in neighbors]
+            table = (neighbors, weights, _cumulative(weights))
+            # Tables are never changed once built, so concurrent queries can
+            # at worst build the same table twice.
+            self._tables[node] = table
+        return table
+
+    @staticmethod
+    def _replace_edge(table, neighbor, weight=None):
+        """Returns `table` with its edge to `neighbor` removed, or set to
+        `weight` if given.
+        """
+        neighbors, weights, cumulative = table
+        position = bisect_left(neighbors, neighbor)
+        present = position < len(neighbors) and neighbors[position] == neighbor
+        if weight is None:
+            if not present:
+                return table
+            neighbors = neighbors[:position] + neighbors[position + 1:]
+            weights = weights[:position] + weights[position + 1:]
+        else:
+            tail = position + 1 if present else position
+            neighbors = neighbors[:position] + [neighbor] + neighbors[tail:]
+            weights = weights[:position] + [weight] + weights[tail:]
+        # The sums up to the changed edge stay the same.
+        total = cumulative[position - 1] if position else 0.0
+        return neighbors, weights, \
+            cumulative[:position] + _cumulative([total] + weights[position:])[1:]
+
+    def overlay(self, entity_id, added_edges, removed_items):
+        """Returns a map of node -> table for the nodes whose edges change if
+        `entity_id` does not rate `removed_items`, and rates item with weight
+        for every (item, weight) of `added_edges`.
+        """
+        overlay = {}
+        def replace_edge(node, neighbor, weight=None):
+            table = overlay.get(node) or self.get(node)
+            overlay[node] = self._replace_edge(table, neighbor, weight)
+        for item in removed_items:
+            replace_edge(entity_id, item)
+            replace_edge(item, entity_id)
+        for item, weight in added_edges:
+            replace_edge(entity_id, item, weight)
+            replace_edge(item, entity_id, weight)
+        return overlay
+
+    def sampler(self, overlay):
+        """Returns a function drawing a weighted random neighbor of a node,
+        from the tables of `overlay` where there are any.
+        """
+        get = self.get
+        def sample_neighbor(node):
+            neighbors, _, cumulative = overlay.get(node) or get(node)
+            if not neighbors:
+                raise ValueError("Node has no neighbors")
+            draw = random.random() * cumulative[-1]
+            return neighbors[min(bisect_left(cumulative, draw), len(neighbors) - 1)]
+        return sample_neighbor
+
 class BaseRecommender(object):
 
     def __init__(self, G):
@@ -38,6 +149,15 @@ class BaseRecommender(object):
         self._attacker_nodes.add(entity_id)
         return entity_id
 
+    def _attacker_add_entities(self, num_entities):
+        """Adds `num_entities` new entities to the graph G at once.
+
+        :returns: the array of the newly-created nodes.
+        """
+        entity_ids = self._G.add_entities(num_entities)
+        self._attacker_nodes.update(entity_ids.tolist())
+        return entity_ids
+
     def _attacker_add_edge(self, entity_id, item_id, weight):
         """Adds an edge from an attacker-controlled entity to any
         other item.  Does not check whether the edge already exists.
@@ -60,50 +180,235 @@ class BaseRecommender(object):
             )
 
         self._G.add_edge(entity_id, item_id, weight = weight)
+        self._on_edges_added([entity_id], [item_id], [weight])
+
+    def _attacker_add_edges(self, entity_ids, item_ids, weights):
+        """Adds an edge from attacker-controlled entity `entity_ids[i]` to
+        item `item_ids[i]` with weight `weights[i]` for every i.
+
+        This is the bulk counterpart of `_attacker_add_edge`: the edges are
+        validated with vectorized checks, added with `EIGraph.add_edges`, and
+        the recommender's indexes are updated once for the whole batch.
+
+        Raises an error, leaving the graph unchanged, if an entity is not
+        owned by the attacker, or if an edge names an unknown node, repeats
+        another edge or already exists.
+        """
+        entity_ids = np.asarray(entity_ids, dtype=np.int64).ravel()
+        item_ids = np.asarray(item_ids, dtype=np.int64).ravel()
+        weights = np.asarray(weights).ravel()
+        if len(weights) == 1:
+            weights = np.repeat(weights, len(entity_ids))
+
+        if (entity_ids % 2 != 1).any() or (entity_ids < 1).any():
+            raise ValueError("Invalid entity ids. Entity ids are odd.")
+        if (item_ids % 2 != 0).any() or (item_ids < 2).any():
+            raise ValueError("Invalid item ids. Item ids are even.")
+        attacker_nodes = np.fromiter(
+            self._attacker_nodes, np.int64, len(self._attacker_nodes)
+        )
+        forbidden = ~np.in1d(entity_ids, attacker_nodes)
+        if forbidden.any():
+            raise ValueError(
+                "Attacker added edge from forbidden entity: %d" %
+                entity_ids[forbidden][0]
+            )
+
+        self._G.add_edges(entity_ids, item_ids, weights)
+        self._on_edges_added(entity_ids, item_ids, weights)
+
+    def _on_edges_added(self, entity_ids, item_ids, weights):
+        """Called after the attacker added edges to the graph, once per
+        batch, so that subclasses can update their indexes.
+        """
+        pass
 
     def calculate_hit_ratio(self, target_item, number_of_items, verbose = False):
+        """Returns the fraction of real entities that get `target_item` among
+        their top `number_of_items` recommendations.
+
+        :param number_of_items: the number of recommendations, or a list of
+            such cutoffs.  With a list, every entity is only asked for
+            max(number_of_items) recommendations, and the result is a dict
+            mapping each cutoff to its hit ratio.
+        """
         if verbose:
             print "Calculating hit ratio:"
+        if isinstance(number_of_items, (list, tuple)):
+            ks = sorted(set(number_of_items))
+        else:
+            ks = [number_of_items]
+
         real_entities = self._G.get_entities() - self._attacker_nodes
-        hits = 0
+        hits = dict((k, 0) for k in ks)
         count = 0
         for entity_id in real_entities:
             if verbose:
                 print "Processing %d/%d" % (count, len(real_entities))
             try:
-                recommendations = self.recommend(entity_id, number_of_items)
+                recommendations = self.recommend(entity_id, ks[-1])
             except:
                 recommendations = []
             if target_item in recommendations:
-                hits += 1
+                rank = list(recommendations).index(target_item)
+                for k in ks:
+                    if rank < k:
+                        hits[k] += 1
             count += 1
-        ratio = hits * 1.0 / count
+        ratios = dict((k, hits[k] * 1.0 / count) for k in ks)
         if verbose:
-            print "Calculated hit ratio: %f" % ratio
-        return ratio
+            print "Calculated hit ratio: %s" % str(ratios)
+        if not isinstance(number_of_items, (list, tuple)):
+            return ratios[number_of_items]
+        return ratios
+
+    def recommend_batch(self, queries, number_of_items):
+        """Returns a list with the recommendations for each query in `queries`.
+
+        :param queries: an iterable of (entity_id, excluded_edges) pairs, where
+            excluded_edges is the mask to apply for that query only (or None).
+        :param number_of_items: the number of items to recommend per query.
+        """
+        return [
+            self.recommend(entity_id, number_of_items, excluded_edges=excluded_edges)
+            for entity_id, excluded_edges in queries
+        ]
+
+    def recommend_what_if(self, entity_id, number_of_items, added_edges=(),
+            removed_items=()):
+        """Returns the recommendations for `entity_id` as if it also rated
+        the items of `added_edges` and had not rated `removed_items`.  The
+        graph is left as it is.
+
+        :param added_edges: a collection of (item, weight) pairs.  An item
+            the entity already rates gets the new weight.
+        :param removed_items: a collection of items the entity rates.
+        """
+        return self.recommend_hypotheses(
+            entity_id, number_of_items, [(added_edges, removed_items)]
+        )[0]
+
+    def recommend_hypotheses(self, entity_id, number_of_items, hypotheses):
+        """Returns the recommendations for `entity_id` under every hypothesis
+        of `hypotheses`, see `recommend_what_if`.
+
+        :param hypotheses: a list of (added_edges, removed_items) pairs.
+
+        This default implementation adds and removes the hypothetical edges
+        for real around each recommendation, so it is not thread-safe, and
+        the recommender's own indexes (see `_on_edges_added`) never see
+        them.  Subclasses override it to answer without touching the graph.
+        """
+        graph = self._G
+        results = []
+        for added_edges, removed_items in hypotheses:
+            removed = [
+                (item, graph.get_edge_weight(entity_id, item))
+                for item in removed_items
+            ]
+            replaced = [
+                (item, graph.get_edge_weight(entity_id, item))
+                for item, _ in added_edges if graph.is_edge(entity_id, item)
+            ]
+            for item, _ in removed + replaced:
+                graph.del_edge(entity_id, item)
+            for item, weight in added_edges:
+                graph.add_edge(entity_id, item, weight)
+            try:
+                results.append(self.recommend(entity_id, number_of_items))
+            finally:
+                for item, _ in added_edges:
+                    graph.del_edge(entity_id, item)
+                for item, weight in removed + replaced:
+                    graph.add_edge(entity_id, item, weight)
+        return results
+
+    def _get_weight_tables(self):
+        """Returns the `_WeightTables` of the graph, rebuilt whenever the
+        graph has changed (see `EIGraph.version`).
+        """
+        version = self._G.version
+        cached = getattr(self, '_weight_tables', None)
+        if cached is None or cached[0] != version:
+            cached = (version, _WeightTables(self._G))
+            self._weight_tables = cached
+        return cached[1]
+
+    def _check_hypotheses(self, entity_id, hypotheses):
+        """Raises a ValueError unless `entity_id` and the items of every
+        hypothesis are in the graph.
+        """
+        if not self._G.has_entity(entity_id):
+            raise ValueError("Node with id %d is not in the graph." % entity_id)
+        for added_edges, removed_items in hypotheses:
+            for item in list(removed_items) + [item for item, _ in added_edges]:
+                assert_node_is_item(item)
+                assert_node_exists(item, self._G)
+
+    @staticmethod
+    def _get_exclusion_map(excluded_edges):
+        """Returns a map of node id -> set of neighbor ids whose edge to
+        the node is masked by `excluded_edges`.
+        """
+        exclusions = {}
+        if not excluded_edges:
+            return exclusions
+        for entity_id, item_id in excluded_edges:
+            exclusions.setdefault(entity_id, set()).add(item_id)
+            exclusions.setdefault(item_id, set()).add(entity_id)
+        return exclusions
+
+    def _get_entity_items(self, entity_id, exclusions):
+        """Returns the items the entity has an edge to, ignoring any edges
+        masked by `exclusions` (see `_get_exclusion_map`).
+        """
+        excluded_items = exclusions.get(entity_id, ())
+        return [
+            item_id for item_id in self._G.get_neighbors(entity_id)
+            if item_id not in excluded_items
+        ]
 
     @abstractmethod
-    def recommend(self, entity_id, number_of_items):
+    def recommend(self, entity_id, number_of_items, excluded_edges=None):
         """Returns an ordered list of items recommended
         for the given entity.  Returns the following number of recommendations:
 
             min(number_of_items, items in the graph - num neighbors of entity_id)
+
+        :param excluded_edges: (optional) collection of (entity, item) pairs
+            to treat as missing from the graph for this query.
         """
         raise NotImplemented()
 
 class RandomRecommender(BaseRecommender):
     """Recommender that returns random recommendations
     """
-    def recommend(self, entity_id, number_of_items):
+    def recommend(self, entity_id, number_of_items, excluded_edges=None):
         if not self._G.has_entity(entity_id):
             raise ValueError("Node with id %d is not in the graph." % entity_id)
 
+        entity_neighbors = self._get_entity_items(
+            entity_id, self._get_exclusion_map(excluded_edges)
+        )
+        return self._recommend(
+            tuple(self._G.get_items()), entity_neighbors, number_of_items
+        )
+
+    def recommend_hypotheses(self, entity_id, number_of_items, hypotheses):
+        self._check_hypotheses(entity_id, hypotheses)
         graph_items = tuple(self._G.get_items())
-        entity_node = self._G.base().GetNI(entity_id)
-        entity_neighbors = [
-            neighborItem for neighborItem in entity_node.GetOutEdges()
+        entity_neighbors = self._G.get_neighbors(entity_id)
+        return [
+            self._recommend(
+                graph_items,
+                _what_if_neighbors(entity_neighbors, added_edges, removed_items),
+                number_of_items
+            )
+            for added_edges, removed_items in hypotheses
         ]
 
+    @staticmethod
+    def _recommend(graph_items, entity_neighbors, number_of_items):
         number_of_items = min(
             number_of_items, len(graph_items) - len(entity_neighbors)
         )
@@ -121,6 +426,10 @@ class PopularItemRecommender(BaseRecommender):
     """Recommender that returns random recommendations from the top K most popular items,
     where an item's popularity is defined as the sum of the weights of all its out edges.
 
+    Edges added by the attacker count towards popularity: the popularity of
+    their items is updated per batch, and the top items are recomputed at
+    the next recommendation.
+
     If top k most popular items are not enough to give recommendations to an entity,
     the algorithm devolves to random sampling.
     """
@@ -141,7 +450,8 @@ class PopularItemRecommender(BaseRecommender):
 
         # TODO: if the total number of items is huge, we need to be smarter about this,
         # i.e., use a min heap for keeping the top k most popular elements.
-        popular_items = []
+        self._num_popular_items = num_items
+        self._popularity = {}  # item -> total popularity
 
         items = self._G.get_items()
         for item in items:
@@ -149,33 +459,99 @@ class PopularItemRecommender(BaseRecommender):
             total_popularity = 0
             for neighbor in neighbors:
                 total_popularity += self._G.get_edge_weight(item, neighbor)
-            popular_items.append((item, total_popularity))
+            self._popularity[item] = total_popularity
 
+        self._select_popular_items()
+
+    def _select_popular_items(self):
         self._popular_items = np.array([
             i[0] for i in sorted(
-                popular_items, key=lambda x: x[1], reverse=True
-            )[:num_items]
+                self._popularity.items(), key=lambda x: x[1], reverse=True
+            )[:self._num_popular_items]
         ])
+        self._popular_items_stale = False
+
+    def _on_edges_added(self, entity_ids, item_ids, weights):
+        for item, weight in zip(np.asarray(item_ids).tolist(), np.asarray(weights).tolist()):
+            self._popularity[item] = self._popularity.get(item, 0) + weight
+        self._popular_items_stale = True
 
-    def recommend(self, entity_id, number_of_items):
+    def recommend(self, entity_id, number_of_items, excluded_edges=None):
         if not self._G.has_entity(entity_id):
             raise ValueError("Node with id %d is not in the graph." % entity_id)
 
-        graph_items = tuple(self._G.get_items())
-        entity_node = self._G.base().GetNI(entity_id)
-        entity_neighbors = [
-            neighborItem for neighborItem in entity_node.GetOutEdges()
-        ]
+        entity_neighbors = self._get_entity_items(
+            entity_id, self._get_exclusion_map(excluded_edges)
+        )
 
+        if self._popular_items_stale:
+            self._select_popular_items()
+
+        # Let's permute popular items and scan for recommendations.
+        self._popular_items = np.random.permutation(self._popular_items)
+        return self._recommend(
+            tuple(self._G.get_items()), entity_neighbors, self._popular_items,
+            number_of_items
+        )
+
+    def recommend_hypotheses(self, entity_id, number_of_items, hypotheses):
+        self._check_hypotheses(entity_id, hypotheses)
+        if self._popular_items_stale:
+            self._select_popular_items()
+        graph_items = tuple(self._G.get_items())
+        entity_neighbors = self._G.get_neighbors(entity_id)
+        results = []
+        for added_edges, removed_items in hypotheses:
+            popular_items = self._what_if_popular_items(
+                entity_id, added_edges, removed_items
+            )
+            results.append(self._recommend(
+                graph_items,
+                _what_if_neighbors(entity_neighbors, added_edges, removed_items),
+                np.random.permutation(popular_items), number_of_items
+            ))
+        return results
+
+    def _what_if_popular_items(self, entity_id, added_edges, removed_items):
+        """Returns the popular items if `entity_id` rated the items of
+        `added_edges` and had not rated `removed_items`, leaving the
+        popularity of the recommender as it is.
+        """
+        graph = self._G
+        changes = {}  # item -> change of its popularity
+        removed_items = set(removed_items)
+        for item in removed_items:
+            changes[item] = changes.get(item, 0) - graph.get_edge_weight(entity_id, item)
+        for item, weight in added_edges:
+            if item not in removed_items and graph.is_edge(entity_id, item):
+                weight -= graph.get_edge_weight(entity_id, item)
+            changes[item] = changes.get(item, 0) + weight
+
+        popular_items = self._popular_items.tolist()
+        if not changes:
+            return popular_items
+        popular_set = set(popular_items)
+        if any(changes[item] < 0 for item in changes if item in popular_set):
+            # A popular item may drop out of the top items: rank them all.
+            candidates = self._popularity.keys()
+        else:
+            candidates = popular_items + [
+                item for item in changes if item not in popular_set
+            ]
+        popularity = self._popularity
+        return sorted(
+            candidates, key=lambda item: popularity.get(item, 0) + changes.get(item, 0),
+            reverse=True
+        )[:self._num_popular_items]
+
+    @staticmethod
+    def _recommend(graph_items, entity_neighbors, popular_items, number_of_items):
         number_of_items = min(
             number_of_items, len(graph_items) - len(entity_neighbors)
         )
 
         recommendations = []
-
-        # Let's permute popular items and scan for recommendations.
-        self._popular_items = np.random.permutation(self._popular_items)
-        for pop_item in self._popular_items:
+        for pop_item in popular_items:
             if number_of_items == 0:
                 break
             if pop_item in entity_neighbors or pop_item in recommendations:
@@ -251,7 +627,12 @@ class BasicRandomWalkRecommender(BaseRecommender):
         # Clip back to desired range.
         return min(max(sample, 1), self._max_steps_in_walk)
 
-    def _do_basic_random_walk(self, start_entity):
+    def _do_basic_random_walk(self, start_entity, sample_neighbor):
+        """Returns a map of item -> visit count for walks from `start_entity`.
+
+        :param sample_neighbor: a function returning the weighted random
+            neighbor of a node to step to.
+        """
         V = {} # Maps items to the number of times we've seen them in random walks.
         tot_steps = 0
 
@@ -259,23 +640,23 @@ class BasicRandomWalkRecommender(BaseRecommender):
             print("Starting random walks from entity: %d" % start_entity)
 
         while tot_steps < self._max_steps_in_walk:
-            curr_entity = self._G.base().GetNI(start_entity)
+            curr_entity = start_entity
             curr_steps = self._sample_walk_length()
             walk = [str(start_entity)]
 
             # Let's not go beyond tot_steps.
             curr_steps = min(curr_steps, self._max_steps_in_walk - tot_steps)
 
-            # curr_entity contains SNAP node of the last traversed entity.
-            # curr_item contains the SNAP node of the last traversed item.
+            # curr_entity contains the ID of the last traversed entity.
+            # curr_item contains the ID of the last traversed item.
             for step in range(curr_steps):
                 if step != 0:
-                    curr_entity = self._G.get_random_neighbor(curr_item, use_weights=True)
-                    walk.append(str(curr_entity.GetId()))
+                    curr_entity = sample_neighbor(curr_item)
+                    walk.append(str(curr_entity))
 
-                curr_item = self._G.get_random_neighbor(curr_entity, use_weights=True)
-                walk.append(str(curr_item.GetId()))
-                curr_item_id = curr_item.GetId()
+                curr_item = sample_neighbor(curr_entity)
+                walk.append(str(curr_item))
+                curr_item_id = curr_item
 
                 if curr_item_id not in V:
                     V[curr_item_id] = 0
@@ -287,7 +668,8 @@ class BasicRandomWalkRecommender(BaseRecommender):
             tot_steps += curr_steps
         return V
 
-    def _recommend(self, entity_id, number_of_items, random_walk_func):
+    def _recommend(self, entity_id, number_of_items, random_walk_func,
+            excluded_edges=None):
         # TODO: it may be a good idea to use better data structures here
         # We want to very quickly get the top_n most visited items
         # in V.  It'd be great if V was already sorted in descending order
@@ -295,12 +677,41 @@ class BasicRandomWalkRecommender(BaseRecommender):
 
         # Do random walk.  V maps item ids to number of times the item was
         # seen in a random walk.
-        V = random_walk_func(entity_id)
+        exclusions = self._get_exclusion_map(excluded_edges)
+        graph = self._G
+        def sample_neighbor(node):
+            return graph.get_random_neighbor_id(
+                node, use_weights=True, excluding=exclusions.get(node)
+            )
+        V = random_walk_func(entity_id, sample_neighbor)
+        return self._top_items(
+            V, self._get_entity_items(entity_id, exclusions), number_of_items
+        )
+
+    def _recommend_hypotheses(self, entity_id, number_of_items, hypotheses,
+            random_walk_func):
+        # Every hypothesis walks the weight tables of the graph, overlaid
+        # with the tables of the few nodes whose edges it changes.
+        self._check_hypotheses(entity_id, hypotheses)
+        tables = self._get_weight_tables()
+        results = []
+        for added_edges, removed_items in hypotheses:
+            overlay = tables.overlay(entity_id, added_edges, removed_items)
+            V = random_walk_func(entity_id, tables.sampler(overlay))
+            entity_neighbor_ids, _, _ = overlay.get(entity_id) or tables.get(entity_id)
+            results.append(self._top_items(
+                V, set(entity_neighbor_ids), number_of_items
+            ))
+        return results
+
+    def _top_items(self, V, entity_neighbor_ids, number_of_items):
+        """Returns the `number_of_items` items most visited by the walks, per
+        the map of item -> visit count `V`, that the entity does not rate.
+        """
         if self._verbose:
             print("Random walk counts:")
             print(V)
             print("")
-        entity_neighbor_ids = list(self._G.base().GetNI(entity_id).GetOutEdges())
 
         # Represent V as a list of pairs (k, v) reverse sorted by v.
         V_ = sorted(V.items(), key=lambda x: x[1], reverse=True)
@@ -315,9 +726,16 @@ class BasicRandomWalkRecommender(BaseRecommender):
                 break
         return recommendations
 
-    def recommend(self, entity_id, number_of_items):
+    def recommend(self, entity_id, number_of_items, excluded_edges=None):
         return self._recommend(
-            entity_id, number_of_items, random_walk_func=self._do_basic_random_walk
+            entity_id, number_of_items, random_walk_func=self._do_basic_random_walk,
+            excluded_edges=excluded_edges
+        )
+
+    def recommend_hypotheses(self, entity_id, number_of_items, hypotheses):
+        return self._recommend_hypotheses(
+            entity_id, number_of_items, hypotheses,
+            random_walk_func=self._do_basic_random_walk
         )
 
 
@@ -347,7 +765,12 @@ class PixieRandomWalkRecommender(BasicRandomWalkRecommender):
         self._n_v = n_v
         super(PixieRandomWalkRecommender, self).__init__(*args, **kwargs)
 
-    def _do_pixie_random_walk(self, start_entity):
+    def _do_pixie_random_walk(self, start_entity, sample_neighbor):
+        """Returns a map of item -> visit count for walks from `start_entity`.
+
+        :param sample_neighbor: a function returning the weighted random
+            neighbor of a node to step to.
+        """
         V = {} # Maps items to the number of times we've seen them in random walks.
         tot_steps = 0
 
@@ -357,23 +780,23 @@ class PixieRandomWalkRecommender(BasicRandomWalkRecommender):
         num_high_visited = 0
         while tot_steps < self._max_steps_in_walk \
             and num_high_visited <= self._n_p:
-            curr_entity = self._G.base().GetNI(start_entity)
+            curr_entity = start_entity
             curr_steps = self._sample_walk_length()
             walk = [str(start_entity)]
 
             # Let's not go beyond tot_steps.
             curr_steps = min(curr_steps, self._max_steps_in_walk - tot_steps)
 
-            # curr_entity contains SNAP node of the last traversed entity.
-            # curr_item contains the SNAP node of the last traversed item.
+            # curr_entity contains the ID of the last traversed entity.
+            # curr_item contains the ID of the last traversed item.
             for step in range(curr_steps):
                 if step != 0:
-                    curr_entity = self._G.get_random_neighbor(curr_item, use_weights=True)
-                    walk.append(str(curr_entity.GetId()))
+                    curr_entity = sample_neighbor(curr_item)
+                    walk.append(str(curr_entity))
 
-                curr_item = self._G.get_random_neighbor(curr_entity, use_weights=True)
-                walk.append(str(curr_item.GetId()))
-                curr_item_id = curr_item.GetId()
+                curr_item = sample_neighbor(curr_entity)
+                walk.append(str(curr_item))
+                curr_item_id = curr_item
 
                 if curr_item_id not in V:
                     V[curr_item_id] = 0
@@ -388,7 +811,14 @@ class PixieRandomWalkRecommender(BasicRandomWalkRecommender):
             tot_steps += curr_steps
         return V
 
-    def recommend(self, entity_id, number_of_items):
+    def recommend(self, entity_id, number_of_items, excluded_edges=None):
         return super(PixieRandomWalkRecommender, self)._recommend(
-            entity_id, number_of_items, random_walk_func=self._do_pixie_random_walk
+            entity_id, number_of_items, random_walk_func=self._do_pixie_random_walk,
+            excluded_edges=excluded_edges
+        )
+
+    def recommend_hypotheses(self, entity_id, number_of_items, hypotheses):
+        return self._recommend_hypotheses(
+            entity_id, number_of_items, hypotheses,
+            random_walk_func=self._do_pixie_random_walk
         )
@@ -0,0 +1,374 @@
+import random
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+
+import numpy as np
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+from gbra.attackers.attacker import BlackBoxDeepRWRAttacker, \
+    BlackBoxRWRAttacker, HighDegreeAttacker, HillClimbingAttacker, \
+    NeighborAttacker, ReplayAttacker
+from gbra.attackers.profiles import AttackProfile, ProfileGenerator, sample_rows
+from gbra.data.network_loader import ErdosRenyiLoader
+from gbra.experiments.scheduler import ExperimentGrid, Scheduler
+from gbra.recommender.recommenders import BaseRecommender, \
+    PixieRandomWalkRecommender, PopularItemRecommender, RandomRecommender
+
+def baseline_hill_climbing(network, target_item):
+    """The items HillClimbingAttacker picked before its greedy was made lazy,
+    verbatim."""
+    seen = set()
+    chosen = []
+    neighbors = {}
+    for item_id in network.get_items():
+        neighbors[item_id] = set(network.get_neighbors(item_id) + [item_id])
+    del neighbors[target_item]
+    while True: # exits when all nodes are seen
+        intersects = Counter({item_id : len(neighbors[item_id] - seen) for item_id in neighbors})
+        if len(intersects) == 0:
+            break
+        [(next_item, count)] = intersects.most_common(1)
+        if (count == 0):
+            break
+        chosen.append(next_item)
+        seen |= set(neighbors[next_item])
+
+        del neighbors[next_item]
+    return chosen
+
+class TestBulkInjection(unittest.TestCase):
+
+    def test_add_edges(self):
+        graph = ErdosRenyiLoader(
+            num_entities=20, num_items=30, num_edges=100, seed=2
+        ).load()
+        recommender = PopularItemRecommender(graph, num_popular_items=3)
+        fake_entities = recommender._attacker_add_entities(4)
+        self.assertEqual(list(fake_entities), [41, 43, 45, 47])
+        self.assertEqual(graph.num_entities, 24)
+
+        edges = graph.num_edges()
+        for entities, items in (([41, 1], [2, 2]),    # not the attacker's
+                                ([41, 41], [2, 2]),   # repeated
+                                ([41, 42], [2, 4]),   # not an entity
+                                ([41, 43], [2, 62])):  # unknown item
+            with self.assertRaises(ValueError):
+                recommender._attacker_add_edges(entities, items, 5)
+            self.assertEqual(graph.num_edges(), edges)
+
+        # Rating the least popular item highly makes it the most popular.
+        popularity = graph.get_weighted_item_to_degree()
+        item = min(graph.get_items(), key=lambda i: (popularity[i], i))
+        recommender._attacker_add_edges(fake_entities, [item] * 4, 100)
+        self.assertEqual(graph.num_edges(), edges + 4)
+        self.assertEqual(graph.get_edge_weight(45, item), 100)
+        recommender.recommend(1, 3)
+        self.assertIn(item, recommender._popular_items)
+
+class TestProfiles(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = ErdosRenyiLoader(
+            num_entities=60, num_items=80, num_edges=300, seed=3
+        ).load()
+        self.generator = ProfileGenerator(self.graph)
+
+    def test_sample_rows(self):
+        for k in (5, 60, 100):
+            rows = sample_rows(np.arange(10, 90), 50, k)
+            self.assertEqual(rows.shape, (50, min(k, 80)))
+            for row in rows:
+                self.assertEqual(len(set(row)), len(row))
+                self.assertTrue(((row >= 10) & (row < 90)).all())
+
+    def check_profile(self, profile, num_fake_entities, num_ratings):
+        self.assertEqual(len(profile), num_fake_entities * num_ratings)
+        for entity in range(num_fake_entities):
+            items = profile.items[profile.entities == entity]
+            ratings = profile.ratings[profile.entities == entity]
+            self.assertEqual(len(set(items)), num_ratings)
+            self.assertEqual(ratings[items == 2], [self.graph.rating_range[1]])
+
+    def test_strategies(self):
+        generator = self.generator
+        self.check_profile(generator.random_profile(2, 7, 4), 7, 5)
+        self.check_profile(generator.average_profile(2, 7, 4), 7, 5)
+
+        profile = generator.bandwagon_profile(2, 7, 4, 3)
+        self.check_profile(profile, 7, 8)
+        popular = generator.get_popular_items(3, excluding=2)
+        degrees = sorted(
+            (self.graph.get_degree(i) for i in self.graph.get_items() if i != 2),
+            reverse=True
+        )
+        self.assertEqual([self.graph.get_degree(i) for i in popular], degrees[:3])
+        self.assertEqual(np.in1d(profile.items, popular).sum(), 7 * 3)
+
+        profile = generator.segment_profile(2, 7, 4, [4, 6])
+        self.check_profile(profile, 7, 7)
+        filler = ~np.in1d(profile.items, [2, 4, 6])
+        self.assertTrue((profile.ratings[filler] == self.graph.rating_range[0]).all())
+
+    def test_neighbor_attack(self):
+        two_hops = set(
+            item for entity in self.graph.get_neighbors(2)
+            for item in self.graph.get_neighbors(entity)
+        ) - set([2])
+        profile = self.generator.neighbor_profile(2, 7, 4)
+        self.check_profile(profile, 7, 5)
+        self.assertTrue(set(profile.items) <= two_hops | set([2]))
+
+        edges = self.graph.num_edges()
+        NeighborAttacker(RandomRecommender(self.graph), 2, 7, 5).attack()
+        self.assertEqual(self.graph.num_edges(), edges + 7 * 5)
+
+class TestStagedAttack(unittest.TestCase):
+
+    def attacker(self, graph, num_fake_entities):
+        return BlackBoxRWRAttacker(
+            _num_items_to_scout=4, _num_recs=3,
+            _recommender=RandomRecommender(graph), _target_item=2,
+            _num_fake_entities=num_fake_entities, _num_fake_ratings=1
+        )
+
+    def test_stages(self):
+        graphs = [
+            ErdosRenyiLoader(num_entities=60, num_items=80, num_edges=300, seed=3).load()
+            for _ in range(2)
+        ]
+        np.random.seed(0)
+        attacker = self.attacker(graphs[0], 5)
+        stages = []
+        for num_fake_entities in attacker.attack_in_stages([1, 3, 5]):
+            stages.append((num_fake_entities, graphs[0].num_edges()))
+        self.assertEqual(stages, [(1, 302), (3, 306), (5, 310)])
+
+        np.random.seed(0)
+        self.attacker(graphs[1], 5).attack()
+        self.assertEqual(graphs[0]._weights, graphs[1]._weights)
+
+        with self.assertRaises(ValueError):
+            list(attacker.attack_in_stages([3, 1]))
+
+    def test_stages_are_smaller_attacks(self):
+        graph = ErdosRenyiLoader(
+            num_entities=60, num_items=80, num_edges=300, seed=3
+        ).load()
+        np.random.seed(0)
+        profile = self.attacker(graph.copy(), 5).build_profile()
+        for num_fake_entities in (1, 3):
+            np.random.seed(0)
+            smaller = self.attacker(graph.copy(), num_fake_entities).build_profile()
+            stage = profile.select(0, num_fake_entities)
+            self.assertEqual(stage.num_fake_entities, smaller.num_fake_entities)
+            for name in ('entities', 'items', 'ratings'):
+                self.assertEqual(
+                    list(getattr(stage, name)), list(getattr(smaller, name))
+                )
+
+        # Round robin attacks deal items to all their fake entities at once,
+        # so their first fake entities are not a smaller attack.
+        attacker = HighDegreeAttacker(RandomRecommender(graph), 2, 5, 3)
+        with self.assertRaises(ValueError):
+            list(attacker.attack_in_stages([1, 5]))
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_save_and_replay(self):
+        graphs = [
+            ErdosRenyiLoader(num_entities=60, num_items=80, num_edges=300, seed=3).load()
+            for _ in range(2)
+        ]
+        filename = os.path.join(self.directory, 'profile.npz')
+        profile = NeighborAttacker(RandomRecommender(graphs[0]), 2, 7, 5).save_profile(
+            filename, seed=11
+        )
+        loaded = AttackProfile.load(filename)
+        self.assertEqual(loaded.metadata, {
+            'attacker': 'NeighborAttacker', 'target_item': 2, 'seed': 11,
+            'num_fake_entities': 7, 'num_fake_ratings': 5,
+        })
+        self.assertEqual(loaded.num_fake_entities, 7)
+        for name in ('entities', 'items', 'ratings'):
+            np.testing.assert_array_equal(getattr(loaded, name), getattr(profile, name))
+
+        # Replaying adds the same ratings to both graphs.
+        profile.apply(graphs[0])
+        ReplayAttacker(RandomRecommender(graphs[1]), filename).attack()
+        self.assertEqual(graphs[0]._weights, graphs[1]._weights)
+
+class TestHillClimbingAttacker(unittest.TestCase):
+
+    def test_same_order_as_plain_greedy(self):
+        graph = ErdosRenyiLoader(
+            num_entities=60, num_items=80, num_edges=300, seed=3
+        ).load()
+        attacker = HillClimbingAttacker(RandomRecommender(graph), 2, 4, 100)
+        self.assertEqual(attacker.choose_items(), baseline_hill_climbing(graph, 2))
+
+        # Item ids past the size of the Counter's hash table wrap around in
+        # its iteration order, which ties follow.
+        for seed in range(3):
+            graph = ErdosRenyiLoader(
+                num_entities=200, num_items=300, num_edges=1500, seed=seed
+            ).load()
+            attacker = HillClimbingAttacker(
+                RandomRecommender(graph), 2, 1, 1, _max_chosen_items=300
+            )
+            self.assertEqual(attacker.choose_items(), baseline_hill_climbing(graph, 2))
+        graph = ErdosRenyiLoader(
+            num_entities=60, num_items=80, num_edges=300, seed=3
+        ).load()
+
+        # Only as many items are picked as there are fake ratings.
+        attacker = HillClimbingAttacker(RandomRecommender(graph), 2, 3, 5)
+        self.assertEqual(attacker.choose_items(), baseline_hill_climbing(graph, 2)[:15])
+
+        attacker = HillClimbingAttacker(
+            RandomRecommender(graph), 2, 3, 2, _max_chosen_items=4
+        )
+        chosen = baseline_hill_climbing(graph, 2)
+        attacker.attack()
+        fake_entities = sorted(graph.get_entities())[-3:]
+        self.assertEqual(
+            sorted(graph.get_neighbors(fake_entities[0])),
+            sorted([chosen[0], chosen[3], 2])
+        )
+
+def load_scouting_graph(name):
+    return ErdosRenyiLoader(
+        num_entities=50, num_items=40, num_edges=400, seed=5
+    ).load()
+
+def make_scouting_recommender(graph):
+    return PixieRandomWalkRecommender(n_p=5, n_v=2, G=graph, max_steps_in_walk=50)
+
+def scout_job(graph, config):
+    np.random.seed(0)
+    return sorted(BlackBoxRWRAttacker(
+        _num_items_to_scout=6, _num_recs=3,
+        _recommender=make_scouting_recommender(graph.copy()), _target_item=2,
+        _num_fake_entities=2, _num_fake_ratings=1,
+        _num_workers=config['num_workers']
+    ).run_scout().items())
+
+class TestBlackBoxRWRAttacker(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = load_scouting_graph('scouting')
+        self.recommender = make_scouting_recommender(self.graph)
+
+    def attacker(self, num_workers):
+        return BlackBoxRWRAttacker(
+            _num_items_to_scout=6, _num_recs=3, _recommender=self.recommender,
+            _target_item=2, _num_fake_entities=2, _num_fake_ratings=1,
+            _num_workers=num_workers
+        )
+
+    def scout(self, num_workers):
+        np.random.seed(0)
+        return self.attacker(num_workers).run_scout()
+
+    def test_parallel_scout(self):
+        edges = self.graph.num_edges()
+        scores = self.scout(1)
+        self.assertEqual(len(scores), 6)
+        self.assertEqual(self.scout(2), scores)
+        self.assertEqual(self.graph.num_edges(), edges)
+
+        # Each probe is seeded in turn, then scored on the unchanged graph.
+        np.random.seed(0)
+        seed = np.random.randint(2 ** 31)
+        scout_id = max(self.graph.get_entities())
+        top_items = [item for item, _ in self.attacker(1).get_top_items()]
+        for i, item in enumerate(top_items):
+            random.seed(seed + i)
+            np.random.seed(seed + i)
+            self.graph.add_edge(scout_id, item, self.graph.max_rating)
+            recs = self.recommender.recommend(scout_id, 3)
+            self.graph.del_edge(scout_id, item)
+            self.assertEqual(
+                scores[item],
+                sum(self.graph.get_weighted_degree(rec) for rec in recs)
+            )
+
+    def test_scout_in_scheduler(self):
+        # Scheduler workers are daemonic and may not fork, so their attacks
+        # scout in-process whatever their number of workers.
+        scores = sorted(self.scout(1).items())
+        jobs = list(Scheduler(scout_job, load_scouting_graph, num_workers=1).run(
+            ExperimentGrid([('graph', ['scouting']), ('num_workers', [None, 2])])
+        ))
+        self.assertEqual(len(jobs), 2)
+        for job in jobs:
+            self.assertIsNone(job.error)
+            self.assertEqual(job.result, scores)
+
+class TreeRecommender(BaseRecommender):
+    """Recommends the two items after the last item an entity rated, and
+    counts its calls.
+    """
+
+    def __init__(self, G):
+        super(TreeRecommender, self).__init__(G)
+        self.num_calls = 0
+
+    def recommend(self, entity_id, number_of_items, excluded_edges=None):
+        self.num_calls += 1
+        item = max(self._G.get_neighbors(entity_id))
+        num_items = self._G.num_items
+        return [2 * ((item // 2 + k) % num_items + 1) for k in (0, 1)]
+
+class TestBlackBoxDeepRWRAttacker(unittest.TestCase):
+
+    def scout(self, depth, distinct_items=False):
+        graph = ErdosRenyiLoader(
+            num_entities=30, num_items=20, num_edges=100, seed=7
+        ).load()
+        recommender = TreeRecommender(graph)
+        attacker = BlackBoxDeepRWRAttacker(
+            depth, _num_items_to_scout=5, _num_recs=2, _recommender=recommender,
+            _target_item=2, _num_fake_entities=1, _num_fake_ratings=1,
+            _num_workers=1, _distinct_items=distinct_items
+        )
+        scores = attacker.run_scout()
+
+        def children(item):
+            return [2 * ((item // 2 + k) % graph.num_items + 1) for k in (0, 1)]
+        def tree(item, depth):
+            """The items at every level of the tree under `item`."""
+            if depth == 0:
+                return []
+            return children(item) + sum((tree(c, depth - 1) for c in children(item)), [])
+        def leaves(item, depth):
+            if depth == 1:
+                return children(item)
+            return sum((leaves(c, depth - 1) for c in children(item)), [])
+
+        degrees = graph.get_weighted_item_to_degree()
+        for item, score in scores.items():
+            items = set(tree(item, depth)) if distinct_items else leaves(item, depth)
+            self.assertEqual(score, sum(degrees[i] for i in items))
+        return scores, recommender.num_calls
+
+    def test_memoized_tree(self):
+        scores, num_calls = self.scout(3)
+        self.assertEqual(len(scores), 5)
+        # Every distinct item is probed at most once, rather than once per
+        # node of the 5 trees of 1 + 2 + 4 nodes.
+        self.assertLessEqual(num_calls, 20)
+
+        self.scout(3, distinct_items=True)
+
+if __name__ == '__main__':
+    unittest.main()
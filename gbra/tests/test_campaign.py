@@ -0,0 +1,140 @@
+import shutil
+import tempfile
+import unittest
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+from gbra.data.network_loader import ErdosRenyiLoader
+from gbra.attackers.attacker import HighDegreeAttacker
+from gbra.experiments.campaign import _group_stages, evaluate_profile, \
+    run_campaign
+from gbra.experiments.results import ResultsReader, ResultsWriter
+from gbra.experiments.scheduler import ExperimentGrid
+from gbra.recommender.recommenders import PopularItemRecommender, \
+    RandomRecommender
+
+def make_recommender(graph):
+    return PopularItemRecommender(graph, num_popular_items=3)
+
+class TestCampaign(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.graph = ErdosRenyiLoader(
+            num_entities=40, num_items=30, num_edges=150, seed=8
+        ).load()
+        self.grid = ExperimentGrid([
+            ('attacker', ['RandomAttacker', 'HighDegreeAttacker', 'NoSuchAttacker']),
+            ('target_item', [2, 4]),
+            ('fake_entity_fraction', [0.1, 0.5]),
+            ('fake_ratings', [2]),
+        ])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_campaign(self, num_workers, writer=None):
+        results = list(run_campaign(
+            self.graph, self.grid, make_recommender, writer, num_recs=3,
+            num_workers=num_workers, seed=1
+        ))
+        return dict((tuple(sorted(r.config.items())), r) for r in results)
+
+    def test_campaign(self):
+        edges = self.graph.num_edges()
+        with ResultsWriter(self.directory) as writer:
+            results = self.run_campaign(1, writer)
+        self.assertEqual(self.graph.num_edges(), edges)
+        self.assertEqual(len(results), 12)
+
+        for result in results.values():
+            if result.config['attacker'] == 'NoSuchAttacker':
+                self.assertIn('KeyError', result.error)
+                continue
+            self.assertIsNone(result.error)
+            if result.config['fake_entity_fraction'] == 0.5:
+                # 20 fake entities rating the target highest make it popular.
+                self.assertGreater(result.hit_ratio_after, 0.5)
+                self.assertLess(result.hit_ratio_before, 0.5)
+
+        # Forked workers get the same results.
+        parallel_results = self.run_campaign(2)
+        for key, result in results.items():
+            self.assertEqual(parallel_results[key][:3], result[:3])
+
+        # Staged, the attacks grow from 10% to 50% fake entities.
+        staged_results = list(run_campaign(
+            self.graph, self.grid, make_recommender, num_recs=3, num_workers=1,
+            seed=1, staged=True
+        ))
+        self.assertEqual(
+            sorted(tuple(sorted(r.config.items())) for r in staged_results),
+            sorted(results)
+        )
+        # Round robin attacks do not grow in stages, so their cells run one
+        # by one.
+        groups = dict(
+            ((configs[0]['attacker'], configs[0]['target_item']), len(configs))
+            for _, configs in _group_stages(list(self.grid))
+        )
+        self.assertEqual(groups[('RandomAttacker', 2)], 2)
+        self.assertEqual(groups[('HighDegreeAttacker', 2)], 1)
+        for result in staged_results:
+            self.assertEqual(result.error is None, result.config['attacker'] != 'NoSuchAttacker')
+            self.assertEqual(result.hit_ratio_before, results[tuple(sorted(result.config.items()))].hit_ratio_before)
+        self.assertEqual(self.graph.num_edges(), edges)
+
+        stats = ResultsReader(self.directory).group_stats(by=['attacker', 'phase'])
+        self.assertEqual(sorted(stats), [
+            ('HighDegreeAttacker', 'after'), ('HighDegreeAttacker', 'before'),
+            ('RandomAttacker', 'after'), ('RandomAttacker', 'before'),
+        ])
+        self.assertEqual(stats[('RandomAttacker', 'before')].count, 4)
+
+    def test_black_box_attackers(self):
+        # Black-box attackers scout with imap_shared themselves, inside the
+        # campaign's own workers or tasks.
+        grid = ExperimentGrid([
+            ('attacker', ['BlackBoxRWRAttacker', 'BlackBoxDeepRWRAttacker']),
+            ('target_item', [2, 4]),
+            ('fake_entity_fraction', [0.1]),
+            ('fake_ratings', [1]),
+        ])
+        scouting = {'_num_items_to_scout': 3, '_num_recs': 3, '_num_workers': 2}
+        attacker_kwargs = {
+            'BlackBoxRWRAttacker': scouting,
+            'BlackBoxDeepRWRAttacker': dict(scouting, _rec_tree_depth=2),
+        }
+        results = []
+        for num_workers in (1, 2):
+            results.append(sorted(
+                (sorted(r.config.items()), r.hit_ratio_after, r.error)
+                for r in run_campaign(
+                    self.graph, grid, make_recommender, num_recs=3,
+                    num_workers=num_workers, seed=1,
+                    attacker_kwargs=attacker_kwargs
+                )
+            ))
+        self.assertEqual(len(results[0]), 4)
+        self.assertEqual([error for _, _, error in results[0]], [None] * 4)
+        self.assertEqual(results[1], results[0])
+
+    def test_evaluate_profile(self):
+        profile = HighDegreeAttacker(
+            RandomRecommender(self.graph.copy()), 2, 20, 2
+        ).build_profile()
+        profile.metadata['target_item'] = 2
+        edges = self.graph.num_edges()
+        results = list(evaluate_profile(self.graph, profile, {
+            'popular': make_recommender, 'random': RandomRecommender,
+        }, num_recs=[1, 3], num_workers=1))
+        self.assertEqual(self.graph.num_edges(), edges)
+        self.assertEqual(sorted(name for name, _, _ in results), ['popular', 'random'])
+        for name, before, after in results:
+            self.assertEqual(sorted(before), [1, 3])
+            if name == 'popular':
+                self.assertGreater(after[3], before[3])
+
+if __name__ == '__main__':
+    unittest.main()
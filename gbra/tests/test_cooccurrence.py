@@ -0,0 +1,44 @@
+import unittest
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+from gbra.feature_extraction.cooccurrence import CooccurrenceEngine
+from gbra.data.network_loader import ErdosRenyiLoader
+
+class TestCooccurrenceEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = ErdosRenyiLoader(
+            num_entities=50, num_items=40, num_edges=250, seed=6
+        ).load()
+
+    def check(self, engine, items):
+        graph = self.graph
+        counts, weight_sums = engine.co_ratings(items)
+        two_hop_items = engine.two_hop_items(items)
+        for row, item in enumerate(items):
+            raters = set(graph.get_neighbors(item))
+            for other in graph.get_items():
+                co_raters = raters & set(graph.get_neighbors(other))
+                self.assertEqual(counts[row, other // 2 - 1], len(co_raters))
+                self.assertAlmostEqual(
+                    weight_sums[row, other // 2 - 1],
+                    sum(graph.get_edge_weight(e, other) for e in co_raters)
+                )
+            self.assertEqual(list(two_hop_items[row]), sorted(
+                set(i for e in raters for i in graph.get_neighbors(e)) - set([item])
+            ))
+
+    def test_co_ratings(self):
+        for cache_item_matrix in (False, True):
+            engine = CooccurrenceEngine(self.graph, cache_item_matrix)
+            self.check(engine, [2, 10, 2, 40])
+
+            # Queries see changes to the graph.
+            entity = self.graph.add_entity()
+            self.graph.add_edges([entity] * 3, [2, 4, 6], [5, 1, 3])
+            self.check(engine, [2, 6])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import random
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+from gbra.data.edge_list_import import import_edge_list
+from gbra.recommender.recommenders import PixieRandomWalkRecommender
+from gbra.util.ei_graph import EIGraph
+from gbra.util.mmap_ei_graph import MmapEIGraph
+
+class TestEdgeListImport(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        # Sparse ids, and enough repeated ratings to span several buckets.
+        self.ratings = zip(
+            rng.choice(np.arange(1000, 1300, 7), 400).tolist(),
+            rng.choice(np.arange(5, 200, 3), 400).tolist(),
+            (rng.randint(1, 11, 400) / 2.0).tolist()
+        )
+        self.filename = os.path.join(self.directory, 'ratings.csv')
+        with open(self.filename, 'w') as fout:
+            fout.write('userId,movieId,rating\n')
+            for rating in self.ratings:
+                fout.write('%d,%d,%s\n' % rating)
+
+        self.user_ids = sorted(set(user for user, _, _ in self.ratings))
+        self.item_ids = sorted(set(item for _, item, _ in self.ratings))
+        # The last rating of every edge, keyed by node ids.
+        self.edges = dict(
+            ((2 * self.user_ids.index(user) + 1, 2 * (self.item_ids.index(item) + 1)), rating)
+            for user, item, rating in self.ratings
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def import_graph(self):
+        return import_edge_list(
+            self.filename, os.path.join(self.directory, 'graph'),
+            max_bucket_edges=20, chunk_bytes=100
+        )
+
+    def test_import(self):
+        graph = self.import_graph()
+        self.assertEqual(graph.num_edges(), len(self.edges))
+        self.assertEqual(graph.num_entities, len(self.user_ids))
+        self.assertEqual(graph.num_items, len(self.item_ids))
+        user_ids, item_ids = graph.load_original_ids()
+        self.assertEqual(list(user_ids), self.user_ids)
+        self.assertEqual(list(item_ids), self.item_ids)
+        self.assertIsNone(graph.load_edge_timestamps())
+
+        for (entity, item), rating in self.edges.items():
+            self.assertTrue(graph.is_edge(item, entity))
+            self.assertEqual(graph.get_edge_weight(entity, item), rating)
+        self.assertEqual(
+            sum(graph.is_edge(e, i) for e in graph.entities for i in graph.items),
+            len(self.edges)
+        )
+
+        for node in list(graph.get_entities()) + list(graph.get_items()):
+            self.assertEqual(graph.get_neighbors(node), sorted(
+                item if node == entity else entity
+                for entity, item in self.edges if node in (entity, item)
+            ))
+
+        histogram = {}
+        for rating in self.edges.values():
+            histogram[rating] = histogram.get(rating, 0) + 1
+        self.assertEqual(graph.get_rating_histogram(), histogram)
+
+        # The graph can be reopened from disk.
+        self.assertEqual(MmapEIGraph(graph.name).num_edges(), len(self.edges))
+
+    def test_timestamps(self):
+        with open(self.filename, 'w') as fout:
+            fout.write('3::7::4::100\n10::7::1::101\n3::7::2::102\n3::2::5::103\n')
+        graph = self.import_graph()
+        self.assertEqual(graph.get_edge_weight(1, 4), 2)
+        self.assertEqual(
+            list(graph.load_edge_timestamps()), [103, 102, 101]
+        )
+
+    def test_recommend(self):
+        graph = self.import_graph()
+        ei_graph = EIGraph(num_entities=graph.num_entities, num_items=graph.num_items)
+        for (entity, item), rating in self.edges.items():
+            ei_graph.add_edge(entity, item, rating)
+        self.assertEqual(
+            graph.get_weighted_item_to_degree(),
+            dict(ei_graph.get_weighted_item_to_degree())
+        )
+
+        # Walks on either graph draw the same random numbers.
+        recommendations = []
+        for G in (ei_graph, graph):
+            random.seed(1)
+            np.random.seed(1)
+            recommender = PixieRandomWalkRecommender(
+                n_p=5, n_v=2, G=G, max_steps_in_walk=100
+            )
+            recommendations.append([
+                recommender.recommend(entity, 5, excluded_edges=[(entity, item)])
+                for entity, item in sorted(self.edges)[:20]
+            ])
+        self.assertEqual(recommendations[0], recommendations[1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@
 import tempfile
 import unittest
 
+import numpy as np
+
 import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
@@ -47,5 +49,63 @@ class TestEIGraph(unittest.TestCase):
         self.assertTrue(graph.base().GetNodes(), 4)
         self.assertEqual(2, graph.get_edge_weight(3, 2))
 
+    def test_copy(self):
+        graph = EIGraph(2, 2)
+        graph.add_edge(1, 2, 3)
+
+        copy = graph.copy()
+        copy.add_edge(copy.add_entity(), 4, 5)
+        copy.del_edge(1, 2)
+
+        self.assertEqual(graph.num_entities, 2)
+        self.assertEqual(graph.num_edges(), 1)
+        self.assertEqual(3, graph.get_edge_weight(1, 2))
+        self.assertEqual(copy.num_entities, 3)
+        self.assertEqual(copy.num_edges(), 1)
+        self.assertEqual(5, copy.get_edge_weight(5, 4))
+
+    def test_add_edges(self):
+        graph = EIGraph(3, 3)
+        graph.add_edge(3, 4, 2)
+        graph.add_edges([5, 1, 1], [2, 6, 2], [4, 1, 3])
+
+        self.assertEqual(graph.num_edges(), 4)
+        self.assertEqual(3, graph.get_edge_weight(2, 1))
+        self.assertEqual(4, graph.get_edge_weight(5, 2))
+        self.assertEqual(graph.get_neighbors(1), [2, 6])
+        self.assertEqual(graph.get_neighbors(2), [1, 5])
+
+        graph.add_edges([3], [2])
+        self.assertEqual(1, graph.get_edge_weight(3, 2))
+
+        # Invalid batches are rejected as a whole.
+        for entities, items in [([1, 3], [4, 4]), ([1], [7]), ([3, 3], [6, 6]), ([2], [4])]:
+            self.assertRaises(ValueError, graph.add_edges, entities, items)
+        self.assertEqual(graph.num_edges(), 5)
+
+    def test_edge_index(self):
+        graph = EIGraph(4, 3)
+        graph.add_edges([1, 3, 5], [2, 2, 4], [1, 4, 2])
+        graph.get_item_rating_moments()  # builds the index
+        graph.add_edge(7, 2, 3)
+        graph.add_edges([1, 7], [4, 6], [5, 2])
+        graph.del_edge(3, 2)
+        graph.del_edge(5, 4)
+        graph.add_edge(3, 2, 5)
+
+        counts, means, variances = graph.get_item_rating_moments()
+        self.assertEqual(list(counts), [3, 1, 1])
+        np.testing.assert_allclose(means, [3, 5, 2])
+        np.testing.assert_allclose(variances, [np.var([1, 5, 3]), 0, 0])
+
+        # Samples are uniform over the current edges.
+        entities, items, weights = graph.sample_edges(6000, np.random.RandomState(0))
+        edges = zip(entities.tolist(), items.tolist())
+        self.assertEqual(set(edges), set(graph._weights))
+        for edge, weight in zip(edges, weights):
+            self.assertEqual(weight, graph._weights[edge])
+        for edge in set(edges):
+            self.assertAlmostEqual(edges.count(edge) / 6000.0, 0.2, delta=0.03)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+from gbra.data.network_loader import TinyTestLoader
+from gbra.recommender.evaluator import RecEvaluator, EvaluationSummary
+from gbra.recommender.recommenders import PixieRandomWalkRecommender, \
+    RandomRecommender
+
+class TestRecEvaluator(unittest.TestCase):
+
+    def test_excluded_edges_are_recommendable(self):
+        graph = TinyTestLoader().load()
+        recommender = RandomRecommender(graph)
+
+        # Entity 1 rates every item but 8 and 10, so masking its edge to 2
+        # makes 2 a candidate again.
+        recs = recommender.recommend(1, 3, excluded_edges=[(1, 2)])
+        self.assertEqual(sorted(recs), [2, 8, 10])
+        self.assertTrue(graph.is_edge(1, 2))
+
+    def test_walks_respect_excluded_edges(self):
+        graph = TinyTestLoader().load()
+        recommender = PixieRandomWalkRecommender(
+            n_p=10, n_v=4, G=graph, max_steps_in_walk=50, alpha=0.5, beta=2
+        )
+
+        # Entity 3 only rates item 8; masking it leaves nothing to walk to.
+        with self.assertRaises(ValueError):
+            recommender.recommend(3, 2, excluded_edges=[(3, 8)])
+
+        # Item 10 is only reachable from entity 11 through its own edge.
+        for _ in range(20):
+            recs = recommender.recommend(11, 5, excluded_edges=[(7, 10), (9, 10)])
+            self.assertEqual(recs, [])
+
+    def test_evaluation_does_not_mutate_graph(self):
+        graph = TinyTestLoader().load()
+        graph.add_edge(3, 2, weight=4)
+        recommender = PixieRandomWalkRecommender(
+            n_p=10, n_v=4, G=graph, max_steps_in_walk=50, alpha=0.5, beta=2
+        )
+        weights_before = dict(graph._weights)
+
+        evaluator = RecEvaluator(recommender, num_recs=2)
+        score = evaluator.evaluate_all()
+
+        self.assertTrue(0 <= score <= 1)
+        self.assertEqual(graph.num_edges(), len(weights_before))
+        self.assertEqual(graph._weights, weights_before)
+
+    def test_parallel_evaluation_matches_serial(self):
+        graph = TinyTestLoader().load()
+        recommender = PixieRandomWalkRecommender(
+            n_p=10, n_v=4, G=graph, max_steps_in_walk=50, alpha=0.5, beta=2
+        )
+        evaluator = RecEvaluator(recommender, num_recs=2)
+        entities = graph.get_entities()
+
+        serial = dict(
+            (e.entity_id, e) for e in
+            evaluator.evaluate_parallel(entities, num_workers=1, seed=7)
+        )
+        summary = EvaluationSummary()
+        for evaluation in evaluator.evaluate_parallel(entities, num_workers=2, seed=7):
+            summary.add(evaluation)
+            self.assertEqual(evaluation.score, serial[evaluation.entity_id].score)
+            self.assertEqual(evaluation.degree, len(graph.get_neighbors(evaluation.entity_id)))
+
+        # Only entities 1, 5, 7 and 9 have more than one edge.
+        self.assertEqual(summary.num_evaluated, 4)
+        self.assertEqual(summary.num_skipped, 2)
+
+    def test_multiple_cutoffs(self):
+        graph = TinyTestLoader().load()
+        recommender = PixieRandomWalkRecommender(
+            n_p=10, n_v=4, G=graph, max_steps_in_walk=50, alpha=0.5, beta=2
+        )
+        evaluator = RecEvaluator(recommender, num_recs=[1, 5])
+        score = evaluator.evaluate_all()
+        self.assertEqual(sorted(score.keys()), [1, 5])
+        self.assertTrue(score[1] <= score[5])
+
+        # Every item ranks within the top 5 for every entity.
+        hit_ratios = recommender.calculate_hit_ratio(8, [1, 5])
+        self.assertTrue(hit_ratios[1] <= hit_ratios[5])
+        self.assertEqual(hit_ratios[5], 3 / 6.0)
+        self.assertEqual(recommender.calculate_hit_ratio(8, 5), 3 / 6.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+from gbra.feature_extraction.feature_store import FEATURE_NAMES, \
+    FeatureStore, GraphFeatures
+from gbra.data.network_loader import ErdosRenyiLoader
+
+class TestFeatureStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.graph = ErdosRenyiLoader(
+            num_entities=40, num_items=30, num_edges=200, seed=4
+        ).load()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertSameFeatures(self, features, expected):
+        self.assertEqual(features.content_hash, expected.content_hash)
+        for name in FEATURE_NAMES:
+            np.testing.assert_allclose(features.entity[name], expected.entity[name])
+            np.testing.assert_allclose(features.item[name], expected.item[name])
+
+    def test_features(self):
+        graph = self.graph
+        features = GraphFeatures.compute(graph)
+        for item in graph.get_items():
+            neighbors = graph.get_neighbors(item)
+            ratings = [graph.get_edge_weight(e, item) for e in neighbors]
+            self.assertEqual(features.degree(item), len(neighbors))
+            self.assertAlmostEqual(features.weighted_degree(item), sum(ratings))
+            if ratings:
+                self.assertAlmostEqual(features.rating_mean(item), np.mean(ratings))
+                self.assertAlmostEqual(features.rating_std(item), np.std(ratings))
+            self.assertEqual(
+                features.two_hop_count(item),
+                sum(graph.get_degree(e) - 1 for e in neighbors)
+            )
+
+    def test_store(self):
+        store = FeatureStore(self.directory)
+        features = store.get(self.graph)
+        self.assertEqual(os.listdir(self.directory), [features.content_hash])
+        loaded = store.get(self.graph)
+        self.assertIsInstance(loaded.item['degree'], np.memmap)
+        self.assertSameFeatures(loaded, features)
+
+        # A changed graph has a different key.
+        self.graph.add_edge(1, 2, 5) if not self.graph.is_edge(1, 2) \
+            else self.graph.del_edge(1, 2)
+        self.assertNotEqual(store.get(self.graph).content_hash, features.content_hash)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_incremental_updates(self):
+        graph = self.graph
+        features = FeatureStore(self.directory).get(graph)
+
+        fake_entities = graph.add_entities(2)
+        entities, items = [fake_entities[0]] * 3 + [fake_entities[1]], [2, 4, 6, 2]
+        for entity, item in zip(entities, items):
+            graph.add_edge(entity, item, 4)
+        existing = [(e, i) for e, i in [(1, 8), (3, 8), (5, 10)] if not graph.is_edge(e, i)]
+        for entity, item in existing:
+            graph.add_edge(entity, item, 2)
+        features.add_edges(
+            graph, entities + [e for e, _ in existing], items + [i for _, i in existing],
+            [4] * 4 + [2] * len(existing)
+        )
+        self.assertSameFeatures(features, GraphFeatures.compute(graph))
+
+        removed = [(e, i) for e in (1, 3, fake_entities[0]) for i in graph.get_neighbors(e)[:2]]
+        weights = [graph.get_edge_weight(e, i) for e, i in removed]
+        for entity, item in removed:
+            graph.del_edge(entity, item)
+        features.del_edges(graph, [e for e, _ in removed], [i for _, i in removed], weights)
+        self.assertSameFeatures(features, GraphFeatures.compute(graph))
+
+if __name__ == '__main__':
+    unittest.main()
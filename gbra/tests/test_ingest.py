@@ -0,0 +1,166 @@
+import gzip
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+from gbra.data.ingest import ingest_ratings, iter_rating_chunks, \
+    load_edge_timestamps, parse_beeradvocate, sniff_layout
+from gbra.util.ei_graph import EIGraph
+
+RATINGS = [(10, 7, 4, 100), (3, 7, 1, 101), (10, 2, 3.5, 102), (5, 4, 5, 103)]
+
+# (beer, overall rating, user) of BeerAdvocate reviews.
+REVIEWS = [('47986', 1.5, 'stcules'), ('48213', 3, 'johnmichaelsen'),
+           ('47986', 4, 'johnmichaelsen'), ('48213', 4.5, 'stcules'),
+           ('47986', 2.5, 'stcules'), ('10789', 5, 'rblwthacz: jr')]
+
+BEERADVOCATE_RECORD = """beer/name: Sausa Weizen
+beer/beerId: %s
+beer/brewerId: 10325
+review/overall: %s
+review/time: 1234817823
+review/profileName: %s
+review/text: A lot of foam. But a lot: of head.
+
+"""
+
+class TestIngest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, lines):
+        filename = os.path.join(self.directory, 'ratings')
+        with open(filename, 'w') as fout:
+            fout.write('\n'.join(lines) + '\n')
+        return filename
+
+    def test_layouts(self):
+        layouts = [
+            ('::', False, ['::'.join(str(v) for v in r) for r in RATINGS]),
+            ('\t', False, ['\t'.join(str(v) for v in r) for r in RATINGS]),
+            (',', True, ['userId,movieId,rating,timestamp'] +
+                [','.join(str(v) for v in r) for r in RATINGS]),
+        ]
+        for separator, has_header, lines in layouts:
+            filename = self.write(lines)
+            self.assertEqual(sniff_layout(filename), (separator, has_header))
+
+            # Chunks much smaller than the file split lines across reads.
+            chunks = list(iter_rating_chunks(filename, chunk_bytes=7))
+            self.assertEqual(sum(len(users) for users, _, _, _ in chunks), 4)
+            users, items, ratings, timestamps = [
+                sum((list(chunk[i]) for chunk in chunks), []) for i in range(4)
+            ]
+            self.assertEqual(zip(users, items, ratings, timestamps), RATINGS)
+
+    def test_ingest_dense_ids(self):
+        filename = self.write(['::'.join(str(v) for v in r) for r in RATINGS])
+        output = os.path.join(self.directory, 'graph.dat')
+        ingest_ratings(filename, output, chunk_bytes=10)
+        graph = EIGraph.load(output)
+
+        # Users 3, 5, 10 and items 2, 4, 7 are remapped in order.
+        self.assertEqual((graph.num_entities, graph.num_items), (3, 3))
+        self.assertEqual(graph.get_edge_weight(5, 6), 4)
+        self.assertEqual(graph.get_edge_weight(1, 6), 1)
+        self.assertEqual(graph.get_edge_weight(5, 2), 3.5)
+        self.assertEqual(
+            EIGraph.load_rating_histogram(output), {1: 1, 3.5: 1, 4: 1, 5: 1}
+        )
+        timestamps = load_edge_timestamps(output)
+        self.assertEqual(
+            [tuple(r) for r in timestamps],
+            [(5, 6, 100), (1, 6, 101), (5, 2, 102), (3, 4, 103)]
+        )
+
+    def test_ingest_kept_ids(self):
+        filename = self.write(['\t'.join(str(int(v)) for v in r) for r in RATINGS])
+        output = os.path.join(self.directory, 'graph.dat')
+        ingest_ratings(filename, output, num_users=10, num_items=8)
+        graph = EIGraph.load(output)
+        self.assertEqual((graph.num_entities, graph.num_items), (10, 8))
+        self.assertEqual(graph.get_edge_weight(19, 14), 4)
+        self.assertTrue(isinstance(graph.get_edge_weight(5, 14), int))
+
+        self.assertRaises(
+            ValueError, ingest_ratings, filename, output, num_users=9, num_items=8
+        )
+
+    def test_ingest_buckets(self):
+        # Many more ratings than fit in a bucket, in random order.
+        rng = np.random.RandomState(0)
+        edges = rng.choice(40 * 30, 500, replace=False)
+        users, items = 2 * (edges // 30) + 7, edges % 30 + 1
+        ratings = rng.randint(1, 6, len(edges))
+        filename = self.write([
+            '%d::%d::%d::%d' % rating
+            for rating in zip(users, items, ratings, range(len(edges)))
+        ])
+        output = os.path.join(self.directory, 'graph.dat')
+        ingest_ratings(filename, output, max_bucket_edges=20, chunk_bytes=1000)
+
+        user_ids, item_ids = sorted(set(users)), sorted(set(items))
+        expected = dict(
+            ((2 * user_ids.index(u) + 1, 2 * item_ids.index(i) + 2), r)
+            for u, i, r in zip(users.tolist(), items.tolist(), ratings.tolist())
+        )
+        graph = EIGraph.load(output)
+        self.assertEqual(graph._weights, expected)
+        self.assertEqual(
+            (graph.num_entities, graph.num_items), (len(user_ids), len(item_ids))
+        )
+        self.assertEqual(graph.num_edges(), len(edges))
+        # SNAP finds edges by binary search in the adjacency lists.
+        for node in graph.base().Nodes():
+            neighbors = list(node.GetOutEdges())
+            self.assertEqual(neighbors, sorted(neighbors))
+        for entity, item in expected:
+            self.assertTrue(graph.base().IsEdge(entity, item))
+        self.assertEqual(len(os.listdir(self.directory)), 5)
+
+        # Repeats are found in any bucket.
+        with open(filename, 'a') as fout:
+            fout.write('%d::%d::1::0\n' % (users[-1], items[-1]))
+        self.assertRaises(
+            ValueError, ingest_ratings, filename, output, max_bucket_edges=20
+        )
+
+    def test_parse_beeradvocate(self):
+        filename = os.path.join(self.directory, 'Beeradvocate.txt')
+        with open(filename, 'w') as fout:
+            for review in REVIEWS:
+                fout.write(BEERADVOCATE_RECORD % review)
+        with open(filename) as fin, gzip.open(filename + '.gz', 'w') as fout:
+            fout.write(fin.read())
+
+        # Chunks of a couple of records, in parallel and not.
+        for fn, num_workers in [(filename, 1), (filename, 2), (filename + '.gz', 2)]:
+            graph = parse_beeradvocate(fn, num_workers=num_workers, chunk_bytes=300)
+            self.assertEqual((graph.num_entities, graph.num_items), (3, 3))
+            self.assertEqual(graph.num_edges(), 5)
+
+            # Users and beers are numbered in order of appearance, and repeated
+            # reviews are averaged.
+            self.assertEqual(graph.get_edge_weight(1, 2), 2.0)
+            self.assertEqual(graph.get_edge_weight(3, 4), 3)
+            self.assertEqual(graph.get_edge_weight(1, 4), 4.5)
+            self.assertEqual(graph.get_edge_weight(5, 6), 5)
+
+    def test_invalid_ratings(self):
+        output = os.path.join(self.directory, 'graph.dat')
+        for lines in [['1::2::3::4', '1::2::3'], ['1::2::6::4'], ['1::2.5::3::4'],
+                      ['1::2::3::4', '1::x::3::4'], ['1::2::3::4', '1::2::4::5']]:
+            filename = self.write(lines)
+            self.assertRaises(ValueError, ingest_ratings, filename, output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+import numpy as np
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+from gbra.data.network_loader import ErdosRenyiLoader
+from gbra.recommender.metrics import ranking_metrics, pad_item_lists, \
+    DegreeStratifiedSampler, RECS_PAD, HELD_OUT_PAD
+
+class TestRankingMetrics(unittest.TestCase):
+
+    def test_metrics(self):
+        recs = pad_item_lists([[2, 4, 6], [8, 2], []], RECS_PAD, width=3)
+        held_out = pad_item_lists([[4], [2, 6], [2]], HELD_OUT_PAD)
+        metrics = ranking_metrics(recs, held_out, [1, 2, 3])
+
+        np.testing.assert_array_equal(
+            metrics['hit'], [[0, 1, 1], [0, 1, 1], [0, 0, 0]]
+        )
+        np.testing.assert_allclose(
+            metrics['precision'], [[0, .5, 1. / 3], [0, .5, 1. / 3], [0, 0, 0]]
+        )
+        np.testing.assert_allclose(
+            metrics['recall'], [[0, 1, 1], [0, .5, .5], [0, 0, 0]]
+        )
+        np.testing.assert_allclose(
+            metrics['mrr'], [[0, .5, .5], [0, .5, .5], [0, 0, 0]]
+        )
+
+        # A single hit at rank 2 against an ideal hit at rank 1.
+        ndcg = 1. / np.log2(3)
+        np.testing.assert_allclose(
+            metrics['ndcg'][0], [0, ndcg, ndcg]
+        )
+        # Two relevant items, one found at rank 2.
+        np.testing.assert_allclose(
+            metrics['ndcg'][1], [0, ndcg / (1 + ndcg), ndcg / (1 + ndcg)]
+        )
+
+    def test_padding_never_hits(self):
+        recs = pad_item_lists([[]], RECS_PAD, width=2)
+        held_out = pad_item_lists([[]], HELD_OUT_PAD, width=2)
+        metrics = ranking_metrics(recs, held_out, [2])
+        self.assertEqual(metrics['hit'][0, 0], 0)
+
+class TestDegreeStratifiedSampler(unittest.TestCase):
+
+    def test_sample(self):
+        graph = ErdosRenyiLoader(100, 50, 1000).load()
+        sampler = DegreeStratifiedSampler(graph, min_degree=8, max_degree=12)
+        for entity in sampler.entities:
+            self.assertTrue(8 <= len(graph.get_neighbors(entity)) <= 12)
+
+        excluded = set(sampler.entities[:5].tolist())
+        sample = sampler.sample(len(sampler) - 5, excluding=excluded)
+        self.assertEqual(len(set(sample.tolist())), len(sampler) - 5)
+        self.assertFalse(excluded & set(sample.tolist()))
+
+        with self.assertRaises(ValueError):
+            sampler.sample(len(sampler) - 4, excluding=excluded)
+
+if __name__ == '__main__':
+    unittest.main()
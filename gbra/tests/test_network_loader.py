@@ -0,0 +1,161 @@
+import shutil
+import tempfile
+import unittest
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+import numpy as np
+
+from gbra.data.network_loader import CachedLoader, ChungLuLoader, \
+    EdgeSwapLoader, EmulatingChungLuLoader, ErdosRenyiLoader, randomize_edges, \
+    sample_without_replacement
+
+class CountingLoader(ErdosRenyiLoader):
+
+    num_loads = 0
+
+    def load(self):
+        CountingLoader.num_loads += 1
+        return super(CountingLoader, self).load()
+
+class TestNetworkLoaders(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_erdos_renyi(self):
+        histogram = {1: 10, 4.5: 30}
+        loader = ErdosRenyiLoader(20, 30, 100, ratings_histogram=histogram, seed=3)
+        graph = loader.load()
+        self.assertEqual(graph.num_entities, 20)
+        self.assertEqual(graph.num_items, 30)
+        self.assertEqual(graph.num_edges(), 100)
+        self.assertTrue(set(graph.get_rating_histogram()) <= set(histogram))
+
+        # The same seed generates the same graph.
+        self.assertEqual(graph._weights, loader.load()._weights)
+
+    def test_erdos_renyi_dense(self):
+        graph = ErdosRenyiLoader(10, 20, 190, seed=4).load()
+        self.assertEqual(graph.num_edges(), 190)
+        self.assertEqual(graph.get_rating_histogram(), {1: 190})
+
+    def test_chung_lu(self):
+        loader = ChungLuLoader(
+            200, 300, 2000, item_exponent=2.2, ratings_histogram={1: 1, 5: 1}, seed=5
+        )
+        graph = loader.load()
+        self.assertEqual(graph.num_edges(), 2000)
+        self.assertEqual(set(graph.get_rating_histogram()), set([1, 5]))
+        self.assertEqual(graph._weights, loader.load()._weights)
+
+        # Items are heavy-tailed; entities are not.
+        item_degrees = [graph.get_degree(i) for i in graph.items]
+        entity_degrees = [graph.get_degree(e) for e in graph.entities]
+        self.assertGreater(max(item_degrees), 10 * np.mean(item_degrees))
+        self.assertLess(max(entity_degrees), 3 * np.mean(entity_degrees))
+
+    def test_chung_lu_exact_degrees(self):
+        rng = np.random.RandomState(0)
+        entity_degrees = rng.randint(1, 4, size=1000)
+        item_degrees = np.bincount(
+            rng.randint(0, 1000, size=entity_degrees.sum()), minlength=1000
+        )
+        entities, items, weights = ChungLuLoader(
+            entity_degrees=entity_degrees, item_degrees=item_degrees,
+            exact_degrees=True, seed=1
+        ).generate_edges()
+
+        # Only the few repeated edges are lost.
+        self.assertTrue((np.bincount((entities - 1) // 2, minlength=1000) <= entity_degrees).all())
+        self.assertTrue((np.bincount(items // 2 - 1, minlength=1000) <= item_degrees).all())
+        self.assertGreater(len(entities), 0.99 * entity_degrees.sum())
+        self.assertTrue((weights == 1).all())
+
+        self.assertRaises(ValueError, ChungLuLoader, entity_degrees=[1, 2],
+                          item_degrees=[1, 1], exact_degrees=True)
+
+    def test_edge_swap(self):
+        histogram = {1: 1, 2: 1, 3: 1}
+        graph = ErdosRenyiLoader(30, 40, 300, ratings_histogram=histogram, seed=6).load()
+        for keep_item_ratings in (True, False):
+            randomized = EdgeSwapLoader(
+                ErdosRenyiLoader(30, 40, 300, ratings_histogram=histogram, seed=6),
+                keep_item_ratings=keep_item_ratings, seed=7
+            ).load()
+            self.assertEqual(randomized.num_edges(), 300)
+            self.assertNotEqual(set(randomized._weights), set(graph._weights))
+
+            # Every node keeps its degree, and either items or entities keep
+            # their ratings.
+            kept = graph.items if keep_item_ratings else graph.entities
+            for node in graph.entities + graph.items:
+                self.assertEqual(graph.get_degree(node), randomized.get_degree(node))
+            for node in kept:
+                self.assertEqual(
+                    sorted(graph.get_edge_weight(node, n) for n in graph.get_neighbors(node)),
+                    sorted(randomized.get_edge_weight(node, n)
+                           for n in randomized.get_neighbors(node))
+                )
+
+        # A complete graph cannot be rewired.
+        entities, items, weights = randomize_edges([1, 1, 3, 3], [2, 4, 2, 4], [1, 2, 3, 4])
+        self.assertEqual(sorted(zip(entities, items)), [(1, 2), (1, 4), (3, 2), (3, 4)])
+
+    def test_sample_without_replacement(self):
+        rng = np.random.RandomState(0)
+        for n, k in [(10, 0), (10, 3), (10, 9), (10, 10), (1000, 500)]:
+            sample = sample_without_replacement(n, k, rng, block_size=7)
+            self.assertEqual(len(sample), k)
+            self.assertTrue((np.diff(sample) > 0).all())
+            self.assertTrue(((0 <= sample) & (sample < n)).all())
+        self.assertRaises(ValueError, sample_without_replacement, 3, 4)
+
+    def test_cached_loader(self):
+        histogram = {1: 10, 5: 30}
+        CountingLoader.num_loads = 0
+        loader = CachedLoader(
+            CountingLoader(20, 30, 100, ratings_histogram=histogram, seed=3),
+            self.directory
+        )
+        graph = loader.load()
+        self.assertEqual(graph._weights, loader.load()._weights)
+        self.assertEqual(CountingLoader.num_loads, 1)
+        self.assertEqual(
+            graph.get_rating_histogram(),
+            graph.load_rating_histogram(loader.get_filename())
+        )
+
+        # A different rating histogram is a different graph.
+        other = CachedLoader(
+            CountingLoader(20, 30, 100, ratings_histogram={1: 1}, seed=3),
+            self.directory
+        )
+        self.assertNotEqual(loader.get_filename(), other.get_filename())
+        self.assertEqual(other.load().get_rating_histogram(), {1: 100})
+        self.assertEqual(CountingLoader.num_loads, 2)
+
+        # Unseeded graphs are fresh random draws, which are never cached.
+        for unseeded in [ErdosRenyiLoader(20, 30, 100),
+                         ChungLuLoader(20, 30, 100),
+                         EmulatingChungLuLoader(CountingLoader(20, 30, 100, seed=3))]:
+            self.assertIsNone(unseeded.cache_key())
+            with self.assertRaises(ValueError):
+                CachedLoader(unseeded, self.directory).get_filename()
+
+        # Cached emulations never load the graph they emulate again.
+        emulation = CachedLoader(EmulatingChungLuLoader(
+            CountingLoader(20, 30, 100, ratings_histogram=histogram, seed=3), seed=4
+        ), self.directory)
+        emulated = emulation.load()
+        self.assertEqual(emulated._weights, emulation.load()._weights)
+        self.assertEqual(CountingLoader.num_loads, 3)
+        self.assertEqual(emulated.num_edges(), 100)
+        self.assertEqual(sorted(emulated.get_rating_histogram()), [1, 5])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import random
+import unittest
+
+import numpy as np
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+from gbra.data.network_loader import ErdosRenyiLoader
+from gbra.recommender.recommenders import BasicRandomWalkRecommender, \
+    PixieRandomWalkRecommender, PopularItemRecommender, RandomRecommender
+
+class TestWhatIf(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = ErdosRenyiLoader(
+            num_entities=40, num_items=30, num_edges=300, seed=3
+        ).load()
+        self.entity = 1
+        rated = self.graph.get_neighbors(self.entity)
+        unrated = sorted(self.graph.get_items() - set(rated))
+        self.hypotheses = [
+            ([(unrated[0], 5)], []),
+            ([(unrated[1], 1), (unrated[2], 4)], [rated[0]]),
+            ([], rated[1:]),
+        ]
+
+    def recommend_for_real(self, recommender, hypothesis):
+        graph = self.graph
+        added_edges, removed_items = hypothesis
+        weights = [graph.get_edge_weight(self.entity, item) for item in removed_items]
+        for item in removed_items:
+            graph.del_edge(self.entity, item)
+        for item, weight in added_edges:
+            graph.add_edge(self.entity, item, weight)
+        recs = recommender.recommend(self.entity, 5)
+        for item, _ in added_edges:
+            graph.del_edge(self.entity, item)
+        for item, weight in zip(removed_items, weights):
+            graph.add_edge(self.entity, item, weight)
+        return recs
+
+    def test_random_walks(self):
+        for recommender in [
+                BasicRandomWalkRecommender(self.graph, max_steps_in_walk=100),
+                PixieRandomWalkRecommender(
+                    n_p=5, n_v=3, G=self.graph, max_steps_in_walk=100
+                )]:
+            random.seed(0)
+            np.random.seed(0)
+            expected = [self.recommend_for_real(recommender, hypothesis)
+                        for hypothesis in self.hypotheses]
+
+            # Virtual edges draw the same walks, and leave the graph alone.
+            version = self.graph.version
+            random.seed(0)
+            np.random.seed(0)
+            self.assertEqual(recommender.recommend_hypotheses(
+                self.entity, 5, self.hypotheses
+            ), expected)
+            self.assertEqual(self.graph.version, version)
+
+            # A single hypothesis is the same as a batch of one.
+            random.seed(0)
+            np.random.seed(0)
+            self.recommend_for_real(recommender, self.hypotheses[0])
+            added_edges, removed_items = self.hypotheses[1]
+            self.assertEqual(recommender.recommend_what_if(
+                self.entity, 5, added_edges, removed_items
+            ), expected[1])
+
+    def test_random_and_popular(self):
+        version = self.graph.version
+        for recommender in [RandomRecommender(self.graph),
+                            PopularItemRecommender(self.graph, num_popular_items=5)]:
+            for (added_edges, removed_items), recs in zip(
+                    self.hypotheses,
+                    recommender.recommend_hypotheses(self.entity, 5, self.hypotheses)):
+                rated = set(self.graph.get_neighbors(self.entity))
+                rated.difference_update(removed_items)
+                rated.update(item for item, _ in added_edges)
+                self.assertEqual(len(recs), 5)
+                self.assertFalse(rated & set(recs))
+        self.assertEqual(self.graph.version, version)
+
+        # Rating an item highly enough makes it the most popular one, for
+        # that hypothesis only.
+        recommender = PopularItemRecommender(self.graph, num_popular_items=1)
+        popular_items = recommender._popular_items.tolist()
+        item, _ = self.hypotheses[0][0][0]
+        self.assertEqual(recommender._what_if_popular_items(
+            self.entity, [(item, 1000)], []
+        ), [item])
+        self.assertEqual(recommender._popular_items.tolist(), popular_items)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from scipy import stats
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+from gbra.experiments.results import ResultsWriter, ResultsReader
+
+class TestResultsStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_group_stats(self):
+        scores = {}
+        for writer_id in range(2):
+            with ResultsWriter(self.directory, chunk_size=7) as writer:
+                for i in range(50):
+                    graph = 'graph%d' % (i % 2)
+                    k = 10 * (1 + i % 3)
+                    score = np.random.rand()
+                    writer.write(dict(graph=graph, k=k), entity=i, score=score,
+                                 latency=0.1, seed=writer_id)
+                    scores.setdefault((graph, k), []).append(score)
+                writer.write(dict(graph='graph0', k=10), entity=0, score=None)
+
+        reader = ResultsReader(self.directory)
+        self.assertEqual(len(reader.chunk_filenames()), 16)
+
+        group_stats = reader.group_stats(by=['graph', 'k'], quantiles=(0.5, 0.9))
+        self.assertEqual(sorted(group_stats), sorted(scores))
+        for key, values in scores.items():
+            stat = group_stats[key]
+            self.assertEqual(stat.count, len(values))
+            self.assertAlmostEqual(stat.mean, np.mean(values))
+            self.assertAlmostEqual(stat.std, np.std(values, ddof=1))
+            low, high = stats.t.interval(
+                0.95, len(values) - 1, np.mean(values), stats.sem(values)
+            )
+            self.assertAlmostEqual(stat.ci_low, low)
+            self.assertAlmostEqual(stat.ci_high, high)
+            self.assertAlmostEqual(stat.quantiles[0.9], np.percentile(values, 90))
+
+        latency_stats = reader.group_stats(by=[], column='latency')
+        self.assertEqual(latency_stats[()].count, 102)
+
+    def test_sampled_quantiles(self):
+        with ResultsWriter(self.directory, chunk_size=100) as writer:
+            for i in range(1000):
+                writer.write(dict(graph='g'), score=float(i))
+
+        [stat] = ResultsReader(self.directory).group_stats(
+            by=['graph'], max_quantile_samples=200
+        ).values()
+        self.assertEqual(stat.count, 1000)
+        self.assertAlmostEqual(stat.mean, 499.5)
+        self.assertTrue(350 < stat.quantiles[0.5] < 650)
+
+    def test_failed_runs_are_dropped(self):
+        with self.assertRaises(ValueError):
+            with ResultsWriter(self.directory) as writer:
+                writer.write(dict(graph='g'), score=1.0)
+                writer.write(dict(other='g'), score=1.0)
+        self.assertEqual(ResultsReader(self.directory).chunk_filenames(), [])
+
+if __name__ == '__main__':
+    unittest.main()
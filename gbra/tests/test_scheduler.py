@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+from gbra.data.network_loader import TinyTestLoader
+from gbra.experiments.scheduler import ExperimentGrid, Scheduler
+
+def load_graph(name):
+    graph = TinyTestLoader().load()
+    graph.name = name
+    return graph
+
+def count_edges(graph, config):
+    if config['multiplier'] < 0:
+        raise ValueError("Negative multiplier")
+    return [graph.get_name(), graph.num_edges() * config['multiplier']]
+
+def allocate(graph, config):
+    return int(np.ones(config['allocate_mb'] * 2 ** 17).sum())
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.state_filename = os.path.join(self.directory, 'sweep.state')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_grid(self):
+        grid = ExperimentGrid(
+            [('graph', ['a', 'b']), ('multiplier', [1, 2, 3])],
+            exclude=lambda config: config['multiplier'] == 3
+        )
+        self.assertEqual(len(grid), 4)
+        self.assertIn({'graph': 'b', 'multiplier': 2}, list(grid))
+
+    def test_run_and_resume(self):
+        grid = ExperimentGrid([('graph', ['a', 'b']), ('multiplier', [-1, 1, 2])])
+        scheduler = Scheduler(
+            count_edges, load_graph, num_workers=2,
+            state_filename=self.state_filename
+        )
+
+        jobs = list(scheduler.run(grid))
+        self.assertEqual(len(jobs), 6)
+        for job in jobs:
+            if job.config['multiplier'] < 0:
+                self.assertIn('Negative multiplier', job.error)
+                continue
+            self.assertIsNone(job.error)
+            self.assertEqual(
+                job.result, [job.config['graph'], 12 * job.config['multiplier']]
+            )
+            self.assertTrue(job.wall_time >= 0)
+            self.assertTrue(job.peak_memory_mb > 0)
+
+        # Only the failed cells are run again.
+        self.assertEqual(len(scheduler.completed()), 4)
+        rerun = list(scheduler.run(grid))
+        self.assertEqual(
+            sorted(job.config['graph'] for job in rerun), ['a', 'b']
+        )
+        self.assertTrue(all(job.config['multiplier'] == -1 for job in rerun))
+
+    def test_peak_memory_is_per_job(self):
+        # Both jobs run on the one worker, the big one first.
+        grid = ExperimentGrid([('graph', ['a']), ('allocate_mb', [200, 0])])
+        jobs = dict(
+            (job.config['allocate_mb'], job)
+            for job in Scheduler(allocate, load_graph, num_workers=1).run(grid)
+        )
+        self.assertGreater(jobs[200].peak_memory_mb, jobs[0].peak_memory_mb + 150)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 """Defines a general-purpose Entity-Item graph object."""
 
-from collections import defaultdict
+from collections import Counter, defaultdict
+from itertools import izip
 import marshal
+import os
 import numpy as np
 import random
 import snap
@@ -9,6 +11,121 @@ import numpy as np
 
 from gbra.util.math_utils import weighted_choice
 
+class _EdgeIndex(object):
+    """The edges of an EIGraph in flat arrays, for sampling edges uniformly,
+    and the running count, mean and variance (Welford's algorithm) of the
+    ratings of every item, indexed by item id / 2 - 1.
+
+    Removing an edge moves the last edge into its slot, so that edges stay
+    contiguous and both updates are O(1).
+    """
+
+    def __init__(self, weights, num_items):
+        num_edges = len(weights)
+        edges = weights.keys()
+        self.positions = dict(izip(edges, xrange(num_edges)))
+        self.entities = np.fromiter((e for e, _ in edges), np.int64, num_edges)
+        self.items = np.fromiter((i for _, i in edges), np.int64, num_edges)
+        self.weights = np.fromiter(
+            (weights[edge] for edge in edges), np.float64, num_edges
+        )
+        self.size = num_edges
+
+        indices = self.items // 2 - 1
+        self.counts = np.bincount(indices, minlength=num_items)
+        self.means = np.bincount(indices, weights=self.weights, minlength=num_items) \
+            / np.maximum(self.counts, 1)
+        self.m2 = np.bincount(
+            indices, weights=(self.weights - self.means[indices]) ** 2,
+            minlength=num_items
+        )
+
+    @staticmethod
+    def _grow(values, size):
+        grown = np.zeros(max(size, 2 * len(values)), dtype=values.dtype)
+        grown[:len(values)] = values
+        return grown
+
+    def reserve(self, num_edges, num_items):
+        """Makes room for `num_edges` edges and `num_items` items."""
+        if num_edges > len(self.entities):
+            self.entities = self._grow(self.entities, num_edges)
+            self.items = self._grow(self.items, num_edges)
+            self.weights = self._grow(self.weights, num_edges)
+        if num_items > len(self.counts):
+            self.counts = self._grow(self.counts, num_items)
+            self.means = self._grow(self.means, num_items)
+            self.m2 = self._grow(self.m2, num_items)
+
+    def add(self, entity, item, weight):
+        self.reserve(self.size + 1, item // 2)
+        position = self.size
+        self.positions[(entity, item)] = position
+        self.entities[position] = entity
+        self.items[position] = item
+        self.weights[position] = weight
+        self.size += 1
+
+        index = item // 2 - 1
+        self.counts[index] += 1
+        delta = weight - self.means[index]
+        self.means[index] += delta / self.counts[index]
+        self.m2[index] += delta * (weight - self.means[index])
+
+    def add_many(self, entities, items, weights):
+        """Adds the edges of the arrays, merging the statistics of every item
+        with those of its new ratings (Chan et al.'s pairwise update).
+        """
+        num_edges = len(entities)
+        self.reserve(self.size + num_edges, items.max() // 2)
+        end = self.size + num_edges
+        self.positions.update(izip(
+            izip(entities.tolist(), items.tolist()), xrange(self.size, end)
+        ))
+        self.entities[self.size:end] = entities
+        self.items[self.size:end] = items
+        self.weights[self.size:end] = weights
+        self.size = end
+
+        indices, inverse = np.unique(items // 2 - 1, return_inverse=True)
+        counts = np.bincount(inverse)
+        means = np.bincount(inverse, weights=weights) / counts
+        m2 = np.bincount(inverse, weights=(weights - means[inverse]) ** 2)
+        old_counts = self.counts[indices]
+        total = old_counts + counts
+        delta = means - self.means[indices]
+        self.means[indices] += delta * counts / total
+        self.m2[indices] += m2 + delta ** 2 * old_counts * counts / total
+        self.counts[indices] = total
+
+    def remove(self, entity, item):
+        position = self.positions.pop((entity, item))
+        weight = self.weights[position]
+        last = self.size - 1
+        if position != last:
+            moved = (self.entities[last].item(), self.items[last].item())
+            self.positions[moved] = position
+            self.entities[position] = self.entities[last]
+            self.items[position] = self.items[last]
+            self.weights[position] = self.weights[last]
+        self.size = last
+
+        index = item // 2 - 1
+        self.counts[index] -= 1
+        if self.counts[index] == 0:
+            self.means[index] = self.m2[index] = 0.0
+            return
+        delta = weight - self.means[index]
+        self.means[index] -= delta / self.counts[index]
+        self.m2[index] = max(self.m2[index] - delta * (weight - self.means[index]), 0.0)
+
+    def sample(self, num_edges, rng):
+        positions = rng.randint(self.size, size=num_edges)
+        return (
+            self.entities[positions], self.items[positions],
+            self.weights[positions]
+        )
+
 class EIGraph(object):
     """An Entity-Item Graph.
 
@@ -42,11 +159,32 @@ class EIGraph(object):
             self.add_item()
 
         self._weights = {}  # (entity, item) -> weight
+        # Incremented by every change to the edges, so that derived data
+        # can tell whether it is current.
+        self.version = 0
+        # Built on first use, then kept current, see `_get_edge_index`.
+        self._edge_index = None
 
     def base(self):
         """Returns the underlying snap TUNGraph."""
         return self._G
 
+    def copy(self):
+        """Returns a copy of this graph that can be mutated independently."""
+        graph = EIGraph(
+            rating_range=self.rating_range,
+            possible_ratings=list(self.possible_ratings)
+        )
+        graph._G = snap.ConvertGraph(snap.PUNGraph, self._G)
+        graph.num_entities = self.num_entities
+        graph.num_items = self.num_items
+        graph.name = self.name
+        graph.items = list(self.items)
+        graph.entities = list(self.entities)
+        graph.max_rating = self.max_rating
+        graph._weights = dict(self._weights)
+        return graph
+
     def get_name(self):
         """Returns name of the graph."""
         return self.name
@@ -59,6 +197,18 @@ class EIGraph(object):
         self.entities.append(new_id)
         return new_id
 
+    def add_entities(self, num_entities):
+        """Adds `num_entities` entities and returns the array of their IDs."""
+        new_ids = 2 * np.arange(
+            self.num_entities, self.num_entities + num_entities, dtype=np.int64
+        ) + 1
+        add_node = self._G.AddNode
+        for new_id in new_ids.tolist():
+            add_node(new_id)
+        self.num_entities += num_entities
+        self.entities.extend(new_ids.tolist())
+        return new_ids
+
     def add_item(self):
         """Adds an item and returns that entity's ID."""
         new_id = (self.num_items + 1) * 2
@@ -79,14 +229,92 @@ class EIGraph(object):
         :param - weight: (default 1), specifies a weight for the edge
         """
         assert self.nid_is_entity(nid1) != self.nid_is_entity(nid2)
-        self._weights[self._order_ei(nid1, nid2)] = weight
+        edge = self._order_ei(nid1, nid2)
+        if self._edge_index is not None:
+            self._edge_index.add(edge[0], edge[1], weight)
+        self._weights[edge] = weight
+        self.version += 1
         res = self._G.AddEdge(nid1, nid2)
         assert res == -1, res
 
+    def add_edges(self, entities, items, weights=1):
+        """Adds an edge between `entities[i]` and `items[i]` for every i.
+
+        This is the bulk counterpart of `add_edge` for building large graphs:
+        the edges are validated with vectorized checks, and handed to SNAP
+        without keeping every adjacency list sorted edge by edge.
+
+        :param entities: array-like of entity node IDs.
+        :param items: array-like of item node IDs, of the same length.
+        :param weights: (default 1) the weight of all the edges, or an
+            array-like of the weight of each edge.
+        :raises ValueError: if the edges name unknown entities or items, or
+            repeat each other or an edge of the graph.  The graph is left
+            unchanged.
+        """
+        entities = np.asarray(entities, dtype=np.int64).ravel()
+        items = np.asarray(items, dtype=np.int64).ravel()
+        weights = np.asarray(weights).ravel()
+        if len(weights) == 1:
+            weights = np.repeat(weights, len(entities))
+        if not len(entities) == len(items) == len(weights):
+            raise ValueError("entities, items and weights differ in length")
+        if len(entities) == 0:
+            return
+
+        if not np.in1d(entities, self.entities).all():
+            raise ValueError("Unknown entity")
+        if not np.in1d(items, self.items).all():
+            raise ValueError("Unknown item")
+
+        order = np.lexsort((items, entities))
+        sorted_entities, sorted_items = entities[order], items[order]
+        if ((sorted_entities[1:] == sorted_entities[:-1]) &
+                (sorted_items[1:] == sorted_items[:-1])).any():
+            raise ValueError("Repeated edge")
+
+        edges = zip(entities.tolist(), items.tolist())
+        if self._weights and any(edge in self._weights for edge in edges):
+            raise ValueError("Edge already exists")
+
+        add_edge = self._G.AddEdgeUnchecked
+        for entity, item in edges:
+            add_edge(entity, item)
+        # AddEdgeUnchecked appends to the adjacency lists; SNAP expects
+        # them sorted.
+        self._G.SortNodeAdjV()
+        self._weights.update(izip(edges, weights.tolist()))
+        self.version += 1
+        if self._edge_index is not None:
+            self._edge_index.add_many(entities, items, weights.astype(np.float64))
+
+    def to_edge_arrays(self, sort=True):
+        """Returns the (entities, items, weights) arrays of the edges of this
+        graph, sorted by entity and then item.  See `add_edges`.
+
+        :param sort: if False, the edges are returned in no particular order,
+            which is faster for large graphs.
+        """
+        if not sort and self._edge_index is not None:
+            index = self._edge_index
+            return (
+                index.entities[:index.size].copy(), index.items[:index.size].copy(),
+                index.weights[:index.size].copy()
+            )
+        edges = sorted(self._weights.iteritems()) if sort else self._weights.items()
+        entities = np.fromiter((e for (e, _), _ in edges), np.int64, len(edges))
+        items = np.fromiter((i for (_, i), _ in edges), np.int64, len(edges))
+        weights = np.array([w for _, w in edges])
+        return entities, items, weights
+
     def del_edge(self, nid1, nid2):
         """Removes an edge between nodes with IDs `nid1` and `nid2`."""
         assert self.nid_is_entity(nid1) != self.nid_is_entity(nid2)
-        del self._weights[self._order_ei(nid1, nid2)]
+        edge = self._order_ei(nid1, nid2)
+        del self._weights[edge]
+        self.version += 1
+        if self._edge_index is not None:
+            self._edge_index.remove(*edge)
         self._G.DelEdge(nid1, nid2)
 
     def is_edge(self, nid1, nid2):
@@ -123,23 +351,42 @@ class EIGraph(object):
         """Returns a list containing the node IDs of the neighbors
         of "node".
         """
-        if isinstance(node, int):
-            node = self._G.GetNI(node)
+        if isinstance(node, (int, long, np.integer)):
+            node = self._G.GetNI(int(node))
         return list(node.GetOutEdges())
 
-    def get_random_edge(self):
-        """Returns a random (entity, item, weight) pair whose edge
-        exists in the graph.
+    def get_degree(self, node):
+        """Returns the number of neighbors of "node"."""
+        if isinstance(node, (int, long, np.integer)):
+            node = self._G.GetNI(int(node))
+        return node.GetOutDeg()
+
+    def _get_edge_index(self):
+        """Returns the `_EdgeIndex` of this graph, building it on first use.
+
+        The index is kept current by `add_edge`, `add_edges` and `del_edge`.
         """
-        if self._G.GetEdges() == 0:
-            raise ValueError("Graph has no edges")
+        if self._edge_index is None:
+            self._edge_index = _EdgeIndex(self._weights, self.num_items)
+        return self._edge_index
 
-        [item] = self.get_random_items(1)
-        while self._G.GetNI(item).GetOutDeg() == 0:
-            [item] = self.get_random_items(1)
+    def sample_edges(self, num_edges, rng=np.random):
+        """Returns the (entities, items, weights) arrays of `num_edges` edges
+        drawn uniformly at random, with replacement, in O(1) each.
 
-        entity = self.get_random_neighbor(item).GetId()
-        return (entity, item, self.get_edge_weight(entity, item))
+        :param rng: the numpy random state to draw from.
+        """
+        if not self._weights:
+            raise ValueError("Graph has no edges")
+        return self._get_edge_index().sample(num_edges, rng)
+
+    def get_random_edge(self):
+        """Returns a random (entity, item, weight) pair whose edge
+        exists in the graph, drawn uniformly over the edges.
+        """
+        entities, items, _ = self.sample_edges(1)
+        edge = (entities[0].item(), items[0].item())
+        return edge + (self._weights[edge],)
 
     def get_random_items(self, N, replace = True, excluding = None):
         """Returns a np.array of items in the graph"""
@@ -147,23 +394,36 @@ class EIGraph(object):
             raise ValueError("Graph has no items")
         return np.random.choice([i for i in self.get_items() if i != excluding], N, replace)
 
-    def get_random_neighbor(self, node, use_weights=False):
+    def get_random_neighbor(self, node, use_weights=False, excluding=None):
         """Returns a random neighbor of node in this graph as a Snap Node.
 
+        See `get_random_neighbor_id` for the parameters.
+        """
+        return self._G.GetNI(
+            self.get_random_neighbor_id(node, use_weights, excluding)
+        )
+
+    def get_random_neighbor_id(self, node, use_weights=False, excluding=None):
+        """Returns the ID of a random neighbor of node in this graph.
+
         :param Node: can be a snap node or an int ID.
         :param use_weights: If true, weighs the random choice based on the
             weight of the edge between the current node and its neighbors.
             WARNING: This makes the code many times slower.
+        :param excluding: (optional) collection of neighbor IDs to treat as
+            if their edge to `node` did not exist.
         """
         neighbors = self.get_neighbors(node)
+        if excluding:
+            neighbors = [n for n in neighbors if n not in excluding]
         if not neighbors:
             raise ValueError("Node has no neighbors")
 
         if not use_weights:
-            return self._G.GetNI(random.choice(neighbors))
+            return random.choice(neighbors)
 
         weights = []
-        if not isinstance(node, int):
+        if not isinstance(node, (int, long, np.integer)):
             node = node.GetId()
 
         weight_sum = 0.0
@@ -172,8 +432,7 @@ class EIGraph(object):
             weight_sum += curr_edge_weight
             weights.append(curr_edge_weight)
 
-        draw = weighted_choice(neighbors, weights, weight_sum)
-        return self._G.GetNI(draw)
+        return weighted_choice(neighbors, weights, weight_sum)
 
     def get_average_edge_weight(self, node):
         neighbors = self.get_neighbors(node)
@@ -201,11 +460,29 @@ class EIGraph(object):
     def _get_meta_filename(filename):
         return filename + '.ei_meta'
 
+    @staticmethod
+    def _get_info_filename(filename):
+        return filename + '.ei_info'
+
+    @staticmethod
+    def get_filenames(filename):
+        """Returns the names of all the files `save(filename)` writes."""
+        return [
+            filename, EIGraph._get_meta_filename(filename),
+            EIGraph._get_info_filename(filename)
+        ]
+
+    def get_rating_histogram(self):
+        """Returns a map of rating -> number of edges with that rating."""
+        return dict(Counter(self._weights.itervalues()))
+
     def save(self, filename):
         """Save this graph in binary format to the given `filename`.
 
         In order to store metadata associated with this the EIGraph
-        object, we save an extra file, with the name `filename + '.ei_meta'`.
+        object, we save two extra files: the edge weights, with the name
+        `filename + '.ei_meta'`, and summary information about the graph
+        (e.g. its rating histogram) with the name `filename + '.ei_info'`.
         """
         FOut = snap.TFOut(filename)
         self.base().Save(FOut)
@@ -215,6 +492,26 @@ class EIGraph(object):
         with open(meta_fn, 'wb') as fout:
             marshal.dump(self._weights, fout)
 
+        with open(self._get_info_filename(filename), 'wb') as fout:
+            marshal.dump({
+                'rating_histogram': self.get_rating_histogram(),
+            }, fout)
+
+    @staticmethod
+    def load_rating_histogram(filename):
+        """Returns the rating histogram of the graph saved to `filename`,
+        without loading the graph itself.
+        """
+        info_fn = EIGraph._get_info_filename(filename)
+        if os.path.exists(info_fn):
+            with open(info_fn, 'rb') as fin:
+                return marshal.load(fin)['rating_histogram']
+
+        # Graphs saved before we stored summary information: fall back to
+        # the edge weights.
+        with open(EIGraph._get_meta_filename(filename), 'rb') as fin:
+            return dict(Counter(marshal.load(fin).itervalues()))
+
     @staticmethod
     def load(filename):
         """Loads an EIGraph from the given `filename` and the possible
@@ -266,6 +563,28 @@ class EIGraph(object):
             for other_nid in self.get_neighbors(nid)
         )
 
+    def get_item_rating_moments(self):
+        """Returns the (counts, means, variances) arrays of the ratings of
+        every item, where item i is at index i / 2 - 1.  Items without
+        ratings have a mean and variance of 0.
+
+        The statistics are kept current as edges are added and removed, so
+        this is O(number of items) after the first call.
+        """
+        index = self._get_edge_index()
+        index.reserve(0, self.num_items)
+        counts = index.counts[:self.num_items].copy()
+        variances = index.m2[:self.num_items] / np.maximum(counts, 1)
+        return counts, index.means[:self.num_items].copy(), variances
+
+    def get_item_rating_stats(self):
+        """Returns the (counts, sums, sums of squares) arrays of the ratings
+        of every item, where item i is at index i / 2 - 1.
+        """
+        counts, means, variances = self.get_item_rating_moments()
+        sums = counts * means
+        return counts, sums, counts * (variances + means ** 2)
+
     def get_weighted_item_to_degree(self):
         """Returns a map of item to weighted degree."""
         node_to_degree = defaultdict(int)
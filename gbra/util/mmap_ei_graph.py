@@ -0,0 +1,307 @@
+"""Defines a read-only Entity-Item graph backed by memory-mapped arrays.
+
+A `MmapEIGraph` reads a graph directory written by
+`gbra.data.edge_list_import.import_edge_list`.  The edges are stored twice,
+in compressed sparse row (CSR) form:
+
+    - entity_indptr.npy, entity_items.npy, entity_weights.npy: the items of
+      entity e (dense index e, i.e. node 2e + 1) and the weights of their
+      edges are entity_items[entity_indptr[e]:entity_indptr[e + 1]], sorted
+      by item.
+    - entity_timestamps.npy: the timestamp of every edge, in the order of
+      entity_items, if the ratings had timestamps.
+    - item_indptr.npy, item_entities.npy, item_weights.npy: the same from
+      the side of the items (dense index i, i.e. node 2(i + 1)).
+    - user_ids.npy, item_ids.npy: the original id of every entity and item.
+    - info.json: the number of entities, items and edges, and the rating
+      histogram.
+
+The arrays are memory mapped, so only the parts that are touched are read
+from disk, and forked worker processes share them.  The graph offers the
+read-only part of the `EIGraph` interface that the recommenders, the
+evaluator and the metrics use; it cannot be mutated.
+"""
+
+import json
+import os
+import random
+
+import numpy as np
+
+from gbra.util.ei_graph import EIGraph
+
+ENTITY_INDPTR = 'entity_indptr.npy'
+ENTITY_ITEMS = 'entity_items.npy'
+ENTITY_WEIGHTS = 'entity_weights.npy'
+ENTITY_TIMESTAMPS = 'entity_timestamps.npy'
+ITEM_INDPTR = 'item_indptr.npy'
+ITEM_ENTITIES = 'item_entities.npy'
+ITEM_WEIGHTS = 'item_weights.npy'
+USER_IDS = 'user_ids.npy'
+ITEM_IDS = 'item_ids.npy'
+INFO = 'info.json'
+
+class MmapEIGraph(object):
+    """A read-only Entity-Item graph, memory mapped from a graph directory.
+
+    Node ids follow the `EIGraph` convention: entities are odd and items are
+    even.
+    """
+
+    nid_is_entity = staticmethod(EIGraph.nid_is_entity)
+    nid_is_item = staticmethod(EIGraph.nid_is_item)
+
+    def __init__(self, directory):
+        def load(name):
+            return np.load(os.path.join(directory, name), mmap_mode='r')
+
+        self._entity_indptr = load(ENTITY_INDPTR)
+        self._entity_items = load(ENTITY_ITEMS)
+        self._entity_weights = load(ENTITY_WEIGHTS)
+        self._item_indptr = load(ITEM_INDPTR)
+        self._item_entities = load(ITEM_ENTITIES)
+        self._item_weights = load(ITEM_WEIGHTS)
+
+        with open(os.path.join(directory, INFO)) as fin:
+            info = json.load(fin)
+        self._num_edges = info['num_edges']
+        self._has_timestamps = info['has_timestamps']
+        self._rating_histogram = dict(
+            (rating, count) for rating, count in info['rating_histogram']
+        )
+
+        self.name = directory
+        self.num_entities = info['num_entities']
+        self.num_items = info['num_items']
+        self.entities = 2 * np.arange(self.num_entities, dtype=np.int64) + 1
+        self.items = 2 * np.arange(1, self.num_items + 1, dtype=np.int64)
+        self.possible_ratings = sorted(self._rating_histogram)
+        self.rating_range = (
+            (min(self.possible_ratings), max(self.possible_ratings))
+            if self.possible_ratings else (0, 5)
+        )
+        self.max_rating = max(self.rating_range)
+        # See `EIGraph.version`; this graph never changes.
+        self.version = 0
+
+    def get_name(self):
+        return self.name
+
+    def load_original_ids(self):
+        """Returns the (user_ids, item_ids) arrays holding the original id of
+        every entity and item, in dense index order.
+        """
+        return (
+            np.load(os.path.join(self.name, USER_IDS), mmap_mode='r'),
+            np.load(os.path.join(self.name, ITEM_IDS), mmap_mode='r'),
+        )
+
+    def load_edge_timestamps(self):
+        """Returns the array holding the timestamp of every edge, in the
+        order of the edges of the entities, or None if there are none.
+        """
+        if not self._has_timestamps:
+            return None
+        return np.load(os.path.join(self.name, ENTITY_TIMESTAMPS), mmap_mode='r')
+
+    def _get_edges(self, node):
+        """Returns the (neighbors, weights) arrays of `node`'s edges, where
+        the neighbors are dense indices sorted in increasing order.
+        """
+        node = int(node)
+        if not self.has_node(node):
+            raise ValueError("Node %d is not in the graph" % node)
+        if self.nid_is_entity(node):
+            index = (node - 1) // 2
+            start, end = self._entity_indptr[index], self._entity_indptr[index + 1]
+            return self._entity_items[start:end], self._entity_weights[start:end]
+        index = node // 2 - 1
+        start, end = self._item_indptr[index], self._item_indptr[index + 1]
+        return self._item_entities[start:end], self._item_weights[start:end]
+
+    def _to_nids(self, node, neighbors):
+        """Converts the dense indices of `node`'s neighbors to node ids."""
+        if self.nid_is_entity(node):
+            return 2 * (neighbors.astype(np.int64) + 1)
+        return 2 * neighbors.astype(np.int64) + 1
+
+    def _find_edge(self, nid1, nid2):
+        """Returns the position of the edge between the nodes in the entity
+        side arrays, or None if there is no such edge.
+        """
+        entity, item = (nid1, nid2) if self.nid_is_entity(nid1) else (nid2, nid1)
+        if not (self.has_entity(entity) and self.has_item(item)):
+            return None
+        index = (entity - 1) // 2
+        start, end = self._entity_indptr[index], self._entity_indptr[index + 1]
+        position = start + np.searchsorted(
+            self._entity_items[start:end], item // 2 - 1
+        )
+        if position < end and self._entity_items[position] == item // 2 - 1:
+            return position
+        return None
+
+    def to_edge_arrays(self, sort=True):
+        """Returns the (entities, items, weights) arrays of the edges of this
+        graph, sorted by entity and then item.  `sort` is accepted for
+        compatibility with `EIGraph.to_edge_arrays`; the edges are always
+        sorted.
+        """
+        entities = 2 * np.repeat(
+            np.arange(self.num_entities, dtype=np.int64),
+            np.diff(self._entity_indptr)
+        ) + 1
+        items = 2 * (np.asarray(self._entity_items, dtype=np.int64) + 1)
+        return entities, items, np.asarray(self._entity_weights)
+
+    def is_edge(self, nid1, nid2):
+        return self._find_edge(int(nid1), int(nid2)) is not None
+
+    def num_edges(self):
+        return self._num_edges
+
+    def get_edge_weight(self, nid1, nid2):
+        position = self._find_edge(int(nid1), int(nid2))
+        if position is None:
+            raise KeyError((nid1, nid2))
+        return self._entity_weights[position].item()
+
+    def get_items(self):
+        """Returns a set of all the items in the graph."""
+        return set(self.items.tolist())
+
+    def get_entities(self):
+        """Returns a set of all the entities in the graph."""
+        return set(self.entities.tolist())
+
+    def get_neighbors(self, node):
+        """Returns a list containing the node IDs of the neighbors
+        of "node".
+        """
+        neighbors, _ = self._get_edges(node)
+        return self._to_nids(node, neighbors).tolist()
+
+    def get_degree(self, node):
+        """Returns the number of neighbors of "node"."""
+        neighbors, _ = self._get_edges(node)
+        return len(neighbors)
+
+    def get_random_items(self, N, replace = True, excluding = None):
+        """Returns a np.array of items in the graph"""
+        if self.num_items == 0:
+            raise ValueError("Graph has no items")
+        items = self.items if excluding is None else self.items[self.items != excluding]
+        return np.random.choice(items, N, replace)
+
+    def sample_edges(self, num_edges, rng=np.random):
+        """Returns the (entities, items, weights) arrays of `num_edges` edges
+        drawn uniformly at random, with replacement.
+
+        :param rng: the numpy random state to draw from.
+        """
+        if self._num_edges == 0:
+            raise ValueError("Graph has no edges")
+        positions = rng.randint(self._num_edges, size=num_edges)
+        entities = np.searchsorted(self._entity_indptr, positions, side='right') - 1
+        return (
+            2 * entities.astype(np.int64) + 1,
+            2 * (np.asarray(self._entity_items[positions], dtype=np.int64) + 1),
+            np.asarray(self._entity_weights[positions], dtype=np.float64)
+        )
+
+    def get_random_edge(self):
+        """Returns a random (entity, item, weight) pair whose edge
+        exists in the graph, drawn uniformly over the edges.
+        """
+        entities, items, weights = self.sample_edges(1)
+        return entities[0].item(), items[0].item(), weights[0].item()
+
+    def get_random_neighbor_id(self, node, use_weights=False, excluding=None):
+        """Returns the ID of a random neighbor of node in this graph.
+
+        Draws from the same random number stream as
+        `EIGraph.get_random_neighbor_id`.
+
+        :param use_weights: If true, weighs the random choice based on the
+            weight of the edge between the current node and its neighbors.
+        :param excluding: (optional) collection of neighbor IDs to treat as
+            if their edge to `node` did not exist.
+        """
+        neighbors, weights = self._get_edges(node)
+        neighbors = self._to_nids(node, neighbors)
+        if excluding:
+            keep = ~np.in1d(neighbors, list(excluding))
+            neighbors, weights = neighbors[keep], weights[keep]
+        if not len(neighbors):
+            raise ValueError("Node has no neighbors")
+
+        if not use_weights:
+            return neighbors[int(random.random() * len(neighbors))].item()
+
+        cumulative_weights = np.cumsum(weights, dtype=np.float64)
+        draw = random.random() * cumulative_weights[-1]
+        position = min(
+            np.searchsorted(cumulative_weights, draw), len(neighbors) - 1
+        )
+        return neighbors[position].item()
+
+    def get_average_edge_weight(self, node):
+        _, weights = self._get_edges(node)
+        if len(weights) == 0:
+            raise ValueError("Zero degree node has no average edge weight")
+        return weights.sum(dtype=np.float64) / len(weights)
+
+    def has_entity(self, entity_id):
+        """Returns whether the graph contains the given `entity_id`."""
+        assert self.nid_is_entity(entity_id)
+        return entity_id <= 2 * self.num_entities - 1
+
+    def has_item(self, item_id):
+        """Returns whether the graph contains the given `item_id`."""
+        assert self.nid_is_item(item_id)
+        return item_id <= 2 * self.num_items
+
+    def has_node(self, node_id):
+        """Returns whether the graph contains the given `node_id`."""
+        if self.nid_is_entity(node_id):
+            return self.has_entity(node_id)
+        return self.nid_is_item(node_id) and self.has_item(node_id)
+
+    def get_rating_histogram(self):
+        """Returns a map of rating -> number of edges with that rating."""
+        return dict(self._rating_histogram)
+
+    def get_weighted_degree(self, nid):
+        """
+        The weighted degree of an item is the sum of weights over its edges.
+        """
+        _, weights = self._get_edges(nid)
+        return weights.sum(dtype=np.float64).item()
+
+    def get_item_rating_stats(self):
+        """Returns the (counts, sums, sums of squares) arrays of the ratings
+        of every item, where item i is at index i / 2 - 1.
+        """
+        indptr = self._item_indptr
+        stats = [np.diff(indptr)]
+        for power in (1, 2):
+            cumulative = np.concatenate([
+                [0.0], np.cumsum(np.asarray(self._item_weights, dtype=np.float64) ** power)
+            ])
+            stats.append(cumulative[indptr[1:]] - cumulative[indptr[:-1]])
+        return tuple(stats)
+
+    def get_item_rating_moments(self):
+        """Returns the (counts, means, variances) arrays of the ratings of
+        every item, where item i is at index i / 2 - 1.  Items without
+        ratings have a mean and variance of 0.
+        """
+        counts, sums, squares = self.get_item_rating_stats()
+        means = sums / np.maximum(counts, 1)
+        variances = np.maximum(squares / np.maximum(counts, 1) - means ** 2, 0)
+        return counts, means, variances
+
+    def get_weighted_item_to_degree(self):
+        """Returns a map of item to weighted degree."""
+        _, sums, _ = self.get_item_rating_stats()
+        return dict(zip(self.items.tolist(), sums.tolist()))
@@ -0,0 +1,125 @@
+"""Utilities for fanning work out to worker processes.
+
+SNAP graphs cannot be pickled, so rather than shipping a graph (or anything
+holding one, like a recommender) to the workers, we stash it in a module-level
+variable and fork the workers, which then inherit it copy-on-write.  Tasks and
+results, on the other hand, are pickled, so keep them small.
+"""
+
+import collections
+import itertools
+import multiprocessing
+import random
+import numpy as np
+
+# The objects shared with the forked workers by every `imap_shared` call in
+# progress, by call.  Keeping them all lets calls nest, and workers forked
+# for a call (including replacements, see `maxtasksperchild`) find its object
+# whatever other calls started in the meantime.
+_shared = {}
+_call_ids = itertools.count()
+# The number of tasks of `imap_shared` running in this process.  Tasks that
+# call `imap_shared` again have their own tasks run in-process too.
+_running_tasks = 0
+
+def _call(func, shared, seed, task):
+    global _running_tasks
+    if seed is not None:
+        # Forked workers inherit the parent's random state, so without this
+        # every worker would draw the same random numbers.
+        random.seed(seed)
+        np.random.seed(seed % (2 ** 32))
+    _running_tasks += 1
+    try:
+        return func(shared, task)
+    finally:
+        _running_tasks -= 1
+
+def _run_task(args):
+    func, call_id, seed, task = args
+    return _call(func, _shared[call_id], seed, task)
+
+def imap_shared(func, shared, tasks, num_workers=None, seed=None,
+        maxtasksperchild=None):
+    """Yields `func(shared, task)` for every task in `tasks`, in the order in
+    which the results become available.
+
+    :param func: a module-level function (it must be picklable) taking the
+        shared object and a task.
+    :param shared: the object to share with the workers.  Workers get their
+        own copy-on-write view of it, so mutations are never seen by the parent.
+    :param tasks: an iterable of picklable tasks.
+    :param num_workers: the number of worker processes.  Defaults to the number
+        of CPUs.  If 1, tasks are run in this process, in order, as they are
+        in a daemonic process (e.g. a `multiprocessing.Pool` worker), which
+        may not start children, and within a task of another `imap_shared`
+        call, whose workers already use the CPUs.
+    :param seed: (optional) if given, the random modules are re-seeded with
+        `seed + i` before running the i-th task, so results do not depend on
+        which worker runs which task.
+    :param maxtasksperchild: passed through to `multiprocessing.Pool`.  Set it
+        to 1 to hand every task a fresh fork of the shared object.
+    """
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+
+    seeds = (None if seed is None else seed + i for i in itertools.count())
+    if num_workers == 1 or _running_tasks \
+            or multiprocessing.current_process().daemon:
+        for task_seed, task in itertools.izip(seeds, tasks):
+            yield _call(func, shared, task_seed, task)
+        return
+
+    call_id = next(_call_ids)
+    _shared[call_id] = shared
+    seeded_tasks = (
+        (func, call_id, task_seed, task)
+        for task_seed, task in itertools.izip(seeds, tasks)
+    )
+    try:
+        pool = multiprocessing.Pool(num_workers, maxtasksperchild=maxtasksperchild)
+        try:
+            for result in pool.imap_unordered(_run_task, seeded_tasks):
+                yield result
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        del _shared[call_id]
+
+def imap_bounded(func, tasks, num_workers=None, max_pending=None):
+    """Yields `func(task)` for every task in `tasks`, in the order of the
+    tasks.
+
+    Unlike `multiprocessing.Pool.imap`, which queues up every task as fast as
+    it can, at most `max_pending` tasks are handed out ahead of the results
+    consumed so far.  This bounds memory use when `tasks` lazily produces
+    large tasks, e.g. chunks of a file.
+
+    :param func: a module-level function (it must be picklable).
+    :param num_workers: the number of worker processes.  Defaults to the number
+        of CPUs.  If 1, tasks are run in this process.
+    :param max_pending: (optional) defaults to twice the number of workers.
+    """
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    if num_workers == 1:
+        for task in tasks:
+            yield func(task)
+        return
+
+    max_pending = max_pending or 2 * num_workers
+    pool = multiprocessing.Pool(num_workers)
+    try:
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.apply_async(func, (task,)))
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
@@ -3,30 +3,56 @@
 import time
 import sys
 
+import numpy as np
+
 from gbra.recommender.recommenders import RandomRecommender, PopularItemRecommender, \
     PixieRandomWalkRecommender
-from gbra.recommender.evaluator import RecEvaluator
+from gbra.recommender.evaluator import RecEvaluator, EvaluationSummary
 from gbra.data.network_loader import *
 
-def get_graph(name):
+def get_data_file_loader(name):
     name = name.lower()
     if name == "movielens":
-        return MovielensLoader().load()
+        return MovielensLoader()
+    elif name == "movielens10m":
+        return Movielens10mLoader()
+    elif name == "movielens20m":
+        return Movielens20mLoader()
+    elif name == "movielens25m":
+        return Movielens25mLoader()
     elif name == "beeradvocate":
-        return BeeradvocateLoader().load()
-    elif name.startswith("erdosrenyi"):
+        return BeeradvocateLoader()
+    else:
+        raise ValueError("Unknown graph %s" % name)
+
+# Generated graphs are drawn with this seed, so that every run evaluates the
+# same cached graph.
+GENERATED_GRAPH_SEED = 0
+
+def get_graph(name):
+    name = name.lower()
+    if name.startswith("erdosrenyi"):
         _, entities, items, edges, graph_to_emulate_name = name.split("_")
         assert(graph_to_emulate_name != "erdosrenyi")
         entities, items, edges = int(entities), int(items), int(edges)
-        graph_to_emulate = get_graph(graph_to_emulate_name)
-        return ErdosRenyiLoader(
+        ratings_histogram = get_data_file_loader(
+            graph_to_emulate_name
+        ).load_rating_histogram()
+        return CachedLoader(ErdosRenyiLoader(
             num_entities=entities,
             num_items=items,
             num_edges=edges,
-            graph_to_emulate=graph_to_emulate
-        ).load()
-    else:
-        raise ValueError("Unknown graph %s" % name)
+            ratings_histogram=ratings_histogram,
+            seed=GENERATED_GRAPH_SEED
+        ), GENERATED_GRAPHS_DIR).load()
+    if name.startswith("chunglu"):
+        # ChungLu_[graph to emulate]: a random graph with the same degree
+        # sequences and rating histogram as the emulated graph.
+        _, graph_to_emulate_name = name.split("_")
+        return CachedLoader(EmulatingChungLuLoader(
+            get_data_file_loader(graph_to_emulate_name), seed=GENERATED_GRAPH_SEED
+        ), GENERATED_GRAPHS_DIR).load()
+    return get_data_file_loader(name).load()
 
 # Experiment-wide variables. These are fixed across all experiments.
 
@@ -59,7 +85,15 @@ def get_recommender(name, graph):
         raise ValueError("Unknown recomender %s" % name)
 
 def evaluate_recommender(graph, name, recommender, recommender_name, \
-                        num_recs, entity_sample_size, min_score_threshold):
+                        num_recs, entity_sample_size, min_score_threshold, num_workers,
+                        out=sys.stdout, results_writer=None):
+    """Evaluates the recommender at `entity_sample_size` sampled entities,
+    writes one line per entity and cutoff to `out`, and returns the
+    EvaluationSummary of the run.
+
+    If given a `ResultsWriter`, also writes one record per entity and cutoff
+    to it.
+    """
 
     evaluator = RecEvaluator(
         recommender,
@@ -68,31 +102,58 @@ def evaluate_recommender(graph, name, recommender, recommender_name, \
         verbose=False
     )
 
-    # Run this quickly so that we don't lose experiment output.
-
-    scores_to_go = entity_sample_size
-    while scores_to_go > 0:
-
-        # For each iteration, only sample 1 entity and evaluate it.
-        score = evaluator.evaluate_random_sample(entity_sample_size=1)
-
-        # If the score is None, we should not count it when we parse result
-        # experiments.
-        if not score:
-            continue
-
-        scores_to_go -= 1
-        print("graph:%s,num_recs:%s,score:%s,rec:%s,iter:%d" % (
-            name, str(num_recs), str(score), recommender_name, entity_sample_size - scores_to_go
-        ))
-
-# Start experiment
-_, graph_name, recommender_name, k_recs, N, min_score_threshold = sys.argv
-
-k_recs = int(k_recs)
-N = int(N)
-G = get_graph(graph_name)
-R = get_recommender(recommender_name, G)
-min_threshold = float(min_score_threshold)
-
-evaluate_recommender(G, graph_name, R, recommender_name, k_recs, N, min_threshold)
+    # Entities are evaluated in parallel, and each result is printed as soon
+    # as it comes back so that we don't lose experiment output.
+    summary = EvaluationSummary()
+    evaluated = set()
+    while summary.num_evaluated < entity_sample_size:
+        # Entities whose score is None do not count towards the sample size,
+        # so keep sampling fresh entities until we have enough scores.
+        entity_sample = evaluator.sample_entities(
+            entity_sample_size - summary.num_evaluated, excluding=evaluated
+        )
+        evaluated |= entity_sample
+
+        seed = np.random.randint(2 ** 31)
+        for evaluation in evaluator.evaluate_parallel(entity_sample, num_workers, seed):
+            summary.add(evaluation)
+
+            # If the score is None, we should not count it when we parse result
+            # experiments.
+            if evaluation.scores is None:
+                continue
+
+            # One line per cutoff: all cutoffs share a single ranked list.
+            for k in sorted(evaluation.scores):
+                out.write("graph:%s,num_recs:%s,score:%s,rec:%s,iter:%d,entity:%d,degree:%d,latency:%f\n" % (
+                    name, str(k), str(evaluation.scores[k]), recommender_name,
+                    summary.num_evaluated, evaluation.entity_id, evaluation.degree,
+                    evaluation.latency
+                ))
+                if results_writer is not None:
+                    results_writer.write(
+                        dict(graph=name, rec=recommender_name, num_recs=k,
+                             min_score_threshold=min_score_threshold),
+                        entity=evaluation.entity_id, score=evaluation.scores[k],
+                        latency=evaluation.latency, seed=seed
+                    )
+            out.flush()
+
+    sys.stderr.write("graph:%s,rec:%s,%s\n" % (
+        name, recommender_name, str(summary)
+    ))
+    return summary
+
+if __name__ == '__main__':
+    # Start experiment
+    graph_name, recommender_name, k_recs, N, min_score_threshold = sys.argv[1:6]
+    num_workers = int(sys.argv[6]) if len(sys.argv) > 6 else None
+
+    # A comma-separated list of cutoffs, e.g. 10,100,1000.
+    k_recs = [int(k) for k in k_recs.split(",")]
+    N = int(N)
+    G = get_graph(graph_name)
+    R = get_recommender(recommender_name, G)
+    min_threshold = float(min_score_threshold)
+
+    evaluate_recommender(G, graph_name, R, recommender_name, k_recs, N, min_threshold, num_workers)
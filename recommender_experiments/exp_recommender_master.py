@@ -1,5 +1,9 @@
-import os
-import subprocess
+import multiprocessing
+import sys
+
+from gbra.experiments.results import ResultsWriter
+from gbra.experiments.scheduler import ExperimentGrid, Scheduler
+from exp_recommender import get_graph, get_recommender, evaluate_recommender
 
 # Number of times to run each experiment for each setting
 # e.g., for each setting of recommender, graph,
@@ -11,50 +15,71 @@ recommenders = ["pixie", "random", "popular"]
 
 # The name of the ErdosRenyi graph is of the form
 # ErdosRenyi_[num entities]_[num items]_[num edges]_[graph to draw edge weights from].
-graphs = [
+# Maps each graph to the minimum rating to evaluate at.
+graphs = {
 
     # MovieLens. Evaluate threshold above 4.
-    (4.0, "MovieLens"),
+    "MovieLens": 4.0,
 
     # BeerAdvocate. Evaluate threshold above 4.
-    (4.0, "BeerAdvocate"),
+    "BeerAdvocate": 4.0,
 
     # ER-MovieLens. Evaluate threshold above 4.
-    (4.0, "ErdosRenyi_6040_3952_1000209_movielens"),
+    "ErdosRenyi_6040_3952_1000209_movielens": 4.0,
 
     # ER-BeerAdvocate. Evaluate threshold above 4.
-    (4.0, "ErdosRenyi_33387_66051_1571251_beeradvocate")
-]
+    "ErdosRenyi_33387_66051_1571251_beeradvocate": 4.0,
+}
 
+# All cutoffs are evaluated by a single experiment, from one ranked list per
+# query.
 top_k_recommendations = [10, 100, 1000]
 
-pids = []
-files = []
-for recommender_name in recommenders:
-    for min_threshold, graph_name in graphs:
-        for k_recs in top_k_recommendations:
-
-            filename = '-'.join(
-                [recommender_name, graph_name, \
-                    str(k_recs), str(N)]
-            ) + '.recommender_eval'
-
-            cmd = ["python", "-u", "exp_recommender.py", \
-                    graph_name, recommender_name,str(k_recs), str(N), str(min_threshold)]
-
-            outputfile = open(filename, "w")
-            files.append(outputfile)
-
-            print("Launched experiment with command: %s" % str(' '.join(cmd)))
-            pids.append(
-                subprocess.Popen(
-                    ' '.join(cmd), shell=True, stdout=outputfile
-                )
-            )
-
-print("Waiting for experiments to finish...")
-for pid, file in zip(pids, files):
-    pid.wait()
-    file.close()
+# At most this many experiments run at once.  Each one holds its own copy
+# of its graph, so lower this if the graphs do not fit in memory.
+num_workers = int(sys.argv[1]) if len(sys.argv) > 1 else multiprocessing.cpu_count()
+
+# Finished experiments are recorded here; rerun this script to resume an
+# interrupted sweep.
+STATE_FILENAME = "recommender_eval.state"
+
+# Every experiment appends its per-entity results to this results store.
+RESULTS_DIRECTORY = "recommender_eval.results"
+
+def run_experiment(graph, config):
+    graph_name, recommender_name = config["graph"], config["recommender"]
+    recommender = get_recommender(recommender_name, graph)
+
+    filename = '-'.join(
+        [recommender_name, graph_name, \
+            ','.join(str(k) for k in top_k_recommendations), str(N)]
+    ) + '.recommender_eval'
+
+    with open(filename, "w") as outputfile, \
+            ResultsWriter(RESULTS_DIRECTORY) as results_writer:
+        summary = evaluate_recommender(
+            graph, graph_name, recommender, recommender_name,
+            top_k_recommendations, N, graphs[graph_name], num_workers=1,
+            out=outputfile, results_writer=results_writer
+        )
+    return summary.mean_scores
+
+grid = ExperimentGrid([
+    ("graph", sorted(graphs)),
+    ("recommender", recommenders),
+])
+scheduler = Scheduler(
+    run_experiment, get_graph, num_workers=num_workers,
+    state_filename=STATE_FILENAME
+)
+
+print("Running %d experiments on %d workers..." % (len(grid), num_workers))
+for job in scheduler.run(grid):
+    if job.error:
+        print("Experiment %s failed:\n%s" % (str(job.config), job.error))
+        continue
+    print("Finished experiment %s in %.1fs (peak memory %.0fMB): %s" % (
+        str(job.config), job.wall_time, job.peak_memory_mb, str(job.result)
+    ))
 
 print("Done.")
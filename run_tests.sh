@@ -1,3 +1,15 @@
 #! /bin/bash
 
 python gbra/tests/test_ei_graph.py
+python gbra/tests/test_evaluator.py
+python gbra/tests/test_metrics.py
+python gbra/tests/test_scheduler.py
+python gbra/tests/test_results.py
+python gbra/tests/test_network_loader.py
+python gbra/tests/test_ingest.py
+python gbra/tests/test_edge_list_import.py
+python gbra/tests/test_attacker.py
+python gbra/tests/test_feature_store.py
+python gbra/tests/test_cooccurrence.py
+python gbra/tests/test_campaign.py
+python gbra/tests/test_recommenders.py